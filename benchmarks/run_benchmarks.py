@@ -0,0 +1,605 @@
+# benchmarks/run_benchmarks.py
+# Reproducible benchmark harness for the forecasting and training pipelines.
+#
+# Usage (from the project root):
+#   python -m benchmarks.run_benchmarks --profile quick
+#   python -m benchmarks.run_benchmarks --output benchmarks/results/baseline.json
+#   python -m benchmarks.run_benchmarks --compare benchmarks/results/baseline.json --threshold 0.10
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results", "latest.json")
+
+# Each case scales the number of drugs, the history length and the horizon.
+# 'horizon' is days for daily, months for monthly and years for yearly runs.
+PROFILES = {
+    'quick': [
+        {'scenario': 'cli_startup', 'drugs': 0, 'history_days': 0, 'horizon': 0, 'repeats': 5},
+        {'scenario': 'daily_forecast', 'drugs': 8, 'history_days': 365, 'horizon': 7, 'repeats': 3},
+        {'scenario': 'feature_build', 'drugs': 8, 'history_days': 365, 'horizon': 0, 'repeats': 3},
+        {'scenario': 'monthly_forecast', 'drugs': 8, 'history_days': 365, 'horizon': 1, 'repeats': 1},
+    ],
+    'default': [
+        {'scenario': 'cli_startup', 'drugs': 0, 'history_days': 0, 'horizon': 0, 'repeats': 10},
+        {'scenario': 'forecaster_import', 'drugs': 0, 'history_days': 0, 'horizon': 0, 'repeats': 10},
+        {'scenario': 'daily_forecast', 'drugs': 8, 'history_days': 730, 'horizon': 7, 'repeats': 5},
+        {'scenario': 'daily_forecast', 'drugs': 8, 'history_days': 730, 'horizon': 30, 'repeats': 3},
+        {'scenario': 'daily_forecast', 'drugs': 32, 'history_days': 730, 'horizon': 7, 'repeats': 3},
+        {'scenario': 'daily_forecast', 'drugs': 8, 'history_days': 2190, 'horizon': 7, 'repeats': 3},
+        {'scenario': 'feature_build', 'drugs': 8, 'history_days': 730, 'horizon': 0, 'repeats': 5},
+        {'scenario': 'feature_build', 'drugs': 8, 'history_days': 2190, 'horizon': 0, 'repeats': 5},
+        {'scenario': 'monthly_forecast', 'drugs': 8, 'history_days': 730, 'horizon': 3, 'repeats': 1},
+        {'scenario': 'yearly_forecast', 'drugs': 8, 'history_days': 730, 'horizon': 1, 'repeats': 1},
+        {'scenario': 'multi_origin_forecast', 'drugs': 8, 'history_days': 730, 'horizon': 7, 'repeats': 3},
+        # Direct strategy on the same inputs; compare with the recursive cases above
+        {'scenario': 'daily_forecast', 'drugs': 8, 'history_days': 730, 'horizon': 30, 'repeats': 3,
+         'strategy': 'direct'},
+        {'scenario': 'multi_origin_forecast', 'drugs': 8, 'history_days': 730, 'horizon': 7, 'repeats': 3,
+         'strategy': 'direct'},
+        # Statistical baseline: every drug at once, no model files
+        {'scenario': 'daily_forecast', 'drugs': 8, 'history_days': 730, 'horizon': 30, 'repeats': 3,
+         'model_type': 'ets'},
+        {'scenario': 'multi_origin_forecast', 'drugs': 8, 'history_days': 730, 'horizon': 7, 'repeats': 3,
+         'model_type': 'ets'},
+        {'scenario': 'weather_join', 'drugs': 0, 'history_days': 3650, 'horizon': 0, 'repeats': 5},
+        {'scenario': 'weather_join_loop', 'drugs': 0, 'history_days': 3650, 'horizon': 0, 'repeats': 1},
+    ],
+    'large': [
+        {'scenario': 'daily_forecast', 'drugs': 128, 'history_days': 3650, 'horizon': 30, 'repeats': 1},
+        {'scenario': 'feature_build', 'drugs': 128, 'history_days': 3650, 'horizon': 0, 'repeats': 1},
+        {'scenario': 'monthly_forecast', 'drugs': 32, 'history_days': 3650, 'horizon': 12, 'repeats': 1},
+        {'scenario': 'yearly_forecast', 'drugs': 32, 'history_days': 3650, 'horizon': 1, 'repeats': 1},
+    ],
+    # 10 years x 1,000 drugs, default vs memory-efficient loading; compare peak_rss_mb
+    'memory': [
+        {'scenario': 'daily_forecast', 'drugs': 1000, 'history_days': 3650, 'horizon': 7, 'repeats': 1},
+        {'scenario': 'daily_forecast', 'drugs': 1000, 'history_days': 3650, 'horizon': 7, 'repeats': 1,
+         'memory_efficient': True},
+    ],
+    # Catalog scale: 10, 1,000 and 10,000 drugs. The ETS baseline needs no models, so it
+    # covers every size; wide vs long sales files (the long ones discover the drug set)
+    # and forecasting in batches of 500 drugs
+    'catalog': [
+        {'scenario': 'daily_forecast', 'drugs': 10, 'history_days': 400, 'horizon': 30, 'repeats': 3,
+         'model_type': 'ets'},
+        {'scenario': 'daily_forecast', 'drugs': 1000, 'history_days': 400, 'horizon': 30, 'repeats': 3,
+         'model_type': 'ets'},
+        {'scenario': 'daily_forecast', 'drugs': 10000, 'history_days': 400, 'horizon': 30, 'repeats': 1,
+         'model_type': 'ets'},
+        {'scenario': 'daily_forecast', 'drugs': 10000, 'history_days': 400, 'horizon': 30, 'repeats': 1,
+         'model_type': 'ets', 'batch_size': 500},
+        {'scenario': 'daily_forecast', 'drugs': 10000, 'history_days': 400, 'horizon': 30, 'repeats': 1,
+         'model_type': 'ets', 'layout': 'long', 'memory_efficient': True, 'batch_size': 500},
+        {'scenario': 'multi_origin_forecast', 'drugs': 10000, 'history_days': 400, 'horizon': 7, 'repeats': 1,
+         'model_type': 'ets'},
+        {'scenario': 'multi_origin_forecast', 'drugs': 10000, 'history_days': 400, 'horizon': 7, 'repeats': 1,
+         'model_type': 'ets', 'batch_size': 500},
+        # Model forecasts with one synthetic forest per drug
+        {'scenario': 'daily_forecast', 'drugs': 10, 'history_days': 400, 'horizon': 7, 'repeats': 3},
+        {'scenario': 'daily_forecast', 'drugs': 1000, 'history_days': 400, 'horizon': 7, 'repeats': 1,
+         'layout': 'long', 'memory_efficient': True, 'batch_size': 500},
+    ],
+}
+
+# The training grid runs on the real 8 drug codes so that its timings compare with
+# the production dataset. It is opt-in since a single run takes minutes.
+TRAINING_CASE = {'scenario': 'training_grid', 'drugs': 8, 'history_days': 365, 'horizon': 0, 'repeats': 1}
+
+# Number of forecast origins in the multi_origin_forecast scenario
+MULTI_ORIGIN_COUNT = 90
+
+# Days of observed weather at the end of the weather_join history; earlier
+# dates fall back to the monthly averages, as with a recently started archive
+WEATHER_JOIN_OBSERVED_DAYS = 730
+
+# Startup scenarios run a fresh interpreter and need no synthetic workspace.
+# A p50 above the budget fails the run like a regression does.
+STARTUP_BUDGET_MS = {
+    'cli_startup': 300.0,         # python main.py --help
+    'forecaster_import': 1500.0,  # import multi_horizon_forecast
+}
+
+# Scenarios that build their own inputs instead of using a synthetic workspace
+STANDALONE_SCENARIOS = set(STARTUP_BUDGET_MS) | {'weather_join', 'weather_join_loop'}
+
+# Metrics compared against a previous run: (path, True if higher is worse)
+COMPARED_METRICS = [
+    (('latency_ms', 'p50'), True),
+    (('latency_ms', 'p95'), True),
+    (('throughput_per_s',), False),
+    (('peak_rss_mb',), True),
+]
+
+
+def case_id(case):
+    """Stable identifier for a benchmark case used as the key in the JSON baseline"""
+    suffix = ",memory_efficient" if case.get('memory_efficient') else ""
+    if case.get('strategy', 'recursive') != 'recursive':
+        suffix += f",{case['strategy']}"
+    if case.get('model_type', 'rf') != 'rf':
+        suffix += f",{case['model_type']}"
+    if case.get('layout', 'wide') != 'wide':
+        suffix += f",{case['layout']}"
+    if case.get('batch_size'):
+        suffix += f",batch={case['batch_size']}"
+    return f"{case['scenario']}[drugs={case['drugs']},history={case['history_days']},horizon={case['horizon']}{suffix}]"
+
+
+def _workspace_key(case):
+    """Cases with the same drugs, history length and sales layout share a synthetic workspace"""
+    return case['drugs'], case['history_days'], case.get('layout', 'wide')
+
+
+def peak_rss_mb(children=False):
+    """
+    Peak resident set size of this process (or of its waited-for children) in MB.
+
+    Args:
+        children (bool): Report the peak of terminated child processes instead
+
+    Returns:
+        float: Peak RSS in megabytes, or None if it cannot be measured
+    """
+    try:
+        import resource
+        who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+        peak = resource.getrusage(who).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except Exception:
+            return None
+
+
+# ----------- Scenarios -----------
+# Every scenario returns (latencies in seconds, units processed per run).
+
+def _make_forecaster(config):
+    from multi_horizon_forecast import MultiHorizonForecast
+    return MultiHorizonForecast(config)
+
+
+def run_daily_forecast(case, config, first_day):
+    forecaster = _make_forecaster(config)
+    latencies = []
+    for _ in range(case['repeats']):
+        start = time.perf_counter()
+        forecaster.generate_daily_forecast(first_day, case['horizon'])
+        latencies.append(time.perf_counter() - start)
+    return latencies, case['drugs'] * case['horizon']
+
+
+def run_monthly_forecast(case, config, first_day):
+    forecaster = _make_forecaster(config)
+    start_month = first_day[:7]
+    latencies = []
+    for _ in range(case['repeats']):
+        start = time.perf_counter()
+        forecaster.generate_monthly_forecast(start_month, case['horizon'])
+        latencies.append(time.perf_counter() - start)
+    days = int(_days_covered(start_month, case['horizon']))
+    return latencies, case['drugs'] * days
+
+
+def run_yearly_forecast(case, config, first_day):
+    forecaster = _make_forecaster(config)
+    start_year = int(first_day[:4]) + 1
+    latencies = []
+    for _ in range(case['repeats']):
+        start = time.perf_counter()
+        forecaster.generate_yearly_forecast(start_year, case['horizon'])
+        latencies.append(time.perf_counter() - start)
+    days = int(_days_covered(f"{start_year}-01", case['horizon'] * 12))
+    return latencies, case['drugs'] * days
+
+
+def run_multi_origin_forecast(case, config, first_day):
+    import pandas as pd
+    forecaster = _make_forecaster(config)
+    # Backtest origins over the last MULTI_ORIGIN_COUNT days of history
+    origins = pd.date_range(end=pd.Timestamp(first_day) - pd.Timedelta(days=1), periods=MULTI_ORIGIN_COUNT)
+    latencies = []
+    for _ in range(case['repeats']):
+        start = time.perf_counter()
+        forecaster.generate_multi_origin_forecast(origins, case['horizon'])
+        latencies.append(time.perf_counter() - start)
+    return latencies, case['drugs'] * case['horizon'] * MULTI_ORIGIN_COUNT
+
+
+def run_feature_build(case, config, first_day):
+    forecaster = _make_forecaster(config)
+    latencies = []
+    for _ in range(case['repeats']):
+        start = time.perf_counter()
+        for drug in forecaster.drug_columns:
+            forecaster.prepare_feature_names(drug)
+        latencies.append(time.perf_counter() - start)
+    return latencies, case['drugs']
+
+
+def run_training_grid(case, config, first_day):
+    workspace = os.path.dirname(config['MODEL_DIR'])
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(ROOT, "train_model_saperately.py")],
+                   cwd=workspace, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    latency = time.perf_counter() - start
+    # 3 model families per drug
+    return [latency], case['drugs'] * 3
+
+
+def _weather_join_inputs(case):
+    import pandas as pd
+    from benchmarks.synthetic import WEATHER_TYPES, make_weather_frame
+    dates = pd.Series(pd.date_range(end="2019-10-08", periods=case['history_days'], freq='D'))
+    observed_days = min(WEATHER_JOIN_OBSERVED_DAYS, case['history_days'])
+    weather_df = make_weather_frame(dates.iloc[-observed_days].strftime('%Y-%m-%d'), observed_days)
+    weather_df['date'] = pd.to_datetime(weather_df['date'])
+    weather_df['weather_code'] = weather_df['weather_type'].map({t: i for i, t in enumerate(WEATHER_TYPES)})
+    return dates, weather_df[['date', 'max_temp', 'min_temp', 'weather_code']]
+
+
+def _weather_loop(dates, weather_df):
+    """Per-date lookup the training scripts used before the shared weather join"""
+    import pandas as pd
+    from utils.weather_features import monthly_weather_profile, overall_weather
+    monthly_avg = monthly_weather_profile(weather_df).reset_index()
+    features = []
+    for date in dates:
+        exact_match = weather_df[weather_df['date'] == date]
+        if not exact_match.empty:
+            features.append(exact_match[['max_temp', 'min_temp', 'weather_code']].iloc[0].to_dict())
+            continue
+        avg_data = monthly_avg[monthly_avg['month'] == date.month]
+        if not avg_data.empty:
+            features.append(avg_data[['max_temp', 'min_temp', 'weather_code']].iloc[0].to_dict())
+            continue
+        features.append(overall_weather(weather_df))
+    return pd.DataFrame(features)
+
+
+def run_weather_join(case, config, first_day):
+    from utils.weather_features import attach_weather
+    dates, weather_df = _weather_join_inputs(case)
+    latencies = []
+    for _ in range(case['repeats']):
+        start = time.perf_counter()
+        attach_weather(dates, weather_df)
+        latencies.append(time.perf_counter() - start)
+    return latencies, len(dates)
+
+
+def run_weather_join_loop(case, config, first_day):
+    dates, weather_df = _weather_join_inputs(case)
+    latencies = []
+    for _ in range(case['repeats']):
+        start = time.perf_counter()
+        _weather_loop(dates, weather_df)
+        latencies.append(time.perf_counter() - start)
+    return latencies, len(dates)
+
+
+def _time_interpreter(args, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_cli_startup(case, config, first_day):
+    return _time_interpreter(["main.py", "--help"], case['repeats']), 1
+
+
+def run_forecaster_import(case, config, first_day):
+    return _time_interpreter(["-c", "import multi_horizon_forecast"], case['repeats']), 1
+
+
+SCENARIOS = {
+    'cli_startup': run_cli_startup,
+    'forecaster_import': run_forecaster_import,
+    'daily_forecast': run_daily_forecast,
+    'monthly_forecast': run_monthly_forecast,
+    'yearly_forecast': run_yearly_forecast,
+    'multi_origin_forecast': run_multi_origin_forecast,
+    'feature_build': run_feature_build,
+    'training_grid': run_training_grid,
+    'weather_join': run_weather_join,
+    'weather_join_loop': run_weather_join_loop,
+}
+
+
+def _days_covered(start_month, num_months):
+    import pandas as pd
+    start = pd.Timestamp(f"{start_month}-01")
+    return (start + pd.DateOffset(months=num_months) - start).days
+
+
+def _run_case_in_worker(case, config, first_day):
+    """Entry point of the isolated worker process for a single case"""
+    warnings.filterwarnings('ignore')
+    with contextlib.redirect_stdout(io.StringIO()):
+        latencies, units = SCENARIOS[case['scenario']](case, config, first_day)
+    rss_self = peak_rss_mb()
+    runs_subprocess = case['scenario'] == 'training_grid' or case['scenario'] in STARTUP_BUDGET_MS
+    rss_children = peak_rss_mb(children=True) if runs_subprocess else None
+    return latencies, units, rss_children if rss_children else rss_self
+
+
+def summarize(latencies, units):
+    """
+    Summarize raw latencies into the metrics stored in the baseline.
+
+    Args:
+        latencies (list): Per-run latencies in seconds
+        units (int): Units of work (e.g. drug-days predicted) per run
+
+    Returns:
+        dict: Throughput and latency percentiles
+    """
+    lat_ms = np.asarray(latencies) * 1000.0
+    return {
+        'runs': len(latencies),
+        'units_per_run': units,
+        'throughput_per_s': units / (np.mean(lat_ms) / 1000.0) if np.mean(lat_ms) > 0 else None,
+        'latency_ms': {
+            'mean': float(np.mean(lat_ms)),
+            'min': float(np.min(lat_ms)),
+            'p50': float(np.percentile(lat_ms, 50)),
+            'p90': float(np.percentile(lat_ms, 90)),
+            'p95': float(np.percentile(lat_ms, 95)),
+            'p99': float(np.percentile(lat_ms, 99)),
+            'max': float(np.max(lat_ms)),
+        },
+    }
+
+
+def run_cases(cases, seed=42, n_estimators=50, keep_workspace=False):
+    """
+    Run benchmark cases. Workspaces are generated once per (drugs, history) pair
+    in this process; each case then runs in a fresh worker so that its peak RSS
+    is not polluted by data generation or earlier cases.
+
+    Args:
+        cases (list): Benchmark case dictionaries
+        seed (int): Random seed for the synthetic data
+        n_estimators (int): Trees per synthetic forest
+        keep_workspace (bool): Keep the generated workspaces on disk
+
+    Returns:
+        dict: Results keyed by case id
+    """
+    from benchmarks.synthetic import fit_synthetic_models, make_sales_frame, make_workspace
+    from utils.baseline_models import BASELINE_MODELS
+
+    # Workspaces whose cases only run baselines are generated without models
+    model_keys = {_workspace_key(case) for case in cases if case.get('model_type', 'rf') not in BASELINE_MODELS}
+
+    tmp_root = tempfile.mkdtemp(prefix="fc_bench_")
+    workspaces = {}
+    direct_workspaces = set()
+    results = {}
+    ctx = multiprocessing.get_context('spawn')
+
+    try:
+        for case in cases:
+            key = _workspace_key(case)
+            if case['scenario'] in STANDALONE_SCENARIOS:
+                config, first_day = {}, None
+            elif key not in workspaces:
+                print(f"🧪 Generating workspace: {case['drugs']} drugs, {case['history_days']} days of history"
+                      f"{' (long layout)' if key[2] == 'long' else ''}...")
+                workspace_dir = os.path.join(tmp_root, f"ws_{key[0]}_{key[1]}_{key[2]}")
+                workspaces[key] = make_workspace(workspace_dir, n_drugs=case['drugs'], n_days=case['history_days'],
+                                                 n_estimators=n_estimators, seed=seed, layout=key[2],
+                                                 fit_models=key in model_keys)
+            if case['scenario'] not in STANDALONE_SCENARIOS:
+                config = dict(workspaces[key])
+                first_day = config.pop('FIRST_FORECAST_DAY')
+                config['MEMORY_EFFICIENT'] = case.get('memory_efficient', False)
+                config['STRATEGY'] = case.get('strategy', 'recursive')
+                config['MODEL_TYPE'] = case.get('model_type', 'rf')
+                config['DRUG_BATCH_SIZE'] = case.get('batch_size')
+                # Direct models are only fitted for workspaces that have a direct case
+                if config['STRATEGY'] == 'direct' and key not in direct_workspaces:
+                    sales_df = make_sales_frame(case['drugs'], case['history_days'], seed=seed)
+                    fit_synthetic_models(sales_df, config['DRUG_COLUMNS'], config['MODEL_DIR'],
+                                         n_estimators=n_estimators, seed=seed, strategy='direct')
+                    direct_workspaces.add(key)
+                # Long sales files are forecast without a drug list: the drug set is discovered
+                if key[2] == 'long':
+                    config.pop('DRUG_COLUMNS')
+                # Every case starts without outputs (and cubes) left by earlier cases
+                shutil.rmtree(config['OUTPUT_PATH'], ignore_errors=True)
+
+            print(f"⏱️  Running {case_id(case)}...")
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                latencies, units, rss = pool.submit(_run_case_in_worker, case, config, first_day).result()
+
+            summary = summarize(latencies, units)
+            summary['peak_rss_mb'] = rss
+            if case['scenario'] in STARTUP_BUDGET_MS:
+                summary['budget_ms'] = STARTUP_BUDGET_MS[case['scenario']]
+            summary['params'] = case
+            results[case_id(case)] = summary
+            print(f"   p50={summary['latency_ms']['p50']:.1f}ms "
+                  f"throughput={summary['throughput_per_s']:.2f}/s peak_rss={rss:.1f}MB")
+    finally:
+        if keep_workspace:
+            print(f"Workspaces kept in {tmp_root}")
+        else:
+            shutil.rmtree(tmp_root, ignore_errors=True)
+
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _get_metric(result, path):
+    value = result
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare_results(current, previous, threshold=0.10):
+    """
+    Compare two benchmark runs and flag regressions beyond a relative threshold.
+
+    Args:
+        current (dict): Results of this run keyed by case id
+        previous (dict): Results of the previous run keyed by case id
+        threshold (float): Allowed relative degradation (0.10 = 10%)
+
+    Returns:
+        list: Regression dictionaries, empty if nothing regressed
+    """
+    regressions = []
+    for cid, result in current.items():
+        if cid not in previous:
+            continue
+        for path, higher_is_worse in COMPARED_METRICS:
+            new = _get_metric(result, path)
+            old = _get_metric(previous[cid], path)
+            if new is None or old is None or old == 0:
+                continue
+            change = (new - old) / old
+            if (higher_is_worse and change > threshold) or (not higher_is_worse and -change > threshold):
+                regressions.append({
+                    'case': cid,
+                    'metric': '.'.join(path),
+                    'previous': old,
+                    'current': new,
+                    'change_pct': change * 100
+                })
+    return regressions
+
+
+def check_budgets(results):
+    """
+    List the cases whose median latency exceeds their budget.
+
+    Args:
+        results (dict): Results keyed by case id
+
+    Returns:
+        list: (case id, p50 in ms, budget in ms) for every case over budget
+    """
+    over = []
+    for cid, result in results.items():
+        budget = result.get('budget_ms')
+        if budget is not None and result['latency_ms']['p50'] > budget:
+            over.append((cid, result['latency_ms']['p50'], budget))
+    return over
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Forecasting pipeline benchmark suite')
+    parser.add_argument('--profile', type=str, choices=sorted(PROFILES), default='default',
+                        help='Set of cases to run')
+    parser.add_argument('--only', type=str,
+                        help='Comma-separated list of scenarios to run (e.g. daily_forecast,feature_build)')
+    parser.add_argument('--include-training', action='store_true',
+                        help='Also benchmark the training grid (slow)')
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT,
+                        help='Path of the JSON file to record results to')
+    parser.add_argument('--compare', type=str,
+                        help='Previous JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative degradation that counts as a regression')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Random seed for the synthetic data')
+    parser.add_argument('--n-estimators', type=int, default=50,
+                        help='Trees per synthetic RandomForest model')
+    parser.add_argument('--keep-workspace', action='store_true',
+                        help='Keep the generated synthetic workspaces')
+    args = parser.parse_args()
+
+    cases = list(PROFILES[args.profile])
+    if args.include_training:
+        cases.append(TRAINING_CASE)
+    if args.only:
+        selected = set(args.only.split(','))
+        unknown = selected - set(SCENARIOS)
+        if unknown:
+            parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        cases = [case for case in cases if case['scenario'] in selected]
+
+    results = run_cases(cases, seed=args.seed, n_estimators=args.n_estimators,
+                        keep_workspace=args.keep_workspace)
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'profile': args.profile,
+            'seed': args.seed,
+            'n_estimators': args.n_estimators,
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📁 Results saved to {args.output}")
+
+    over_budget = check_budgets(results)
+    if over_budget:
+        print(f"\n❌ {len(over_budget)} case(s) over their latency budget:")
+        for cid, p50, budget in over_budget:
+            print(f"  - {cid}: p50 {p50:.0f}ms > budget {budget:.0f}ms")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        regressions = compare_results(results, previous.get('results', {}), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for reg in regressions:
+                print(f"  - {reg['case']} {reg['metric']}: {reg['previous']:.2f} -> {reg['current']:.2f} "
+                      f"({reg['change_pct']:+.1f}%)")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.threshold:.0%} compared with {args.compare}")
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
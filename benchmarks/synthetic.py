@@ -0,0 +1,223 @@
+# benchmarks/synthetic.py
+# Synthetic sales, weather and model generators for the benchmark suite.
+# Everything is seeded so that two runs with the same parameters produce
+# byte-identical inputs.
+
+import os
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.ensemble import RandomForestRegressor
+
+from utils.direct_strategy import direct_model_filename, direct_training_frame
+
+DEFAULT_DRUGS = ['M01AB', 'M01AE', 'N02BA', 'N02BE', 'N05B', 'N05C', 'R03', 'R06']
+WEATHER_TYPES = ['Clear', 'Cloudy', 'Rain', 'Heavy Rain', 'Thunderstorm', 'Hazy']
+
+
+def make_drug_codes(n_drugs):
+    """
+    Build a list of drug codes. The real 8 ATC codes are used first so that
+    small scenarios look exactly like the production dataset.
+
+    Args:
+        n_drugs (int): Number of drug codes to generate
+
+    Returns:
+        list: Drug codes
+    """
+    codes = DEFAULT_DRUGS[:n_drugs]
+    codes += [f"SKU{i:05d}" for i in range(n_drugs - len(codes))]
+    return codes
+
+
+def make_sales_frame(n_drugs=8, n_days=730, end_date="2019-10-08", seed=42):
+    """
+    Generate a wide daily sales frame with the same layout as dataset/salesdaily.csv.
+
+    Args:
+        n_drugs (int): Number of drug columns
+        n_days (int): Length of the history in days
+        end_date (str): Last date of the history
+        seed (int): Random seed
+
+    Returns:
+        DataFrame: Synthetic sales history
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end_date, periods=n_days, freq='D')
+    drugs = make_drug_codes(n_drugs)
+
+    # Weekly and yearly seasonality on top of a per-drug level
+    level = rng.uniform(0.5, 40.0, size=n_drugs)
+    weekly = 1.0 + 0.25 * np.sin(2 * np.pi * dates.dayofweek.values / 7.0)
+    yearly = 1.0 + 0.15 * np.cos(2 * np.pi * dates.dayofyear.values / 365.25)
+    mean = np.outer(weekly * yearly, level)
+    sales = rng.poisson(mean).astype(float)
+
+    df = pd.DataFrame(sales, columns=drugs)
+    df.insert(0, 'datum', dates.strftime('%m/%d/%Y'))
+    df['Year'] = dates.year
+    df['Month'] = dates.month
+    df['Hour'] = 0
+    df['Weekday Name'] = dates.day_name()
+    return df
+
+
+def to_long_frame(sales_df):
+    """
+    Convert a wide sales frame to the long layout (one date, drug, qty row per sale day).
+
+    Days without sales have no row, as in a transaction export.
+
+    Args:
+        sales_df (DataFrame): Sales frame produced by make_sales_frame
+
+    Returns:
+        DataFrame: Long sales history with date, drug and qty columns
+    """
+    drugs = [col for col in sales_df.columns if col not in ('datum', 'Year', 'Month', 'Hour', 'Weekday Name')]
+    dates = pd.to_datetime(sales_df['datum']).dt.strftime('%Y-%m-%d')
+    values = sales_df[drugs].to_numpy()
+    rows, columns = np.nonzero(values)
+    return pd.DataFrame({
+        'date': dates.to_numpy()[rows],
+        'drug': np.asarray(drugs, dtype=object)[columns],
+        'qty': values[rows, columns],
+    })
+
+
+def make_weather_frame(start_date="2019-10-09", n_days=7, seed=42):
+    """
+    Generate a stubbed weather file matching dataset/weather/perlis_7day.csv.
+
+    Args:
+        start_date (str): First forecast date covered by the stub
+        n_days (int): Number of days of weather
+        seed (int): Random seed
+
+    Returns:
+        DataFrame: Synthetic weather data
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start=start_date, periods=n_days, freq='D')
+    return pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'),
+        'min_temp': rng.integers(22, 26, size=n_days),
+        'max_temp': rng.integers(31, 36, size=n_days),
+        'weather_type': rng.choice(WEATHER_TYPES, size=n_days),
+        'last_updated': f"{start_date} 00:00:00"
+    })
+
+
+def build_training_frame(sales_df, drug):
+    """
+    Build the feature matrix used by the training scripts for a single drug.
+
+    Args:
+        sales_df (DataFrame): Sales frame produced by make_sales_frame
+        drug (str): Drug code
+
+    Returns:
+        tuple: (X, y)
+    """
+    df = pd.DataFrame({'datum': pd.to_datetime(sales_df['datum']), drug: sales_df[drug]})
+    df['Year'] = df['datum'].dt.year
+    df['Month'] = df['datum'].dt.month
+    df['DayOfWeek'] = df['datum'].dt.dayofweek
+    df['Is_Weekend'] = df['DayOfWeek'] >= 5
+    df['max_temp'] = 33.0
+    df['min_temp'] = 24.0
+    df['weather_code'] = 0
+    df = pd.concat([df, pd.get_dummies(df['datum'].dt.day_name(), prefix='Weekday_Name')], axis=1)
+    df[f'{drug}_lag1'] = df[drug].shift(1)
+    df[f'{drug}_lag2'] = df[drug].shift(2)
+    df[f'{drug}_lag3'] = df[drug].shift(3)
+    df[f'{drug}_lag7'] = df[drug].shift(7)
+    df[f'{drug}_roll3_mean'] = df[drug].shift(1).rolling(window=3).mean()
+    df[f'{drug}_roll7_mean'] = df[drug].shift(1).rolling(window=7).mean()
+    df = df.dropna()
+
+    feature_cols = ['Year', 'Month', 'DayOfWeek', 'Is_Weekend',
+                    'max_temp', 'min_temp', 'weather_code'] + \
+                   sorted(col for col in df.columns if col.startswith('Weekday_Name_')) + \
+                   [f'{drug}_lag1', f'{drug}_lag2', f'{drug}_lag3', f'{drug}_lag7',
+                    f'{drug}_roll3_mean', f'{drug}_roll7_mean']
+    return df[feature_cols], df[drug]
+
+
+def fit_synthetic_models(sales_df, drugs, model_dir, model_type='rf', n_estimators=50, max_depth=3, seed=42,
+                         strategy='recursive'):
+    """
+    Fit small RandomForest models on synthetic data and save them with the
+    naming convention expected by MultiHorizonForecast.
+
+    Args:
+        sales_df (DataFrame): Sales frame produced by make_sales_frame
+        drugs (list): Drug codes to fit models for
+        model_dir (str): Directory to save the models in
+        model_type (str): Model type prefix used in the file name
+        n_estimators (int): Trees per forest
+        max_depth (int): Maximum tree depth
+        seed (int): Random seed
+        strategy (str): 'recursive' for one-step models, 'direct' for
+            horizon-conditioned *_direct_model_* files
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    for drug in drugs:
+        X, y = build_training_frame(sales_df, drug)
+        filename = f"{model_type}_model_{drug}.pkl"
+        if strategy == 'direct':
+            frame = direct_training_frame(X.assign(**{drug: y}), drug)
+            X, y = frame[list(X.columns) + ['Horizon']], frame[drug]
+            filename = direct_model_filename(model_type, drug)
+        model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth,
+                                      random_state=seed, n_jobs=1)
+        model.fit(X, y)
+        joblib.dump(model, os.path.join(model_dir, filename))
+
+
+def make_workspace(root, n_drugs=8, n_days=730, weather_days=7, n_estimators=50, seed=42, layout='wide',
+                   fit_models=True):
+    """
+    Create a complete synthetic workspace (sales data, stubbed weather and models)
+    laid out like the project root.
+
+    Args:
+        root (str): Directory to create the workspace in
+        n_drugs (int): Number of drugs
+        n_days (int): Length of the sales history in days
+        weather_days (int): Number of days covered by the weather stub
+        n_estimators (int): Trees per synthetic forest
+        seed (int): Random seed
+        layout (str): 'wide' (one column per drug) or 'long' (date, drug, qty rows) sales file
+        fit_models (bool): Fit the synthetic models (baseline-only workspaces need none)
+
+    Returns:
+        dict: MultiHorizonForecast configuration pointing at the workspace
+    """
+    data_path = os.path.join(root, "dataset", "salesdaily.csv")
+    weather_path = os.path.join(root, "dataset", "weather", "perlis_7day.csv")
+    model_dir = os.path.join(root, "saved_models")
+    output_path = os.path.join(root, "forecasts")
+    os.makedirs(os.path.dirname(weather_path), exist_ok=True)
+
+    sales_df = make_sales_frame(n_drugs, n_days, seed=seed)
+    (to_long_frame(sales_df) if layout == 'long' else sales_df).to_csv(data_path, index=False)
+
+    first_forecast_day = (pd.to_datetime(sales_df['datum'].iloc[-1]) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    make_weather_frame(first_forecast_day, weather_days, seed=seed).to_csv(weather_path, index=False)
+
+    drugs = make_drug_codes(n_drugs)
+    if fit_models:
+        fit_synthetic_models(sales_df, drugs, model_dir, n_estimators=n_estimators, seed=seed)
+
+    return {
+        'DATA_PATH': data_path,
+        'WEATHER_PATH': weather_path,
+        'MODEL_DIR': model_dir,
+        'OUTPUT_PATH': output_path,
+        'DRUG_COLUMNS': drugs,
+        'MODEL_TYPE': 'rf',
+        'FIRST_FORECAST_DAY': first_forecast_day
+    }
@@ -0,0 +1,169 @@
+import argparse
+import contextlib
+import io
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from utils.branches import iter_branches, branch_config, DEFAULT_REGISTRY, DEFAULT_BRANCH_ROOT
+from utils.concurrency import apply_parallelism, cpu_budget, parallelism_plan
+
+
+def forecast_branch(branch_id, command, options):
+    """
+    Run the requested forecasts for a single branch. Executed inside a worker
+    process; only a small summary is sent back so that forecast frames never
+    accumulate in the scheduler.
+
+    Args:
+        branch_id (str): Branch key
+        command (str): 'daily', 'monthly', 'yearly' or 'all'
+        options (dict): Forecast options (model type, horizons, paths)
+
+    Returns:
+        dict: Run summary for the branch
+    """
+    from multi_horizon_forecast import MultiHorizonForecast
+
+    start = time.perf_counter()
+    summary = {'branch_id': branch_id, 'status': 'ok', 'outputs': 0, 'seconds': 0.0, 'error': ''}
+    try:
+        config = branch_config(branch_id, {
+            'MODEL_TYPE': options['model_type'],
+            'FORECAST_DAYS': options['days'],
+            'WEATHER_ARCHIVE': options['weather_archive'],
+            'ESTIMATOR_THREADS': options.get('estimator_threads', 1)
+        }, registry_path=options['registry'], branch_root=options['branch_root'])
+
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            forecaster = MultiHorizonForecast(config)
+            results = []
+            if command in ('daily', 'all'):
+                results.append(forecaster.generate_daily_forecast(options['start_date'], options['days']))
+            if command in ('monthly', 'all'):
+                results.append(forecaster.generate_monthly_forecast(options['start_month'], options['months']))
+            if command in ('yearly', 'all'):
+                results.append(forecaster.generate_yearly_forecast(options['start_year'], options['years']))
+
+        summary['outputs'] = sum(result is not None for result in results)
+        if summary['outputs'] < len(results):
+            summary['status'] = 'partial'
+    except Exception as e:
+        summary['status'] = 'failed'
+        summary['error'] = str(e)
+
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def run_branches(branch_ids, command, options, workers=None, max_in_flight=None):
+    """
+    Stream branches through a process pool. At most max_in_flight branches are
+    submitted at any time, so the branch list can be arbitrarily long without
+    holding every branch in memory at once.
+
+    Args:
+        branch_ids (iterable): Branch keys (consumed lazily)
+        command (str): 'daily', 'monthly', 'yearly' or 'all'
+        options (dict): Forecast options passed to forecast_branch
+        workers (int, optional): Worker processes. Defaults to the CPU budget.
+        max_in_flight (int, optional): Submitted but unfinished branches. Defaults to 2 x workers.
+
+    Yields:
+        dict: Run summary per branch, in completion order
+    """
+    workers = workers or cpu_budget()
+    max_in_flight = max_in_flight or workers * 2
+
+    # The CPU budget is shared by the workers, so their thread pools never oversubscribe it
+    worker_plan = parallelism_plan(max(1, cpu_budget() // workers), parallel_tasks=1)
+    options = dict(options, estimator_threads=worker_plan['estimator_threads'])
+    pool_kwargs = {'max_workers': workers, 'initializer': apply_parallelism, 'initargs': (worker_plan,)}
+    if sys.version_info >= (3, 11):
+        # Recycle workers so loaded models and data from earlier branches are released
+        pool_kwargs['max_tasks_per_child'] = options.get('tasks_per_worker', 20)
+
+    with ProcessPoolExecutor(**pool_kwargs) as pool:
+        pending = set()
+        for branch_id in branch_ids:
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(pool.submit(forecast_branch, branch_id, command, options))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def main():
+    """
+    Forecast many pharmacy branches in parallel. Each branch's data, models,
+    weather and outputs are resolved by key through utils/branches.py.
+    """
+    parser = argparse.ArgumentParser(description='Multi-branch Drug Sales Forecasting')
+    parser.add_argument('command', type=str, choices=['daily', 'monthly', 'yearly', 'all'],
+                        help='Type of forecast to generate')
+    parser.add_argument('--branches', type=str,
+                        help='Comma-separated branch IDs (default: every registered branch)')
+    parser.add_argument('--registry', type=str, default=DEFAULT_REGISTRY,
+                        help='Branch registry CSV (branch_id,location_id)')
+    parser.add_argument('--branch-root', type=str, default=DEFAULT_BRANCH_ROOT,
+                        help='Directory holding one sub-directory per branch')
+    parser.add_argument('--weather-archive', type=str, default="dataset/weather/archive",
+                        help='Historical weather archive')
+    parser.add_argument('--model-type', type=str,
+                        choices=['rf', 'knn', 'xgboost', 'auto', 'snaive', 'profile', 'ets', 'croston', 'tsb'],
+                        default='rf',
+                        help='Type of model to use for forecasting (auto: per-drug routing table; '
+                             'snaive, profile, ets, croston, tsb: statistical baselines)')
+    parser.add_argument('--workers', type=int, default=cpu_budget(),
+                        help='Number of worker processes (default: the CPU budget, FORECAST_CPUS)')
+    parser.add_argument('--max-in-flight', type=int,
+                        help='Maximum branches submitted at once (default: 2 x workers)')
+    parser.add_argument('--start-date', type=str, help='Start date for daily forecast (YYYY-MM-DD)')
+    parser.add_argument('--days', type=int, default=7, help='Number of days to forecast')
+    parser.add_argument('--start-month', type=str, help='Start month for monthly forecast (YYYY-MM)')
+    parser.add_argument('--months', type=int, default=12, help='Number of months to forecast')
+    parser.add_argument('--start-year', type=int, help='Start year for yearly forecast')
+    parser.add_argument('--years', type=int, default=3, help='Number of years to forecast')
+    args = parser.parse_args()
+
+    if args.branches:
+        branch_ids = (b.strip() for b in args.branches.split(',') if b.strip())
+    else:
+        branch_ids = (b['branch_id'] for b in iter_branches(args.registry, args.branch_root))
+
+    options = {
+        'model_type': args.model_type,
+        'weather_archive': args.weather_archive,
+        'registry': args.registry,
+        'branch_root': args.branch_root,
+        'start_date': args.start_date,
+        'days': args.days,
+        'start_month': args.start_month,
+        'months': args.months,
+        'start_year': args.start_year,
+        'years': args.years,
+    }
+
+    print(f"Forecasting branches with {args.workers} workers using {args.model_type.upper()} model...")
+    counts = {'ok': 0, 'partial': 0, 'failed': 0}
+    for summary in run_branches(branch_ids, args.command, options, args.workers, args.max_in_flight):
+        counts[summary['status']] += 1
+        icon = {'ok': '✅', 'partial': '⚠️', 'failed': '❌'}[summary['status']]
+        detail = f" - {summary['error']}" if summary['error'] else ""
+        print(f"{icon} {summary['branch_id']}: {summary['status']} in {summary['seconds']:.2f}s{detail}")
+
+    print(f"\n📋 Branches: {counts['ok']} ok, {counts['partial']} partial, {counts['failed']} failed")
+
+
+if __name__ == "__main__":
+    start_time = datetime.now()
+    main()
+    elapsed = datetime.now() - start_time
+    print(f"\nTotal execution time: {elapsed.total_seconds():.2f} seconds")
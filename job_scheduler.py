@@ -0,0 +1,332 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.job_queue import JOB_KINDS, RETRY_DELAY_SECONDS, SQLiteJobQueue
+
+# Command each job kind runs; the job's arguments are appended
+JOB_COMMANDS = {
+    'forecast': [sys.executable, 'main.py'],
+    'train': [sys.executable, 'train_model_saperately.py'],
+    'backtest': [sys.executable, '-m', 'utils.direct_strategy'],
+    'weather-refresh': [sys.executable, '-m', 'utils.forecast_refresh', '--once', '--fetch-weather'],
+}
+
+# Training scripts selectable with the first argument of a train job
+TRAIN_SCRIPTS = {'weather': 'train_model_saperately.py', 'no-weather': 'train_model_no_weather.py'}
+
+# Jobs of each kind allowed to run at the same time
+DEFAULT_LIMITS = {'forecast': 2, 'weather-refresh': 1, 'backtest': 1, 'train': 1}
+
+# Kinds a higher-priority job may stop (they are queued again and restart later)
+PREEMPTIBLE_KINDS = {'train', 'backtest'}
+
+# Thread pools sized to a job's CPU budget (joblib's n_jobs=-1 follows LOKY_MAX_CPU_COUNT,
+# XGBoost and scikit-learn's OpenMP code follow OMP_NUM_THREADS)
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'LOKY_MAX_CPU_COUNT']
+
+STOP_TIMEOUT_SECONDS = 10
+
+
+class JobScheduler:
+    """
+    Runs queued jobs as subprocesses within a CPU budget, highest priority first.
+    """
+
+    def __init__(self, queue, cpus=None, limits=None, log_dir="forecasts/jobs", commands=None,
+                 retry_delay=RETRY_DELAY_SECONDS):
+        """
+        Args:
+            queue (JobQueue): Queue backend (SQLiteJobQueue or MemoryJobQueue)
+            cpus (int, optional): CPUs shared by the running jobs. Defaults to all CPUs.
+            limits (dict, optional): Kind -> jobs allowed at once, merged over DEFAULT_LIMITS
+            log_dir (str): Directory of the job logs (job_{id}.log)
+            commands (dict, optional): Kind -> command, merged over JOB_COMMANDS
+            retry_delay (float): Seconds before a failed job is retried, times its attempt number
+        """
+        self.queue = queue
+        self.cpus = cpus or os.cpu_count() or 1
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.log_dir = log_dir
+        self.commands = dict(JOB_COMMANDS, **(commands or {}))
+        self.retry_delay = retry_delay
+        # Job ID -> (process, job, CPU budget, log file)
+        self.running = {}
+        os.makedirs(self.log_dir, exist_ok=True)
+
+    def budget(self, job):
+        """CPUs a job runs with (its own budget, capped at the scheduler's)"""
+        return min(job['cpus'] or self.cpus, self.cpus)
+
+    def command_for(self, job):
+        """Command line of a job"""
+        command, args = list(self.commands[job['kind']]), list(job['args'])
+        if job['kind'] == 'train' and args and args[0] in TRAIN_SCRIPTS:
+            command[-1] = TRAIN_SCRIPTS[args.pop(0)]
+        return command + args
+
+    def log_path(self, job_id):
+        return os.path.join(self.log_dir, f"job_{job_id}.log")
+
+    def cpus_in_use(self):
+        return sum(budget for _, _, budget, _ in list(self.running.values()))
+
+    def _launch(self, job):
+        budget = self.budget(job)
+        env = dict(os.environ, FORECAST_JOB_ID=str(job['id']), **{name: str(budget) for name in THREAD_VARIABLES})
+        log = open(self.log_path(job['id']), 'a')
+        log.write(f"=== attempt {job['attempts'] + 1} at {time.strftime('%Y-%m-%d %H:%M:%S')}: "
+                  f"{' '.join(self.command_for(job))}\n")
+        log.flush()
+        process = subprocess.Popen(self.command_for(job), stdout=log, stderr=subprocess.STDOUT, env=env)
+        self.queue.start(job['id'], process.pid)
+        self.running[job['id']] = (process, job, budget, log)
+        print(f"▶️ Job {job['id']} ({job['kind']}, priority {job['priority']}, {budget} CPU) started")
+
+    def _stop(self, job_id):
+        process, _, _, log = self.running.pop(job_id)
+        process.terminate()
+        try:
+            process.wait(timeout=STOP_TIMEOUT_SECONDS)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        log.close()
+
+    def _reap(self):
+        for job_id, (process, job, _, log) in list(self.running.items()):
+            if self.queue.get(job_id)['state'] == 'cancelled':
+                self._stop(job_id)
+                print(f"🛑 Job {job_id} ({job['kind']}) cancelled")
+                continue
+            returncode = process.poll()
+            if returncode is None:
+                continue
+            self.running.pop(job_id)
+            log.close()
+            if returncode == 0:
+                self.queue.complete(job_id)
+                print(f"✅ Job {job_id} ({job['kind']}) done")
+            elif self.queue.fail(job_id, f"exit code {returncode}, see {self.log_path(job_id)}",
+                                 self.retry_delay):
+                print(f"⚠️ Job {job_id} ({job['kind']}) failed with exit code {returncode}, will retry")
+            else:
+                print(f"❌ Job {job_id} ({job['kind']}) failed with exit code {returncode}")
+
+    def _preemption_victims(self, job, needed):
+        """Running lower-priority preemptible jobs freeing at least `needed` CPUs, or None"""
+        candidates = sorted((entry for entry in self.running.values()
+                             if entry[1]['kind'] in PREEMPTIBLE_KINDS and entry[1]['priority'] > job['priority']),
+                            key=lambda entry: (-entry[1]['priority'], -entry[1]['id']))
+        victims, freed = [], 0
+        for _, victim, budget, _ in candidates:
+            if freed >= needed:
+                break
+            victims.append(victim)
+            freed += budget
+        return victims if freed >= needed else None
+
+    def step(self):
+        """
+        Reap finished jobs, then start ready jobs in priority order while CPUs are free,
+        preempting lower-priority training or backtests when a job does not fit.
+
+        Returns:
+            int: Jobs started
+        """
+        self._reap()
+        started = 0
+        for job in self.queue.ready():
+            running_kind = sum(entry[1]['kind'] == job['kind'] for entry in self.running.values())
+            if running_kind >= self.limits.get(job['kind'], 1):
+                continue
+            needed = self.budget(job) - (self.cpus - self.cpus_in_use())
+            if needed > 0:
+                victims = self._preemption_victims(job, needed)
+                if victims is None:
+                    # Strict priority: lower-priority jobs wait rather than take the CPUs first
+                    break
+                for victim in victims:
+                    self._stop(victim['id'])
+                    self.queue.requeue(victim['id'])
+                    print(f"⏸️ Job {victim['id']} ({victim['kind']}) preempted by job {job['id']} ({job['kind']})")
+            self._launch(job)
+            started += 1
+        return started
+
+    def stop_all(self):
+        """Stop every running job and queue it again"""
+        for job_id in list(self.running):
+            self._stop(job_id)
+            self.queue.requeue(job_id)
+
+    def idle(self):
+        """True when nothing runs and nothing is queued (including retries waiting for their delay)"""
+        return not self.running and not self.queue.jobs('queued')
+
+    def run(self, until_idle=False, poll_interval=1.0):
+        """
+        Schedule jobs until interrupted (or until the queue is empty).
+
+        Args:
+            until_idle (bool): Return once nothing runs and nothing is queued
+            poll_interval (float): Seconds between scheduling passes
+        """
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"↩️ Requeued jobs left running by an earlier scheduler: {recovered}")
+        print(f"🗓️ Scheduling jobs on {self.cpus} CPUs (Ctrl+C to stop)")
+        try:
+            while True:
+                self.step()
+                if until_idle and self.idle():
+                    break
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            print("Stopping running jobs...")
+        finally:
+            self.stop_all()
+
+    def status(self):
+        """
+        Scheduler and queue status.
+
+        Returns:
+            dict: CPUs, CPUs in use, running job IDs and job counts by state
+        """
+        return {'cpus': self.cpus, 'cpus_in_use': self.cpus_in_use(), 'running': sorted(self.running),
+                'counts': self.queue.counts()}
+
+
+def serve_status(scheduler, port, host="127.0.0.1"):
+    """
+    Serve the job status API from a background thread:
+        GET  /status            scheduler status
+        GET  /jobs[?state=...]  jobs
+        GET  /jobs/{id}         one job
+        POST /jobs              submit {"kind": ..., "args": [...], "priority", "cpus", "max_retries"}
+        POST /jobs/{id}/cancel  cancel a queued or running job
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    queue = scheduler.queue
+
+    class StatusHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, default=str).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path, _, query = self.path.partition('?')
+            parts = path.strip('/').split('/')
+            if parts == ['status']:
+                self._send(200, scheduler.status())
+            elif parts == ['jobs']:
+                state = dict(item.split('=', 1) for item in query.split('&') if '=' in item).get('state')
+                self._send(200, queue.jobs(state))
+            elif len(parts) == 2 and parts[0] == 'jobs' and parts[1].isdigit() and queue.get(int(parts[1])):
+                self._send(200, queue.get(int(parts[1])))
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            parts = self.path.strip('/').split('/')
+            try:
+                if parts == ['jobs']:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                    job_id = queue.submit(request.get('kind'), request.get('args'), request.get('priority'),
+                                          request.get('cpus'), request.get('max_retries'))
+                    self._send(201, queue.get(job_id))
+                elif len(parts) == 3 and parts[0] == 'jobs' and parts[1].isdigit() and parts[2] == 'cancel':
+                    self._send(200, {'cancelled': queue.cancel(int(parts[1]))})
+                else:
+                    self._send(404, {'error': 'not found'})
+            except ValueError as e:
+                self._send(400, {'error': str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), StatusHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📡 Job status API on http://{host}:{server.server_address[1]}/status")
+    return server
+
+
+def print_jobs(jobs):
+    import pandas as pd
+
+    if not jobs:
+        print("No jobs.")
+        return
+    table = pd.DataFrame(jobs)[['id', 'kind', 'state', 'priority', 'cpus', 'attempts', 'preemptions',
+                                'submitted_at', 'finished_at', 'args', 'error']]
+    table['args'] = table['args'].map(' '.join)
+    print(table.fillna('').to_string(index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local job scheduler for forecast, train, backtest and '
+                                                 'weather-refresh jobs')
+    parser.add_argument('--db', type=str, default="forecasts/jobs.db", help='Job queue database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    submit_parser = subparsers.add_parser('submit', help='Queue a job')
+    submit_parser.add_argument('--priority', type=int, help='Lower runs first (default by kind)')
+    submit_parser.add_argument('--cpus', type=int, help='CPU budget (default by kind)')
+    submit_parser.add_argument('--retries', type=int, help='Retries after a failed attempt (default by kind)')
+    submit_parser.add_argument('kind', type=str, choices=JOB_KINDS)
+    submit_parser.add_argument('args', nargs=argparse.REMAINDER, help='Arguments of the job command')
+
+    run_parser = subparsers.add_parser('run', help='Run the scheduler')
+    run_parser.add_argument('--cpus', type=int, help='CPUs shared by the jobs (default: all)')
+    run_parser.add_argument('--limit', type=str, action='append', default=[],
+                            help='Concurrency limit as kind=count (repeatable)')
+    run_parser.add_argument('--until-idle', action='store_true', help='Exit once the queue is empty')
+    run_parser.add_argument('--poll', type=float, default=1.0, help='Seconds between scheduling passes')
+    run_parser.add_argument('--status-port', type=int, help='Serve the status API on this port')
+    run_parser.add_argument('--log-dir', type=str, default="forecasts/jobs", help='Job log directory')
+
+    status_parser = subparsers.add_parser('status', help='Show jobs')
+    status_parser.add_argument('--job', type=int, help='Show one job')
+    status_parser.add_argument('--state', type=str, help='Only jobs in this state')
+
+    cancel_parser = subparsers.add_parser('cancel', help='Cancel a queued or running job')
+    cancel_parser.add_argument('job', type=int)
+    args = parser.parse_args()
+
+    queue = SQLiteJobQueue(args.db)
+    if args.command == 'submit':
+        try:
+            job_id = queue.submit(args.kind, args.args, args.priority, args.cpus, args.retries)
+        except ValueError as e:
+            queue.close()
+            submit_parser.error(str(e))
+        print(f"📋 Queued job {job_id} ({args.kind})")
+    elif args.command == 'run':
+        limits = {kind: int(count) for kind, count in (limit.split('=') for limit in args.limit)}
+        scheduler = JobScheduler(queue, cpus=args.cpus, limits=limits, log_dir=args.log_dir)
+        if args.status_port:
+            serve_status(scheduler, args.status_port)
+        scheduler.run(until_idle=args.until_idle, poll_interval=args.poll)
+    elif args.command == 'status':
+        if args.job:
+            job = queue.get(args.job)
+            print(json.dumps(job, indent=2, default=str) if job else f"❌ No job {args.job}")
+        else:
+            print(json.dumps(queue.counts()))
+            print_jobs(queue.jobs(args.state))
+    else:
+        print(f"🛑 Job {args.job} cancelled" if queue.cancel(args.job) else
+              f"⚠️ Job {args.job} is not queued or running")
+    queue.close()
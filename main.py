@@ -1,7 +1,53 @@
 import argparse
 import os
 from datetime import datetime
-from multi_horizon_forecast import MultiHorizonForecast
+
+# Kept in sync with utils.forecast_output.OUTPUT_FORMATS; duplicated so that
+# argument validation does not have to import pandas or pyarrow
+OUTPUT_FORMATS = ('csv', 'parquet', 'arrow')
+
+
+def validate_args(parser, args):
+    """
+    Validate arguments before any data, model or heavy library is loaded.
+    
+    Args:
+        parser (ArgumentParser): Parser used to report errors
+        args (Namespace): Parsed arguments
+    """
+    formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if unknown or not formats:
+        parser.error(f"--formats must be a comma-separated subset of {', '.join(OUTPUT_FORMATS)}")
+    
+    for value, fmt, label, name in [(args.start_date, "%Y-%m-%d", 'YYYY-MM-DD', '--start-date'),
+                                    (args.start_month, "%Y-%m", 'YYYY-MM', '--start-month'),
+                                    (args.origin_start, "%Y-%m-%d", 'YYYY-MM-DD', '--origin-start'),
+                                    (args.origin_end, "%Y-%m-%d", 'YYYY-MM-DD', '--origin-end')]:
+        if value:
+            try:
+                datetime.strptime(value, fmt)
+            except ValueError:
+                parser.error(f"{name} must be in {label} format")
+    
+    if args.origins is not None:
+        origins = [origin.strip() for origin in args.origins.split(',') if origin.strip()]
+        if not origins:
+            parser.error("--origins must list at least one date")
+        for origin in origins:
+            try:
+                datetime.strptime(origin, "%Y-%m-%d")
+            except ValueError:
+                parser.error(f"--origins must be comma-separated dates in YYYY-MM-DD format (got '{origin}')")
+    
+    if args.route_tolerance is not None and args.route_tolerance < 0:
+        parser.error("--route-tolerance must not be negative")
+    
+    if args.batch_size is not None and args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    
+    if args.command == 'multi-origin' and not (args.origins or (args.origin_start and args.origin_end)):
+        parser.error("multi-origin requires --origins or --origin-start and --origin-end")
 
 def main():
     """
@@ -11,20 +57,64 @@ def main():
     parser = argparse.ArgumentParser(description='Drug Sales Forecasting System')
     
     # Main command argument
-    parser.add_argument('command', type=str, choices=['daily', 'monthly', 'yearly', 'all'],
+    parser.add_argument('command', type=str, choices=['daily', 'monthly', 'yearly', 'all', 'multi-origin'],
                         help='Type of forecast to generate')
     
     # General options
-    parser.add_argument('--data', type=str, default="dataset/salesdaily.csv",
-                        help='Path to sales data CSV file')
-    parser.add_argument('--weather', type=str, default="dataset/weather/perlis_7day.csv",
-                        help='Path to weather data CSV file')
-    parser.add_argument('--models', type=str, default="saved_models",
-                        help='Directory containing trained models')
-    parser.add_argument('--output', type=str, default="forecasts",
-                        help='Output directory for forecast files')
-    parser.add_argument('--model-type', type=str, choices=['rf', 'knn', 'xgboost'], default='rf',
-                        help='Type of model to use for forecasting (rf=Random Forest, knn=K-Nearest Neighbors, xgb=XGBoost)')
+    parser.add_argument('--data', type=str,
+                        help='Path to sales data CSV file (default: dataset/salesdaily.csv)')
+    parser.add_argument('--weather', type=str,
+                        help='Path to weather data CSV file (default: dataset/weather/perlis_7day.csv)')
+    parser.add_argument('--weather-archive', type=str, default="dataset/weather/archive",
+                        help='Historical weather archive (falls back to --weather when empty)')
+    parser.add_argument('--models', type=str,
+                        help='Directory containing trained models (default: saved_models)')
+    parser.add_argument('--output', type=str,
+                        help='Output directory for forecast files (default: forecasts)')
+    parser.add_argument('--formats', type=str, default='csv',
+                        help='Comma-separated output formats: csv, parquet, arrow (default: csv)')
+    parser.add_argument('--write-pivot', action='store_true',
+                        help='Also write the wide (pivot) daily forecast files')
+    parser.add_argument('--db', type=str, default=os.environ.get('FORECAST_DB'),
+                        help='Also write forecasts to a SQL store (sqlite:///path or postgresql://...)')
+    parser.add_argument('--run-id', type=str,
+                        help='Run identifier for the SQL store (default: current timestamp)')
+    parser.add_argument('--cube-dir', type=str,
+                        help='Directory for pre-aggregated dashboard cubes (default: <output>/cubes)')
+    parser.add_argument('--no-cubes', action='store_true',
+                        help='Do not update the dashboard cubes')
+    parser.add_argument('--memory-efficient', action='store_true',
+                        help='Load only the trailing history window as float32 and do not keep models in memory')
+    parser.add_argument('--history-days', type=int,
+                        help='Days of history kept in memory-efficient mode (default: 372; widened to '
+                             'cover earlier multi-origin origins)')
+    parser.add_argument('--drugs', type=str,
+                        help='Comma-separated drug codes (default: every drug in the sales history)')
+    parser.add_argument('--batch-size', type=int,
+                        help='Drugs forecast at a time; models are released after each batch (default: all at once)')
+    parser.add_argument('--branch', type=str,
+                        help='Branch ID; unset paths resolve to that branch (see utils/branches.py)')
+    parser.add_argument('--model-type', type=str,
+                        choices=['rf', 'knn', 'xgboost', 'auto', 'snaive', 'profile', 'ets', 'croston', 'tsb'],
+                        default='rf',
+                        help='Type of model to use for forecasting (rf=Random Forest, knn=K-Nearest Neighbors, '
+                             'xgb=XGBoost, auto=per-drug choice from the training routing table; '
+                             'snaive, profile, ets, croston, tsb=statistical baselines that need no trained model)')
+    parser.add_argument('--compressed', action='store_true',
+                        help='Use the compressed *_compressed.pkl models where they exist (see utils/forest_compression.py)')
+    parser.add_argument('--fallback-baseline', type=str, choices=['snaive', 'profile', 'ets', 'croston', 'tsb', 'none'],
+                        help='Baseline forecasting drugs whose model file is missing (default: ets; none skips them)')
+    parser.add_argument('--sparse-method', type=str, choices=['croston', 'tsb', 'none'],
+                        help='Forecast intermittent and lumpy drugs with this estimator instead of their models '
+                             '(default: the estimator training scored them with, see utils/demand_patterns.py; '
+                             'none uses their models)')
+    parser.add_argument('--route-tolerance', type=float,
+                        help='With --model-type auto: validation RMSE a faster model may lose (default: 0.05 = 5%%)')
+    parser.add_argument('--max-latency-ms', type=float,
+                        help='With --model-type auto: prefer models predicting within this latency')
+    parser.add_argument('--strategy', type=str, choices=['recursive', 'direct'], default='recursive',
+                        help='recursive: each day feeds the next day\'s lags; direct: every day predicted from '
+                             'the origin by the *_direct_model_* files (FORECAST_STRATEGY=direct training)')
     
     # Daily forecast options
     parser.add_argument('--start-date', type=str, 
@@ -32,6 +122,14 @@ def main():
     parser.add_argument('--days', type=int, default=7,
                         help='Number of days to forecast')
     
+    # Multi-origin forecast options
+    parser.add_argument('--origins', type=str,
+                        help='Comma-separated forecast origins for multi-origin forecasts (YYYY-MM-DD,...)')
+    parser.add_argument('--origin-start', type=str,
+                        help='First forecast origin of a daily range (YYYY-MM-DD)')
+    parser.add_argument('--origin-end', type=str,
+                        help='Last forecast origin of a daily range (YYYY-MM-DD)')
+    
     # Monthly forecast options
     parser.add_argument('--start-month', type=str,
                         help='Start month for monthly forecast (YYYY-MM)')
@@ -45,21 +143,43 @@ def main():
                         help='Number of years to forecast')
     
     args = parser.parse_args()
+    validate_args(parser, args)
     
-    # Create output directory if it doesn't exist
-    os.makedirs(args.output, exist_ok=True)
-    
-    # Set up configuration
+    # Set up configuration; paths left unset fall back to the forecaster
+    # defaults, or to the branch partition when --branch is given
     config = {
         'DATA_PATH': args.data,
         'WEATHER_PATH': args.weather,
+        'WEATHER_ARCHIVE': args.weather_archive,
         'MODEL_DIR': args.models,
         'FORECAST_DAYS': args.days,
         'OUTPUT_PATH': args.output,
-        'MODEL_TYPE': args.model_type  # Add model type to configuration
+        'MODEL_TYPE': args.model_type,  # Add model type to configuration
+        'ROUTE_TOLERANCE': args.route_tolerance,
+        'ROUTE_MAX_LATENCY_MS': args.max_latency_ms,
+        'STRATEGY': args.strategy,
+        'FALLBACK_BASELINE': args.fallback_baseline,
+        'COMPRESSED_MODELS': args.compressed,
+        'SPARSE_METHOD': args.sparse_method,
+        'BRANCH_ID': args.branch,
+        'CUBE_DIR': args.cube_dir,
+        'FORECAST_DB': args.db,
+        'OUTPUT_FORMATS': [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()],
+        'WRITE_PIVOT': args.write_pivot,
+        'RUN_ID': args.run_id,
+        'WRITE_CUBES': not args.no_cubes,
+        'MEMORY_EFFICIENT': args.memory_efficient,
+        'HISTORY_WINDOW_DAYS': args.history_days,
+        'DRUG_COLUMNS': args.drugs.split(',') if args.drugs else None,
+        'DRUG_BATCH_SIZE': args.batch_size
     }
+    config = {key: value for key, value in config.items() if value is not None}
+    
+    # Imported here so that --help and argument errors return without loading
+    # pandas, numpy or the model libraries
+    from multi_horizon_forecast import MultiHorizonForecast
     
-    # Initialize forecaster
+    # Initialize forecaster (creates the output directory)
     forecaster = MultiHorizonForecast(config)
     print(f"Using model type: {args.model_type.upper()}")
     
@@ -85,7 +205,19 @@ def main():
             print(f"Yearly forecast generated successfully. Preview:")
             print(yearly_forecast)
     
-    print(f"\nAll requested forecasts have been saved to: {args.output}/")
+    if args.command == 'multi-origin':
+        print("\n===== GENERATING MULTI-ORIGIN FORECAST =====")
+        if args.origins:
+            origins = [o.strip() for o in args.origins.split(',') if o.strip()]
+        else:
+            import pandas as pd
+            origins = pd.date_range(args.origin_start, args.origin_end, freq='D')
+        multi_origin_forecast = forecaster.generate_multi_origin_forecast(origins, args.days)
+        if multi_origin_forecast is not None:
+            print(f"Multi-origin forecast generated successfully. Preview:")
+            print(multi_origin_forecast.head())
+    
+    print(f"\nAll requested forecasts have been saved to: {forecaster.output_path}/")
 
 if __name__ == "__main__":
     start_time = datetime.now()
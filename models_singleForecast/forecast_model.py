@@ -297,6 +297,11 @@ if forecast_results:
     pivot_df = forecast_df.pivot(index='Date', columns='Drug', values='Predicted_Sales')
     pivot_df.reset_index(inplace=True)
     
+    # Keep the previous forecast for the comparison below before it is overwritten
+    previous_forecast = None
+    if os.path.exists(OUTPUT_PATH):
+        previous_forecast = pd.read_csv(OUTPUT_PATH, parse_dates=['Date'])
+    
     # Save both formats
     forecast_df.to_csv(OUTPUT_PATH, index=False)
     pivot_df.to_csv("drug_forecasts_pivot.csv", index=False)
@@ -305,30 +310,25 @@ if forecast_results:
     print(f"   - {OUTPUT_PATH} (long format)")
     print(f"   - drug_forecasts_pivot.csv (wide format)")
     
-    # Optional: Compare with previous forecast for overlap dates
-    try:
-        previous_forecast = pd.read_csv("drug_forecasts_pivot.csv")
-        previous_forecast['Date'] = pd.to_datetime(previous_forecast['Date'])
-        
-        # Find overlapping dates between old and new forecasts
-        overlap_dates = set(previous_forecast['Date'].dt.date).intersection(set(pivot_df['Date'].dt.date))
-        
-        if overlap_dates:
-            print("\n📊 Forecast comparison for overlapping dates:")
-            for date in sorted(overlap_dates):
-                old_row = previous_forecast[previous_forecast['Date'].dt.date == date]
-                new_row = pivot_df[pivot_df['Date'].dt.date == date]
-                
-                print(f"  📅 {date}:")
-                for drug in drug_columns:
-                    if drug in old_row.columns and drug in new_row.columns:
-                        old_val = old_row[drug].values[0]
-                        new_val = new_row[drug].values[0]
-                        diff_pct = ((new_val - old_val) / old_val) * 100 if old_val != 0 else float('inf')
-                        
-                        print(f"    - {drug}: Old={old_val:.2f}, New={new_val:.2f}, Diff={diff_pct:.1f}%")
-    except Exception as e:
-        print(f"Note: Could not compare with previous forecast: {str(e)}")
+    # Optional: Compare with previous forecast for overlap dates, joined on (Drug, Date)
+    if previous_forecast is not None:
+        try:
+            comparison = previous_forecast.merge(forecast_df, on=['Drug', 'Date'], suffixes=('_Old', '_New'))
+            comparison = comparison.sort_values(['Date', 'Drug'])
+            old_val = comparison['Predicted_Sales_Old']
+            new_val = comparison['Predicted_Sales_New']
+            comparison['Diff_Pct'] = np.where(old_val != 0, (new_val - old_val) / old_val.where(old_val != 0) * 100,
+                                              np.inf)
+            
+            if not comparison.empty:
+                print("\n📊 Forecast comparison for overlapping dates:")
+                for date, rows in comparison.groupby(comparison['Date'].dt.date):
+                    print(f"  📅 {date}:")
+                    for row in rows.itertuples(index=False):
+                        print(f"    - {row.Drug}: Old={row.Predicted_Sales_Old:.2f}, "
+                              f"New={row.Predicted_Sales_New:.2f}, Diff={row.Diff_Pct:.1f}%")
+        except Exception as e:
+            print(f"Note: Could not compare with previous forecast: {str(e)}")
     
     # Preview results
     print("\n📊 Preview of forecasts:")
@@ -1,31 +1,57 @@
-from skopt import BayesSearchCV
 from skopt.space import Integer
 from sklearn.metrics import make_scorer, mean_squared_error, mean_absolute_error
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
-import joblib, os, pandas as pd, numpy as np
-import warnings
+import joblib, os, time, pandas as pd, numpy as np
+import warnings, sys
 warnings.filterwarnings('ignore')
 
+# Allow importing the shared utils package when run as models_singleForecast/train_model.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.weather_archive import load_weather_frame
+from utils.sales_data import read_sales_history, add_calendar_features, memory_efficient_from_env
+from utils.sales_data import discover_drugs
+from utils.branches import branch_config, branch_from_env
+from utils.weather_features import attach_weather, monthly_weather_profile
+from utils.tuning_history import TuningHistory, sales_profile, warm_started_search
+
 # ----------- Configuration -----------
 DATA_PATH = "dataset/salesdaily.csv"
 WEATHER_PATH = "dataset/weather/perlis_7day.csv"
+WEATHER_ARCHIVE = "dataset/weather/archive"
+LOCATION_ID = "St001"
 MODEL_DIR = "saved_models"
+# FORECAST_MEMORY_EFFICIENT=1 loads drug columns as float32 and calendar features as small ints
+MEMORY_EFFICIENT = memory_efficient_from_env()
+# Every evaluated hyperparameter point is kept; later searches start from them
+TUNING_DB = "tuning_history_single.db"
+N_ITER = 25
+WARM_START_N_ITER = 10
+RESULTS_FILE = "model_results_summary.csv"
+# FORECAST_BRANCH=B001 trains one branch: its sales history, weather location and
+# saved_models/B001/ (see utils/branches.py); its tuning history and results go there too
+BRANCH_ID = branch_from_env()
+if BRANCH_ID:
+    BRANCH = branch_config(BRANCH_ID)
+    DATA_PATH, LOCATION_ID, WEATHER_PATH, MODEL_DIR = (BRANCH[key] for key in
+                                                       ('DATA_PATH', 'LOCATION_ID', 'WEATHER_PATH', 'MODEL_DIR'))
+    TUNING_DB, RESULTS_FILE = (os.path.join(MODEL_DIR, path) for path in (TUNING_DB, RESULTS_FILE))
+    print(f"🏬 Training branch {BRANCH_ID}: {DATA_PATH} -> {MODEL_DIR}")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-drug_columns = ['M01AB', 'M01AE', 'N02BA', 'N02BE', 'N05B', 'N05C', 'R03', 'R06']
+# Every drug in the sales history (a branch's catalogue may differ from the shared one)
+drug_columns = discover_drugs(DATA_PATH)
 
 # ----------- Load Sales Data -----------
 print("Loading sales data...")
-df = pd.read_csv(DATA_PATH)
-df['datum'] = pd.to_datetime(df['datum'])
-df = df.sort_values('datum')
-df.rename(columns=lambda x: x.strip().replace(' ', '_'), inplace=True)
+df = read_sales_history(DATA_PATH, drug_columns, memory_efficient=MEMORY_EFFICIENT)
 print(f"Sales data loaded: {df.shape[0]} rows")
 
 # ----------- Load Weather Data -----------
 print("Loading weather data...")
-weather_df = pd.read_csv(WEATHER_PATH)
+# Range query from the start of the sales history; falls back to the CSV store
+weather_df = load_weather_frame(LOCATION_ID, start=df['datum'].min(), archive_dir=WEATHER_ARCHIVE,
+                                fallback_csv=WEATHER_PATH)
 weather_df.columns = weather_df.columns.str.strip().str.replace(" ", "_").str.lower()
 weather_df['date'] = pd.to_datetime(weather_df['date'])
 
@@ -65,12 +91,7 @@ print(f"Weather data loaded: {weather_df.shape[0]} rows")
 # ----------- Feature Engineering -----------
 print("Performing feature engineering...")
 # Add time-based features to main dataframe
-df['Year'] = df['datum'].dt.year
-df['Month'] = df['datum'].dt.month
-df['DayOfWeek'] = df['datum'].dt.dayofweek
-df['Is_Weekend'] = df['DayOfWeek'] >= 5
-df['Weekday_Name'] = df['datum'].dt.day_name()
-df = pd.get_dummies(df, columns=['Weekday_Name'])
+df = add_calendar_features(df, memory_efficient=MEMORY_EFFICIENT)
 
 # ----------- Handle Data Imbalance Issues -----------
 # Option 1: For historical analysis (using only available weather data)
@@ -79,51 +100,12 @@ df_historical = df[df['datum'].isin(available_dates)].copy()
 
 # Option 2: For future prediction (filling missing weather with averages or similar days)
 # Group weather by month to get seasonal patterns
-weather_df['Month'] = weather_df['date'].dt.month
-
-# Safe aggregation function for mode that handles empty series
-def safe_mode(x):
-    if x.empty:
-        return 0  # Default to 'Clear' if no data
-    mode_result = x.mode()
-    if len(mode_result) == 0:
-        return 0
-    return mode_result[0]
-
-monthly_weather_avg = weather_df.groupby('Month').agg({
-    'max_temp': 'mean',
-    'min_temp': 'mean',
-    'weather_code': safe_mode
-}).reset_index()
-
-# Function to get weather features for any date
-def get_weather_features(date, weather_df, monthly_avg):
-    # Try exact match first
-    exact_match = weather_df[weather_df['date'] == date]
-    if not exact_match.empty:
-        return exact_match[['max_temp', 'min_temp', 'weather_code']].iloc[0].to_dict()
-    
-    # Fall back to monthly average
-    month = date.month
-    avg_data = monthly_avg[monthly_avg['Month'] == month]
-    if not avg_data.empty:
-        return avg_data[['max_temp', 'min_temp', 'weather_code']].iloc[0].to_dict()
-    
-    # Last resort: return global averages
-    return {
-        'max_temp': weather_df['max_temp'].mean() if not weather_df['max_temp'].empty else 30,
-        'min_temp': weather_df['min_temp'].mean() if not weather_df['min_temp'].empty else 24,
-        'weather_code': weather_df['weather_code'].mode()[0] if not weather_df['weather_code'].empty else 0
-    }
+monthly_weather_avg = monthly_weather_profile(weather_df)
 
-# Apply weather features to all dates in sales data
+# Apply weather features to all dates in sales data: observed weather of the
+# day, else the monthly average, else the overall average (one join for all dates)
 print("Applying weather features to sales data...")
-weather_features = []
-for date in df['datum']:
-    features = get_weather_features(date, weather_df, monthly_weather_avg)
-    weather_features.append(features)
-
-weather_features_df = pd.DataFrame(weather_features)
+weather_features_df = attach_weather(df['datum'], weather_df, monthly_weather_avg)
 df = pd.concat([df.reset_index(drop=True), weather_features_df], axis=1)
 
 # Define RMSE scorer
@@ -134,13 +116,19 @@ rmse_scorer = make_scorer(rmse, greater_is_better=False)
 
 # ----------- Model Training Loop -----------
 min_required_rows = 20  # Minimum data points required
+
+# Columns shared by every drug's model frame; other drugs' columns are never copied
+base_columns = [col for col in ['Year', 'Month', 'DayOfWeek', 'Is_Weekend', 'max_temp', 'min_temp', 'weather_code']
+                if col in df.columns] + [col for col in df.columns if col.startswith('Weekday_Name_')]
 results = []
+tuning_history = TuningHistory(TUNING_DB)
+run_id = time.strftime("%Y%m%dT%H%M%S")
 
 for drug in drug_columns:
     print(f"\n🔍 Processing model for {drug}...")
     
-    # Create a copy to avoid modifying the original dataframe
-    df_drug = df.copy()
+    # Copy only this drug's columns so the original dataframe is not modified
+    df_drug = df[['datum', drug] + base_columns].copy()
     
     # Add lag features specifically for this drug
     df_drug[f'{drug}_lag1'] = df_drug[drug].shift(1)
@@ -178,6 +166,9 @@ for drug in drug_columns:
     
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
+    # Sales profile used to transfer tuning results between similar drugs
+    tuning_history.set_profile(drug, sales_profile(y_train))
+    
     # Define search space
     search_space = {
         'n_estimators': Integer(50, 300),
@@ -190,18 +181,22 @@ for drug in drug_columns:
     rf = RandomForestRegressor(random_state=42)
     
     try:
-        opt = BayesSearchCV(
-            rf,
-            search_spaces=search_space,
-            n_iter=25,
+        opt, warm_start = warm_started_search(
+            tuning_history, drug, "RandomForest", rf, search_space,
+            n_iter=N_ITER,
+            warm_n_iter=WARM_START_N_ITER,
             scoring=rmse_scorer,
             cv=3,
             random_state=42,
             n_jobs=-1,
             verbose=0
         )
+        print(f"🔍 Search: {warm_start} start, {opt.n_iter} iterations")
         
+        search_start = time.perf_counter()
         opt.fit(X_train, y_train)
+        search_seconds = time.perf_counter() - search_start
+        tuning_history.record_search(drug, "RandomForest", opt, warm_start, search_seconds, run_id)
         
         best_model = opt.best_estimator_
         y_pred = best_model.predict(X_test)
@@ -233,17 +228,26 @@ for drug in drug_columns:
             'RMSE': rmse_val,
             'MAE': mae_val,
             'Samples': X.shape[0],
-            'Best Params': opt.best_params_
+            'Best Params': opt.best_params_,
+            'Warm Start': warm_start,
+            'Search Seconds': search_seconds
         })
         
     except Exception as e:
         print(f"❌ Error training model for {drug}: {str(e)}")
 
+# Search time of warm-started searches compared with cold ones
+search_report = tuning_history.search_report()
+tuning_history.close()
+if not search_report.empty:
+    print("\n⏱️ Hyperparameter search time by warm start:")
+    print(search_report.to_string(index=False))
+
 # Print summary of results
 if results:
     results_df = pd.DataFrame(results)
     print("\n📋 Summary of Results:")
     print(results_df[['Drug', 'RMSE', 'MAE', 'Samples']])
-    results_df.to_csv('model_results_summary.csv', index=False)
+    results_df.to_csv(RESULTS_FILE, index=False)
 else:
     print("\n❌ No models were successfully trained. Check your data.")
\ No newline at end of file
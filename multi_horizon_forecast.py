@@ -1,9 +1,21 @@
 import pandas as pd
 import numpy as np
-import joblib
 import os
 from datetime import datetime, timedelta, date
 import calendar
+from utils.weather_archive import load_weather_frame, DEFAULT_ARCHIVE_DIR
+from utils.branches import branch_config
+from utils.forecast_store import ForecastStore, new_run_id, to_long
+from utils.forecast_output import ForecastArray, write_frame
+from utils.sales_data import read_sales_history, sales_drug_columns, DEFAULT_HISTORY_WINDOW
+from utils.weather_features import WEATHER_FEATURES, attach_weather, monthly_weather_profile
+from utils.model_routing import DEFAULT_TOLERANCE, load_routing_table, choose_routes
+from utils.direct_strategy import direct_model_filename, horizon_feature, lag_feature_names
+from utils.baseline_models import BASELINE_MODELS, DEFAULT_FALLBACK, baseline_forecast
+from utils.feature_selection import model_features
+from utils.forest_compression import compressed_model_path
+from utils.concurrency import parallelism_plan, set_estimator_threads
+from utils.demand_patterns import SPARSE_PATTERNS, classify_demand, trained_sparse_methods
 
 class MultiHorizonForecast:
     """
@@ -16,21 +28,100 @@ class MultiHorizonForecast:
         Initialize the forecasting system with configuration parameters.
         
         Args:
-            config (dict): Configuration dictionary containing paths and parameters
+            config (dict): Configuration dictionary containing paths and parameters.
+                When BRANCH_ID is set, unset paths are resolved to that branch's partition.
         """
+        self.branch_id = config.get('BRANCH_ID')
+        if self.branch_id:
+            config = branch_config(self.branch_id, config)
+        
         self.data_path = config.get('DATA_PATH', "dataset/salesdaily.csv")
         self.weather_path = config.get('WEATHER_PATH', "dataset/weather/perlis_7day.csv")
+        self.weather_archive = config.get('WEATHER_ARCHIVE', DEFAULT_ARCHIVE_DIR)
+        self.location_id = config.get('LOCATION_ID', "St001")
         self.model_dir = config.get('MODEL_DIR', "saved_models")
+        # Shared models used when a branch has no model of its own
+        self.fallback_model_dir = config.get('FALLBACK_MODEL_DIR')
         self.forecast_days = config.get('FORECAST_DAYS', 7)
         self.output_path = config.get('OUTPUT_PATH', "forecasts")
-        self.drug_columns = config.get('DRUG_COLUMNS', 
-                                     ['M01AB', 'M01AE', 'N02BA', 'N02BE', 'N05B', 'N05C', 'R03', 'R06'])
+        # Drugs to forecast; None discovers every drug in the sales history (wide or long layout)
+        self.drug_columns = config.get('DRUG_COLUMNS')
+        # Drugs forecast at a time; loaded models are released after each batch so that
+        # memory stays bounded for catalogs of thousands of drugs (None = all at once)
+        self.drug_batch_size = config.get('DRUG_BATCH_SIZE')
         # Set default model type to 'rf' for backward compatibility
         self.model_type = config.get('MODEL_TYPE', 'rf')
         
+        # 'auto' routes each drug to a model from the training-time routing table:
+        # the fastest one within ROUTE_TOLERANCE of the drug's best validation RMSE
+        self.route_tolerance = config.get('ROUTE_TOLERANCE', DEFAULT_TOLERANCE)
+        self.route_max_latency_ms = config.get('ROUTE_MAX_LATENCY_MS')
+        self._routes = None
+        
+        # 'recursive' feeds predictions back as lags; 'direct' predicts every horizon
+        # from the origin with the horizon-conditioned *_direct_model_* files
+        self.strategy = config.get('STRATEGY', 'recursive')
+        
+        # Statistical baseline ('snaive', 'profile', 'ets', 'croston', 'tsb') forecasting drugs whose
+        # model file is missing; 'none' skips them instead
+        fallback_baseline = config.get('FALLBACK_BASELINE', DEFAULT_FALLBACK)
+        self.fallback_baseline = None if fallback_baseline in (None, 'none') else fallback_baseline
+        
+        # Sparse-demand fast path: drugs the training run scored with Croston/TSB (its
+        # demand_patterns.csv) are forecast by that estimator, all at once, instead of by a
+        # model. 'croston' or 'tsb' classifies the loaded history and uses that estimator
+        # for every intermittent or lumpy drug instead; 'none' forecasts them with their models.
+        sparse_method = config.get('SPARSE_METHOD')
+        self.sparse_method = None if sparse_method == 'none' else sparse_method
+        self.follow_trained_sparse = sparse_method is None
+        self._demand_patterns = None
+        self._trained_sparse = None
+        
+        # Prefer the {model}_compressed.pkl files written by utils/forest_compression.py
+        self.use_compressed = config.get('COMPRESSED_MODELS', False)
+        
+        # Output file formats ('csv', 'parquet', 'arrow'); daily pivot files are opt-in
+        self.output_formats = config.get('OUTPUT_FORMATS', ['csv'])
+        self.write_pivot = config.get('WRITE_PIVOT', False)
+        
+        # Pre-aggregated dashboard cubes are refreshed whenever forecasts are written
+        self.write_cubes = config.get('WRITE_CUBES', True)
+        self.cube_dir = config.get('CUBE_DIR', os.path.join(self.output_path, "cubes"))
+        self.cube_store = None
+        self._pending_cube_frames = []
+        self._defer_cubes = False
+        
+        # Optional SQL store (sqlite:///... or postgresql://...) receiving every forecast written
+        self.forecast_db = config.get('FORECAST_DB')
+        self.run_id = config.get('RUN_ID') or new_run_id()
+        self._forecast_store = None
+        
         # Ensure output directory exists
         os.makedirs(self.output_path, exist_ok=True)
         
+        # Memory-efficient mode: float32 history limited to the trailing window the
+        # recursive forecaster needs, and models are not kept after use
+        self.memory_efficient = config.get('MEMORY_EFFICIENT', False)
+        self.history_window = config.get('HISTORY_WINDOW_DAYS', DEFAULT_HISTORY_WINDOW)
+        # Trailing days currently loaded (widened by cover_history for earlier origins; None = all)
+        self._loaded_window = self.history_window
+        self.cache_models = config.get('CACHE_MODELS', not self.memory_efficient)
+        
+        # Loaded models keyed by path, so repeated runs do not unpickle them again
+        self._model_cache = {}
+        
+        # Threads per prediction (n_jobs of the loaded models), from the CPU budget
+        # and FORECAST_DETERMINISTIC (see utils/concurrency.py)
+        self.estimator_threads = config.get('ESTIMATOR_THREADS',
+                                            parallelism_plan(parallel_tasks=1)['estimator_threads'])
+        
+        # Recursion checkpoints of the last daily forecast of each drug (the lag and
+        # rolling features, weather and prediction of every step). A later forecast
+        # of the same window resumes from the first step whose weather changed.
+        self.use_checkpoints = config.get('RECURSION_CHECKPOINTS', False)
+        self._checkpoints = {}
+        self.checkpoint_stats = {'reused': 0, 'computed': 0}
+        
         # Initialize data
         self.df = None
         self.weather_df = None
@@ -40,15 +131,21 @@ class MultiHorizonForecast:
         """Load and preprocess sales and weather data"""
         print("Loading data...")
         
-        # Load sales data
-        self.df = pd.read_csv(self.data_path)
-        self.df['datum'] = pd.to_datetime(self.df['datum'])
-        self.df = self.df.sort_values('datum')
-        self.df.rename(columns=lambda x: x.strip().replace(' ', '_'), inplace=True)
+        # Load sales data (in memory-efficient mode only the trailing window, as float32)
+        self.df = read_sales_history(self.data_path, self.drug_columns, self.memory_efficient,
+                                     self._loaded_window if self.memory_efficient else None)
+        self._demand_patterns = None
+        if self.drug_columns is None:
+            self.drug_columns = sales_drug_columns(self.df)
+            print(f"🔍 Discovered {len(self.drug_columns)} drugs in {self.data_path}")
         
-        # Load weather data
+        # Load weather data - only the last year of history (for the monthly
+        # fallbacks) and anything after it is read from the archive
         try:
-            self.weather_df = pd.read_csv(self.weather_path)
+            weather_start = self.df['datum'].max() - pd.Timedelta(days=365)
+            self.weather_df = load_weather_frame(self.location_id, start=weather_start,
+                                                 archive_dir=self.weather_archive,
+                                                 fallback_csv=self.weather_path)
             self.weather_df.columns = self.weather_df.columns.str.strip().str.replace(" ", "_").str.lower()
             self.weather_df['date'] = pd.to_datetime(self.weather_df['date'])
             
@@ -67,15 +164,8 @@ class MultiHorizonForecast:
             if 'weather_type' in self.weather_df.columns:
                 self.weather_df.drop(columns=['weather_type'], inplace=True)
                 
-            # Add month information for seasonal patterns
-            self.weather_df['month'] = self.weather_df['date'].dt.month
-            
             # Create monthly averages for filling missing data
-            self.monthly_weather_avg = self.weather_df.groupby('month').agg({
-                'max_temp': 'mean',
-                'min_temp': 'mean',
-                'weather_code': lambda x: x.mode().iloc[0] if not x.empty and len(x.mode()) > 0 else 0
-            }).reset_index()
+            self.monthly_weather_avg = monthly_weather_profile(self.weather_df)
             
         except Exception as e:
             print(f"Warning: Could not load weather data: {e}")
@@ -83,14 +173,38 @@ class MultiHorizonForecast:
             
         print(f"Data loaded. Historical data range: {self.df['datum'].min().date()} to {self.df['datum'].max().date()}")
     
+    def cover_history(self, earliest=None):
+        """
+        Make sure the loaded history reaches back far enough for a date. In
+        memory-efficient mode only a trailing window is loaded; it is widened (and
+        the data loaded again) so that the date still has HISTORY_WINDOW_DAYS of
+        history before it.
+        
+        Args:
+            earliest (date-like, optional): Earliest forecast origin. None loads the whole history.
+        """
+        if not self.memory_efficient or not self._loaded_window:
+            return
+        window = None
+        if earliest is not None:
+            window = (self.df['datum'].max() - pd.Timestamp(earliest).normalize()).days + self.history_window
+            if window <= self._loaded_window:
+                return
+        print(f"📚 Widening the memory-efficient history window to "
+              f"{f'{window} days' if window else 'the whole history'}"
+              f"{f' for origins from {pd.Timestamp(earliest).date()}' if earliest is not None else ''}")
+        self._loaded_window = window
+        self.load_data()
+    
     def set_model_type(self, model_type):
         """
         Set the type of model to use for forecasting.
         
         Args:
-            model_type (str): Type of model ('rf', 'knn', or 'xgboost')
+            model_type (str): Type of model ('rf', 'knn', 'xgboost', 'auto') or of
+                statistical baseline ('snaive', 'profile', 'ets', 'croston', 'tsb')
         """
-        valid_models = ['rf', 'knn', 'xgboost']
+        valid_models = ['rf', 'knn', 'xgboost', 'auto'] + BASELINE_MODELS
         if model_type not in valid_models:
             print(f"Warning: Invalid model type '{model_type}'. Using 'rf' instead.")
             self.model_type = 'rf'
@@ -98,6 +212,141 @@ class MultiHorizonForecast:
             self.model_type = model_type
             print(f"Model type set to: {self.model_type}")
     
+    def get_model_path(self, drug):
+        """
+        Resolve the model file for a drug, preferring the branch's own model.
+        
+        Args:
+            drug (str): Drug code
+            
+        Returns:
+            str: Path to the model file (may not exist)
+        """
+        if self.model_type == 'auto':
+            route = self.get_routes().get(drug)
+            # Drugs missing from the routing table use the Random Forest model
+            if self.strategy == 'direct':
+                filename = direct_model_filename(route['Model'] if route else 'rf', drug)
+            else:
+                filename = route['Model_File'] if route else f"rf_model_{drug}.pkl"
+        elif self.strategy == 'direct':
+            filename = direct_model_filename(self.model_type, drug)
+        else:
+            filename = f"{self.model_type}_model_{drug}.pkl"
+        model_path = os.path.join(self.model_dir, filename)
+        if not os.path.exists(model_path) and self.fallback_model_dir:
+            fallback_path = os.path.join(self.fallback_model_dir, filename)
+            if os.path.exists(fallback_path):
+                model_path = fallback_path
+        if self.use_compressed and os.path.exists(compressed_model_path(model_path)):
+            return compressed_model_path(model_path)
+        return model_path
+    
+    @property
+    def output_label(self):
+        """Model label of output files and stores; direct forecasts are kept apart from recursive ones"""
+        if self.strategy == 'recursive' or self.model_type in BASELINE_MODELS:
+            return self.model_type
+        return f"{self.model_type}-{self.strategy}"
+    
+    def get_routes(self):
+        """
+        Model chosen for each drug by the 'auto' model type.
+        
+        Returns:
+            dict: Drug -> routing table row (Model, Model_File, Validation_RMSE, Latency_ms, ...)
+        """
+        if self._routes is None:
+            table = load_routing_table(self.model_dir, self.fallback_model_dir)
+            if table is None:
+                print(f"⚠️ No routing table found in {self.model_dir}. Routing every drug to RF.")
+                self._routes = {}
+            else:
+                self._routes = choose_routes(table, self.route_tolerance, self.route_max_latency_ms)
+                for drug in self.drug_columns:
+                    route = self._routes.get(drug)
+                    if route:
+                        print(f"🔀 {drug}: {route['Model']} (validation RMSE {route['Validation_RMSE']:.3f}, "
+                              f"{route['Latency_ms']:.2f} ms)")
+        return self._routes
+    
+    def demand_patterns(self):
+        """
+        Demand pattern of every drug over the trailing year of history (see utils/demand_patterns.py).
+        
+        Returns:
+            DataFrame: Drug, Pattern, ADI, CV2, Demand_Days, Mean_Demand
+        """
+        if self._demand_patterns is None:
+            self._demand_patterns = classify_demand(self.df[self.drug_columns].to_numpy(dtype=float),
+                                                    self.drug_columns)
+        return self._demand_patterns
+    
+    def trained_sparse_methods(self):
+        """Drug -> estimator of the sparse drugs of the training run (see utils/demand_patterns.py)"""
+        if self._trained_sparse is None:
+            self._trained_sparse = trained_sparse_methods(self.model_dir, self.fallback_model_dir)
+        return self._trained_sparse
+    
+    def baseline_routes(self, drugs):
+        """
+        Drugs forecast by a statistical estimator instead of their model: the sparse
+        drugs (those of the training run, or of the loaded history with SPARSE_METHOD),
+        and drugs the 'auto' routing table sends to one.
+        
+        Args:
+            drugs (list): Drug codes
+            
+        Returns:
+            dict: Drug -> baseline method
+        """
+        if self.model_type in BASELINE_MODELS:
+            return {}
+        routes = {}
+        if self.model_type == 'auto':
+            for drug in drugs:
+                route = self.get_routes().get(drug)
+                if route and route['Model_Type'] in BASELINE_MODELS:
+                    routes[drug] = route['Model_Type']
+        if self.sparse_method:
+            patterns = self.demand_patterns()
+            sparse = set(patterns.loc[patterns['Pattern'].isin(SPARSE_PATTERNS), 'Drug'])
+            routes.update({drug: self.sparse_method for drug in drugs if drug in sparse})
+        elif self.follow_trained_sparse:
+            trained = self.trained_sparse_methods()
+            routes.update({drug: trained[drug] for drug in drugs if drug in trained})
+        return routes
+    
+    def _routed_forecasts(self, drugs, positions, target_dates):
+        """
+        Forecasts of the drugs in baseline_routes, one vectorized call per method.
+        
+        Returns:
+            dict: Drug -> forecasts with shape (origins, steps)
+        """
+        routes = self.baseline_routes(drugs)
+        forecasts = {}
+        for method in sorted(set(routes.values())):
+            group = [drug for drug in drugs if routes.get(drug) == method]
+            print(f"⚡ {method.upper()} estimator for {len(group)} drug(s): {', '.join(group[:10])}"
+                  f"{', ...' if len(group) > 10 else ''}")
+            values = self.baseline_forecast(method, group, positions, target_dates)
+            forecasts.update({drug: values[:, :, column] for column, drug in enumerate(group)})
+        return forecasts
+    
+    def load_model(self, model_path):
+        """Load a model, reusing it if it was already loaded by this forecaster"""
+        if model_path in self._model_cache:
+            return self._model_cache[model_path]
+        
+        # joblib and the estimator library of the model (sklearn, xgboost) are
+        # only imported once a model is actually loaded
+        import joblib
+        model = set_estimator_threads(joblib.load(model_path), self.estimator_threads)
+        if self.cache_models:
+            self._model_cache[model_path] = model
+        return model
+    
     def get_weather_features(self, target_date):
         """
         Get weather features for a specific date, using actual data if available
@@ -109,42 +358,52 @@ class MultiHorizonForecast:
         Returns:
             dict: Dictionary of weather features
         """
-        if self.weather_df is None:
-            return {'max_temp': 30, 'min_temp': 24, 'weather_code': 0}
-            
-        # Try exact match first
-        exact_match = self.weather_df[self.weather_df['date'].dt.date == target_date.date()]
-        if not exact_match.empty:
-            return exact_match[['max_temp', 'min_temp', 'weather_code']].iloc[0].to_dict()
-        
-        # Fall back to monthly average
-        month = target_date.month
-        avg_data = self.monthly_weather_avg[self.monthly_weather_avg['month'] == month]
-        if not avg_data.empty:
-            return avg_data[['max_temp', 'min_temp', 'weather_code']].iloc[0].to_dict()
+        return self.get_weather_frame([target_date]).iloc[0].to_dict()
+    
+    def get_weather_frame(self, dates):
+        """
+        Get weather features for many dates at once (same fallbacks as get_weather_features).
         
-        # Last resort: return global averages
-        return {
-            'max_temp': self.weather_df['max_temp'].mean(),
-            'min_temp': self.weather_df['min_temp'].mean(),
-            'weather_code': self.weather_df['weather_code'].mode()[0] if not self.weather_df['weather_code'].empty else 0
-        }
+        Args:
+            dates (array-like): Dates to get weather features for
+            
+        Returns:
+            DataFrame: max_temp, min_temp and weather_code, one row per date in input order
+        """
+        if self.weather_df is None:
+            return attach_weather(dates, None)
+        return attach_weather(dates, self.weather_df, self.monthly_weather_avg)
     
-    def get_recent_actuals(self, drug_code, days=7):
+    def get_recent_actuals(self, drug_code, days=7, as_of=None):
         """
         Get the most recent actual values for a drug to use as lag features.
         
         Args:
             drug_code (str): The drug code to get values for
             days (int): Number of past days to retrieve
+            as_of (date-like, optional): Only use history strictly before this date.
+                Defaults to the end of the history.
             
         Returns:
             list: List of recent actual values in chronological order
         """
-        recent_df = self.df.sort_values('datum', ascending=False).head(days)
-        recent_values = recent_df[drug_code].tolist()
-        # Reverse to get in chronological order
-        return recent_values[::-1]
+        pos = len(self.df) if as_of is None else self._history_position(as_of)
+        return self.df[drug_code].values[max(0, pos - days):pos].tolist()
+    
+    def _history_position(self, as_of):
+        """
+        Number of history rows strictly before the given date(s), looked up on the
+        sorted date index rather than by filtering the frame.
+        
+        Args:
+            as_of (date-like or array-like): Date or dates to look up
+            
+        Returns:
+            int or ndarray: Row position(s) in self.df
+        """
+        history_dates = self.df['datum'].values.astype('datetime64[D]')
+        targets = np.asarray(pd.to_datetime(as_of)).astype('datetime64[D]')
+        return np.searchsorted(history_dates, targets, side='left')
     
     def prepare_feature_names(self, drug_code):
         """
@@ -156,28 +415,14 @@ class MultiHorizonForecast:
         Returns:
             list: List of feature names
         """
-        # Create a sample dataframe with the same structure as training
-        df_sample = self.df.copy()
-        df_sample['Year'] = df_sample['datum'].dt.year
-        df_sample['Month'] = df_sample['datum'].dt.month
-        df_sample['Hour'] = 0
-        df_sample['Is_Weekend'] = df_sample['datum'].dt.dayofweek >= 5
-        df_sample['Weekday_Name'] = df_sample['datum'].dt.day_name()
-        df_sample = pd.get_dummies(df_sample, columns=['Weekday_Name'])
-        
-        # Add lag features to get the feature names
-        df_drug = df_sample.copy()
-        df_drug[f'{drug_code}_lag1'] = df_drug[drug_code].shift(1)
-        df_drug[f'{drug_code}_lag2'] = df_drug[drug_code].shift(2)
-        df_drug[f'{drug_code}_lag3'] = df_drug[drug_code].shift(3)
-        df_drug[f'{drug_code}_lag7'] = df_drug[drug_code].shift(7)
-        df_drug[f'{drug_code}_roll3_mean'] = df_drug[drug_code].shift(1).rolling(window=3).mean()
-        df_drug[f'{drug_code}_roll7_mean'] = df_drug[drug_code].shift(1).rolling(window=7).mean()
+        # Training one-hot encodes the weekday names present in the history;
+        # get_dummies orders those columns alphabetically
+        weekday_names = sorted(self.df['datum'].dt.day_name().unique())
         
         # Define feature columns
         feature_cols = [
             'Year', 'Month', 'Hour', 'Is_Weekend', 'max_temp', 'min_temp', 'weather_code'
-        ] + [col for col in df_drug.columns if col.startswith('Weekday_Name_')] + [
+        ] + [f'Weekday_Name_{day}' for day in weekday_names] + [
             f'{drug_code}_lag1', f'{drug_code}_lag2', f'{drug_code}_lag3', f'{drug_code}_lag7',
             f'{drug_code}_roll3_mean', f'{drug_code}_roll7_mean'
         ]
@@ -193,7 +438,7 @@ class MultiHorizonForecast:
             num_days (int, optional): Number of days to forecast. Defaults to self.forecast_days.
             
         Returns:
-            DataFrame: Forecast results in pivoted format (drugs as columns)
+            DataFrame: Forecast results in pivoted format (drugs as columns), backed by the forecast array
         """
         if start_date is None:
             start_date = datetime.now().date()
@@ -203,91 +448,182 @@ class MultiHorizonForecast:
         if num_days is None:
             num_days = self.forecast_days
             
-        print(f"Generating daily forecast from {start_date} for {num_days} days using {self.model_type.upper()} model...")
+        print(f"Generating daily forecast from {start_date} for {num_days} days using {self.model_type.upper()} model"
+              f"{' (direct)' if self.strategy == 'direct' else ''}...")
         
         # Generate forecast dates
         forecast_dates = pd.date_range(start=start_date, periods=num_days, freq='D')
+        forecast = self.forecast_daily(forecast_dates)
         
-        # Store all forecasts
-        forecast_results = []
+        # Create forecast outputs
+        if len(forecast):
+            return self.publish_daily(forecast, start_date)
+        else:
+            print("No forecasts were generated!")
+            return None
+    
+    def forecast_daily(self, forecast_dates, drugs=None):
+        """
+        Forecast consecutive days from the end of the history without writing anything.
         
-        # Generate forecasts for each drug
-        for drug in self.drug_columns:
-            drug_forecast = self._forecast_drug_daily(drug, forecast_dates)
+        Args:
+            forecast_dates (DatetimeIndex): Dates to forecast
+            drugs (list, optional): Drugs to forecast. Defaults to self.drug_columns.
             
-            # Add all predictions to results
-            for day_result in drug_forecast:
-                forecast_results.append({
-                    'Drug': drug,
-                    'Date': day_result['date'],
-                    'Predicted_Sales': day_result['prediction']
-                })
+        Returns:
+            ForecastArray: Predictions of every drug that could be forecast
+        """
+        drugs = self.drug_columns if drugs is None else list(drugs)
+        num_days = len(forecast_dates)
+        
+        # Predictions go straight into a preallocated (dates x drugs) array
+        forecast = ForecastArray(forecast_dates, drugs)
         
-        # Create forecast dataframe
-        if forecast_results:
-            forecast_df = pd.DataFrame(forecast_results)
+        # Weather is the same for every drug, so it is looked up once (the baselines do not use it)
+        weather = None if self.model_type in BASELINE_MODELS else self.get_weather_frame(forecast_dates)
+        
+        # A single origin at the end of the history
+        positions = np.array([len(self.df)])
+        target_dates = forecast_dates.values[None, :]
+        if self.strategy == 'direct' and self.model_type not in BASELINE_MODELS:
+            step_features = self._base_features(forecast_dates, weather.set_axis(forecast_dates))
+            step_features = [{key: values[i:i + 1] for key, values in step_features.items()}
+                             for i in range(num_days)]
+        elif weather is not None:
+            weather = weather.to_dict('records')
+        
+        for offset, batch in self.drug_batches(drugs):
+            columns = offset + np.arange(len(batch))
+            if self.model_type in BASELINE_MODELS:
+                # All drugs of the batch at once
+                forecast.set_drugs(columns, self.baseline_forecast(self.model_type, batch, positions, target_dates)[0])
+            else:
+                routed = self._routed_forecasts(batch, positions, target_dates)
+                for column, drug in zip(columns, batch):
+                    if drug in routed:
+                        forecast.set_drug(column, routed[drug][0])
+                    elif self.strategy == 'direct':
+                        # Every day is predicted from the end of the history in one call
+                        predictions = self._forecast_drug_direct(drug, positions, step_features)
+                        if predictions is not None:
+                            forecast.set_drug(column, predictions[0])
+                    else:
+                        drug_forecast = self._forecast_drug_daily(drug, forecast_dates, weather)
+                        if drug_forecast:
+                            forecast.set_drug(column, [day_result['prediction'] for day_result in drug_forecast])
             
-            # Pivot the dataframe to have drugs as columns
-            pivot_df = forecast_df.pivot(index='Date', columns='Drug', values='Predicted_Sales')
-            pivot_df.reset_index(inplace=True)
+            missing = columns[~forecast.filled[columns]]
+            fallback = self._fallback_forecast([drugs[column] for column in missing], positions, target_dates)
+            if fallback is not None:
+                forecast.set_drugs(missing, fallback[0])
+        return forecast
+    
+    def drug_batches(self, drugs):
+        """
+        Split drugs into batches of DRUG_BATCH_SIZE, releasing the loaded models after each batch.
+        
+        Args:
+            drugs (list): Drugs to forecast
             
-            # Save outputs
-            forecast_df.to_csv(f"{self.output_path}/daily_forecast_{self.model_type}_{start_date.strftime('%Y%m%d')}.csv", index=False)
-            pivot_df.to_csv(f"{self.output_path}/daily_forecast_pivot_{self.model_type}_{start_date.strftime('%Y%m%d')}.csv", index=False)
+        Yields:
+            tuple: (position of the batch's first drug in drugs, list of drugs)
+        """
+        batch_size = self.drug_batch_size or len(drugs) or 1
+        num_batches = -(-len(drugs) // batch_size)
+        for number, offset in enumerate(range(0, len(drugs), batch_size), start=1):
+            if num_batches > 1:
+                print(f"📦 Batch {number}/{num_batches}: {min(batch_size, len(drugs) - offset)} drugs")
+            yield offset, drugs[offset:offset + batch_size]
+            if self.drug_batch_size:
+                self._model_cache.clear()
+    
+    def publish_daily(self, forecast, start_date, updated=None):
+        """
+        Write a daily forecast and pass it on to the forecast store and the cubes.
+        
+        Args:
+            forecast (ForecastArray): Daily forecast starting at start_date
+            start_date (date): First forecast date, used in the file names
+            updated (ForecastArray, optional): The part of the forecast that changed;
+                only it is sent to the store and the cubes. Defaults to the whole forecast.
             
-            return pivot_df
-        else:
-            print("No forecasts were generated!")
-            return None
+        Returns:
+            DataFrame: Forecast results in pivoted format (drugs as columns)
+        """
+        forecast_df = forecast.long()
+        pivot_df = forecast.wide()
+        
+        # Save outputs (long format; the pivot is only written on request)
+        base_name = f"{self.output_label}_{start_date.strftime('%Y%m%d')}"
+        write_frame(forecast_df, f"{self.output_path}/daily_forecast_{base_name}", self.output_formats)
+        if self.write_pivot:
+            write_frame(pivot_df, f"{self.output_path}/daily_forecast_pivot_{base_name}", self.output_formats)
+        
+        if updated is not None:
+            forecast_df = updated.long()
+        self.store_forecast(forecast_df, 'daily')
+        self._pending_cube_frames.append(forecast_df)
+        if not self._defer_cubes:
+            self.publish_cubes()
+        
+        return pivot_df
             
-    def _forecast_drug_daily(self, drug, forecast_dates):
+    def _forecast_drug_daily(self, drug, forecast_dates, weather=None):
         """
         Generate daily forecasts for a specific drug.
         
         Args:
             drug (str): Drug code to forecast
             forecast_dates (DatetimeIndex): Dates to forecast for
+            weather (list, optional): Weather features for each forecast date.
+                Looked up if not given.
             
         Returns:
             list: List of dictionaries with forecast results
         """
         # Get the model path based on the selected model type
-        model_path = os.path.join(self.model_dir, f"{self.model_type}_model_{drug}.pkl")
+        model_path = self.get_model_path(drug)
         
         if not os.path.exists(model_path):
-            print(f"⚠️ Model for {drug} ({self.model_type}) not found at {model_path}. Skipping.")
+            print(f"⚠️ Model for {drug} ({self.model_type}) not found at {model_path}.")
             return []
             
         try:
             # Load the model
-            model = joblib.load(model_path)
-            
-            # Get feature names
-            feature_cols = self.prepare_feature_names(drug)
+            model = self.load_model(model_path)
             
-            # Verify model feature names if available
-            if hasattr(model, 'feature_names_in_'):
-                feature_cols = model.feature_names_in_.tolist()
+            # Features the model predicts from (the reduced schema of pruned models)
+            feature_cols = model_features(model, self.prepare_feature_names(drug))
+            uses_weekday_names = any(col.startswith('Weekday_Name_') for col in feature_cols)
             
-            # Calculate baseline values for initialization
-            last_year_data = self.df[self.df['datum'] >= (self.df['datum'].max() - pd.Timedelta(days=365))]
-            if len(last_year_data) < 30:
-                last_year_data = self.df
+            # Last 7 values before the first forecast day, shifted as predictions come in
+            # (the same window as the multi-origin forecaster, see _origin_window)
+            window = self._origin_window(drug, np.array([len(self.df)]))
             
-            # Historical averages to use as baselines
-            avg_sales = last_year_data[drug].mean()
-            avg_sales_by_month = last_year_data.groupby(last_year_data['datum'].dt.month)[drug].mean()
-            avg_sales_by_weekday = last_year_data.groupby(last_year_data['datum'].dt.dayofweek)[drug].mean()
-            
-            # Get most recent actual values to use as initialization
-            recent_actuals = self.get_recent_actuals(drug)
-            recent_actual_mean3 = np.mean(recent_actuals[-3:]) if len(recent_actuals) >= 3 else avg_sales
-            recent_actual_mean7 = np.mean(recent_actuals) if len(recent_actuals) > 0 else avg_sales
+            if weather is None:
+                weather = self.get_weather_frame(forecast_dates).to_dict('records')
             
             # Create forecast for each day
             drug_forecast = []
             
+            # Steps before the first changed one are taken from the checkpoint
+            start_step, lag_cols = 0, lag_feature_names(drug)
+            step_weather = np.array([[day[col] for col in WEATHER_FEATURES] for day in weather[:len(forecast_dates)]],
+                                    dtype=float)
+            step_states = np.full((len(forecast_dates), len(lag_cols)), np.nan)
+            if self.use_checkpoints:
+                checkpoint_key = self._checkpoint_key(model_path, window)
+                start_step, checkpoint = self._resume_step(drug, checkpoint_key, forecast_dates, step_weather)
+                if start_step:
+                    step_states[:start_step] = checkpoint['states'][:start_step]
+                    drug_forecast = [{'date': forecast_date, 'prediction': prediction} for forecast_date, prediction
+                                     in zip(forecast_dates[:start_step], checkpoint['predictions'][:start_step])]
+                    window = np.concatenate([window[0], checkpoint['predictions'][:start_step]])[None, -7:]
+            
             for i, forecast_date in enumerate(forecast_dates):
+                if i < start_step:
+                    continue
+                
                 # Create a new row for the forecast date
                 forecast_row = {}
                 
@@ -298,96 +634,20 @@ class MultiHorizonForecast:
                 forecast_row['DayOfWeek'] = forecast_date.dayofweek
                 forecast_row['Is_Weekend'] = 1 if forecast_date.dayofweek >= 5 else 0
                 
-                # Initialize all weekday dummy variables to 0
-                for day in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']:
-                    forecast_row[f'Weekday_Name_{day}'] = 0
-                
-                # Set the current weekday to 1
-                weekday_name = forecast_date.day_name()
-                forecast_row[f'Weekday_Name_{weekday_name}'] = 1
+                if uses_weekday_names:
+                    # Initialize all weekday dummy variables to 0
+                    for day in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']:
+                        forecast_row[f'Weekday_Name_{day}'] = 0
+                    
+                    # Set the current weekday to 1
+                    weekday_name = forecast_date.day_name()
+                    forecast_row[f'Weekday_Name_{weekday_name}'] = 1
                 
                 # Add weather data
-                weather_features = self.get_weather_features(forecast_date)
-                forecast_row.update(weather_features)
+                forecast_row.update(weather[i])
                 
-                # Initialize lag features - complex logic to handle different periods
-                if i == 0:
-                    # First forecast day - use actual recent values if available
-                    if len(recent_actuals) >= 1:
-                        forecast_row[f'{drug}_lag1'] = recent_actuals[-1]
-                    else:
-                        month_avg = avg_sales_by_month.get(forecast_date.month, avg_sales)
-                        weekday_avg = avg_sales_by_weekday.get(forecast_date.dayofweek, avg_sales)
-                        forecast_row[f'{drug}_lag1'] = (month_avg + weekday_avg) / 2
-                        
-                    if len(recent_actuals) >= 2:
-                        forecast_row[f'{drug}_lag2'] = recent_actuals[-2]
-                    else:
-                        forecast_row[f'{drug}_lag2'] = forecast_row[f'{drug}_lag1']
-                        
-                    if len(recent_actuals) >= 3:
-                        forecast_row[f'{drug}_lag3'] = recent_actuals[-3]
-                    else:
-                        forecast_row[f'{drug}_lag3'] = forecast_row[f'{drug}_lag1']
-                        
-                    if len(recent_actuals) >= 7:
-                        forecast_row[f'{drug}_lag7'] = recent_actuals[-7]
-                    else:
-                        forecast_row[f'{drug}_lag7'] = forecast_row[f'{drug}_lag1']
-                    
-                    # Use actual rolling means if available
-                    forecast_row[f'{drug}_roll3_mean'] = recent_actual_mean3
-                    forecast_row[f'{drug}_roll7_mean'] = recent_actual_mean7
-                    
-                else:
-                    # For subsequent days, use previous predictions
-                    forecast_row[f'{drug}_lag1'] = drug_forecast[-1]['prediction']
-                    
-                    if i >= 2:
-                        forecast_row[f'{drug}_lag2'] = drug_forecast[-2]['prediction']
-                    else:
-                        # Use actual data for remaining lag values if available
-                        if len(recent_actuals) >= 1:
-                            forecast_row[f'{drug}_lag2'] = recent_actuals[-1]
-                        else:
-                            forecast_row[f'{drug}_lag2'] = forecast_row[f'{drug}_lag1']
-                        
-                    if i >= 3:
-                        forecast_row[f'{drug}_lag3'] = drug_forecast[-3]['prediction']
-                    else:
-                        # Use actual data for remaining lag values if available
-                        if len(recent_actuals) >= 2 - i:
-                            forecast_row[f'{drug}_lag3'] = recent_actuals[-(2-i)]
-                        else:
-                            forecast_row[f'{drug}_lag3'] = forecast_row[f'{drug}_lag1']
-                        
-                    if i >= 7:
-                        forecast_row[f'{drug}_lag7'] = drug_forecast[-7]['prediction']
-                    else:
-                        # Use actual data for remaining lag values if available
-                        if len(recent_actuals) >= 6 - i:
-                            forecast_row[f'{drug}_lag7'] = recent_actuals[-(6-i)]
-                        else:
-                            forecast_row[f'{drug}_lag7'] = forecast_row[f'{drug}_lag1']
-                    
-                    # Calculate rolling means
-                    if i >= 3:
-                        recent_vals = [pred['prediction'] for pred in drug_forecast[-3:]]
-                        forecast_row[f'{drug}_roll3_mean'] = np.mean(recent_vals)
-                    else:
-                        # Blend actual data with predictions for rolling mean
-                        blend_vals = recent_actuals[-(3-i):] if len(recent_actuals) >= (3-i) else []
-                        blend_vals.extend([pred['prediction'] for pred in drug_forecast])
-                        forecast_row[f'{drug}_roll3_mean'] = np.mean(blend_vals) if blend_vals else recent_actual_mean3
-                        
-                    if i >= 7:
-                        recent_vals = [pred['prediction'] for pred in drug_forecast[-7:]]
-                        forecast_row[f'{drug}_roll7_mean'] = np.mean(recent_vals)
-                    else:
-                        # Blend actual data with predictions for rolling mean
-                        blend_vals = recent_actuals[-(7-i):] if len(recent_actuals) >= (7-i) else []
-                        blend_vals.extend([pred['prediction'] for pred in drug_forecast])
-                        forecast_row[f'{drug}_roll7_mean'] = np.mean(blend_vals) if blend_vals else recent_actual_mean7
+                # Lag and rolling mean features of the window: actuals, then earlier predictions
+                forecast_row.update({col: values[0] for col, values in self._lag_features(drug, window).items()})
                 
                 # Create a DataFrame with exactly the expected features in the exact order
                 X_pred = pd.DataFrame([{col: forecast_row.get(col, 0) for col in feature_cols}])
@@ -403,6 +663,15 @@ class MultiHorizonForecast:
                     'date': forecast_date,
                     'prediction': prediction
                 })
+                step_states[i] = [forecast_row[col] for col in lag_cols]
+                window = np.concatenate([window[:, 1:], [[prediction]]], axis=1)
+            
+            if self.use_checkpoints:
+                self.checkpoint_stats['reused'] += start_step
+                self.checkpoint_stats['computed'] += len(forecast_dates) - start_step
+                self._checkpoints[(self.output_label, drug)] = {
+                    'key': checkpoint_key, 'dates': forecast_dates, 'weather': step_weather, 'states': step_states,
+                    'predictions': np.array([day_result['prediction'] for day_result in drug_forecast])}
                 
             return drug_forecast
             
@@ -410,6 +679,332 @@ class MultiHorizonForecast:
             print(f"❌ Error processing {drug}: {str(e)}")
             return []
     
+    def _checkpoint_key(self, model_path, window):
+        """Everything besides the weather that a daily recursion depends on"""
+        return (model_path, os.path.getmtime(model_path), str(self.df['datum'].max()),
+                tuple(float(value) for value in window[0]))
+    
+    def _resume_step(self, drug, key, forecast_dates, step_weather):
+        """
+        First step of a daily recursion that has to be computed again.
+        
+        Args:
+            drug (str): Drug code
+            key (tuple): Checkpoint key of the current model and history
+            forecast_dates (DatetimeIndex): Dates to forecast
+            step_weather (ndarray): Weather features of each date, shape (dates, features)
+            
+        Returns:
+            tuple: (step, checkpoint); step 0 and None when no checkpoint of the same
+                origin, model and history is kept
+        """
+        checkpoint = self._checkpoints.get((self.output_label, drug))
+        if checkpoint is None or checkpoint['key'] != key or checkpoint['dates'][0] != forecast_dates[0]:
+            return 0, None
+        steps = min(len(checkpoint['dates']), len(forecast_dates))
+        changed = ~np.isclose(checkpoint['weather'][:steps], step_weather[:steps], equal_nan=True).all(axis=1)
+        return (int(np.argmax(changed)) if changed.any() else steps), checkpoint
+    
+    def save_checkpoints(self, path):
+        """Write the recursion checkpoints to a file, so a later process can resume from them"""
+        import pickle
+        
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self._checkpoints, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    
+    def load_checkpoints(self, path):
+        """Read recursion checkpoints written by save_checkpoints (a missing file is ignored)"""
+        import pickle
+        
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                self._checkpoints.update(pickle.load(f))
+    
+    def generate_multi_origin_forecast(self, origins, num_days=None):
+        """
+        Generate daily forecasts from many forecast origins at once.
+        
+        Each origin's lags are seeded from the actual history as of that origin
+        (rows strictly before it). With the recursive strategy all origins then
+        advance in lockstep: at every step one feature matrix with a row per
+        origin is built and passed to a single predict call per drug. With the
+        direct strategy every step of every origin is predicted in one call per drug.
+        
+        Args:
+            origins (list): Forecast origin dates (date, datetime or 'YYYY-MM-DD')
+            num_days (int, optional): Days to forecast from each origin. Defaults to self.forecast_days.
+            
+        Returns:
+            DataFrame: Long format with Origin, Drug, Date, Horizon and Predicted_Sales
+        """
+        if num_days is None:
+            num_days = self.forecast_days
+            
+        origin_index = pd.DatetimeIndex(pd.to_datetime(list(origins))).normalize().unique().sort_values()
+        if len(origin_index) == 0:
+            print("No forecast origins given!")
+            return None
+            
+        print(f"Generating daily forecasts from {len(origin_index)} origins ({origin_index[0].date()} to "
+              f"{origin_index[-1].date()}) for {num_days} days using {self.model_type.upper()} model"
+              f"{' (direct)' if self.strategy == 'direct' else ''}...")
+        
+        # Dates predicted at each step, one per origin
+        step_dates = [origin_index + pd.Timedelta(days=i) for i in range(num_days)]
+        target_dates = np.stack([dates.values for dates in step_dates], axis=1)
+        self.cover_history(origin_index[0])
+        positions = self._history_position(origin_index)
+        if positions[0] == 0:
+            raise ValueError(f"Forecast origin {origin_index[0].date()} has no sales history before it "
+                             f"(the history starts on {self.df['datum'].min().date()})")
+        
+        if self.model_type not in BASELINE_MODELS:
+            # Calendar and weather features are shared by all drugs; weather is looked up once per distinct date
+            unique_dates = pd.DatetimeIndex(np.unique(target_dates))
+            weather_by_date = self.get_weather_frame(unique_dates).set_axis(unique_dates)
+            step_features = [self._base_features(dates, weather_by_date) for dates in step_dates]
+            forecast_drug = self._forecast_drug_direct if self.strategy == 'direct' else self._forecast_drug_multi_origin
+        
+        forecasts = {}
+        for _, batch in self.drug_batches(self.drug_columns):
+            if self.model_type in BASELINE_MODELS:
+                # All drugs of the batch and all origins at once
+                baseline = self.baseline_forecast(self.model_type, batch, positions, target_dates)
+                forecasts.update({drug: baseline[:, :, column] for column, drug in enumerate(batch)})
+                continue
+            
+            routed = self._routed_forecasts(batch, positions, target_dates)
+            forecasts.update(routed)
+            for drug in batch:
+                if drug in routed:
+                    continue
+                predictions = forecast_drug(drug, positions, step_features)
+                if predictions is not None:
+                    forecasts[drug] = predictions
+            
+            missing = [drug for drug in batch if drug not in forecasts]
+            fallback = self._fallback_forecast(missing, positions, target_dates)
+            if fallback is not None:
+                forecasts.update({drug: fallback[:, :, column] for column, drug in enumerate(missing)})
+        
+        drugs = [drug for drug in self.drug_columns if drug in forecasts]
+        if not drugs:
+            print("No forecasts were generated!")
+            return None
+        
+        # One block of (origins x steps) rows per drug, built in one go rather than a frame per drug
+        rows_per_drug = target_dates.size
+        forecast_df = pd.DataFrame({
+            'Origin': np.tile(np.repeat(origin_index.values, num_days), len(drugs)),
+            'Drug': np.repeat(np.array(drugs, dtype=object), rows_per_drug),
+            'Date': np.tile(target_dates.ravel(), len(drugs)),
+            'Horizon': np.tile(np.arange(1, num_days + 1), len(origin_index) * len(drugs)),
+            'Predicted_Sales': np.stack([forecasts[drug] for drug in drugs]).ravel()
+        })
+        write_frame(forecast_df, f"{self.output_path}/multi_origin_forecast_{self.output_label}_"
+                                 f"{origin_index[0].strftime('%Y%m%d')}_{origin_index[-1].strftime('%Y%m%d')}",
+                    self.output_formats)
+        return forecast_df
+    
+    def history_features(self, drug, feature_cols):
+        """
+        One-step feature rows for the history dates, built as in training: each
+        date's calendar and weather with the lags of the actuals before it.
+        
+        Args:
+            drug (str): Drug code
+            feature_cols (list): Feature columns, in model order
+            
+        Returns:
+            tuple: (DataFrame of features, Series of actual sales), one row per date
+                from the eighth history day on (the whole history, also in memory-efficient mode)
+        """
+        self.cover_history()
+        positions = np.arange(7, len(self.df))
+        dates = pd.DatetimeIndex(self.df['datum'].values[positions])
+        features = self._base_features(dates, self.get_weather_frame(dates).set_axis(dates))
+        features.update(self._lag_features(drug, self._origin_window(drug, positions)))
+        zeros = np.zeros(len(positions))
+        X = pd.DataFrame({col: features.get(col, zeros) for col in feature_cols}, index=dates)
+        return X, pd.Series(self.df[drug].values[positions], index=dates, name=drug)
+    
+    def baseline_forecast(self, method, drugs, positions, target_dates):
+        """
+        Forecast drugs with a statistical baseline fitted on the history.
+        
+        Args:
+            method (str): One of BASELINE_MODELS
+            drugs (list): Drug codes
+            positions (ndarray): History rows available at each origin
+            target_dates (ndarray): Dates to forecast, shape (origins, steps)
+            
+        Returns:
+            ndarray: Forecasts with shape (origins, steps, drugs)
+        """
+        return baseline_forecast(method, self.df[drugs].to_numpy(dtype=float), self.df['datum'].values,
+                                 positions, target_dates)
+    
+    def _fallback_forecast(self, drugs, positions, target_dates):
+        """
+        Baseline forecasts for drugs that have no model forecast.
+        
+        Returns:
+            ndarray: Forecasts with shape (origins, steps, drugs), or None if there
+                are no such drugs or the fallback is disabled
+        """
+        if not drugs:
+            return None
+        if self.fallback_baseline is None:
+            print(f"⚠️ Skipping {len(drugs)} drug(s) without a model forecast: {', '.join(drugs)}")
+            return None
+        print(f"↩️ Using the {self.fallback_baseline.upper()} baseline for {len(drugs)} drug(s) without a model "
+              f"forecast: {', '.join(drugs)}")
+        return self.baseline_forecast(self.fallback_baseline, drugs, positions, target_dates)
+    
+    def _base_features(self, dates, weather_by_date):
+        """
+        Calendar and weather feature columns for a batch of forecast dates.
+        
+        Args:
+            dates (DatetimeIndex): One forecast date per row
+            weather_by_date (DataFrame): Weather features indexed by date
+            
+        Returns:
+            dict: Feature name -> array with one value per row
+        """
+        day_of_week = dates.dayofweek.values
+        features = {
+            'Year': dates.year.values,
+            'Month': dates.month.values,
+            'Hour': np.zeros(len(dates), dtype=int),
+            'DayOfWeek': day_of_week,
+            'Is_Weekend': (day_of_week >= 5).astype(int)
+        }
+        for i, day in enumerate(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']):
+            features[f'Weekday_Name_{day}'] = (day_of_week == i).astype(int)
+        
+        weather = weather_by_date.loc[dates]
+        for key in WEATHER_FEATURES:
+            features[key] = weather[key].to_numpy(dtype=float)
+        return features
+    
+    def _forecast_drug_multi_origin(self, drug, positions, step_features):
+        """
+        Advance all origins of one drug in lockstep.
+        
+        Args:
+            drug (str): Drug code to forecast
+            positions (ndarray): History rows available at each origin
+            step_features (list): Calendar/weather features for each step (see _base_features)
+            
+        Returns:
+            ndarray: Predictions with shape (origins, steps), or None if the model is missing
+        """
+        model_path = self.get_model_path(drug)
+        
+        if not os.path.exists(model_path):
+            print(f"⚠️ Model for {drug} ({self.model_type}) not found at {model_path}.")
+            return None
+            
+        try:
+            model = self.load_model(model_path)
+            feature_cols = model_features(model, self.prepare_feature_names(drug))
+            
+            # Last 7 values per origin: actuals as of the origin, shifted as predictions come in
+            window = self._origin_window(drug, positions)
+            
+            predictions = np.empty((len(positions), len(step_features)))
+            zeros = np.zeros(len(positions))
+            
+            for i, base in enumerate(step_features):
+                features = dict(base)
+                features.update(self._lag_features(drug, window))
+                
+                X_pred = pd.DataFrame({col: features.get(col, zeros) for col in feature_cols})
+                step_pred = np.maximum(model.predict(X_pred), 0)
+                
+                predictions[:, i] = step_pred
+                window = np.concatenate([window[:, 1:], step_pred[:, None]], axis=1)
+                
+            return predictions
+            
+        except Exception as e:
+            print(f"❌ Error processing {drug}: {str(e)}")
+            return None
+    
+    def _origin_window(self, drug, positions):
+        """
+        Last 7 actual values before each origin.
+        
+        Args:
+            drug (str): Drug code
+            positions (ndarray): History rows available at each origin
+            
+        Returns:
+            ndarray: Shape (origins, 7), oldest value first
+        """
+        values = self.df[drug].values.astype(float)
+        idx = positions[:, None] + np.arange(-7, 0)[None, :]
+        window = np.where(idx >= 0, values[np.clip(idx, 0, None)], np.nan)
+        
+        # Origins with less than 7 days of history are padded with their mean so far
+        cumsum = np.concatenate([[0.0], np.cumsum(values)])
+        fallback = np.where(positions > 0, cumsum[positions] / np.maximum(positions, 1), values.mean())
+        return np.where(np.isnan(window), fallback[:, None], window)
+    
+    def _lag_features(self, drug, window):
+        """Lag and rolling mean features from (rows, 7) windows of recent values"""
+        return {
+            f'{drug}_lag1': window[:, -1],
+            f'{drug}_lag2': window[:, -2],
+            f'{drug}_lag3': window[:, -3],
+            f'{drug}_lag7': window[:, -7],
+            f'{drug}_roll3_mean': window[:, -3:].mean(axis=1),
+            f'{drug}_roll7_mean': window.mean(axis=1)
+        }
+    
+    def _forecast_drug_direct(self, drug, positions, step_features):
+        """
+        Predict all steps of all origins of one drug with its direct model.
+        
+        Args:
+            drug (str): Drug code to forecast
+            positions (ndarray): History rows available at each origin
+            step_features (list): Calendar/weather features for each step (see _base_features)
+            
+        Returns:
+            ndarray: Predictions with shape (origins, steps), or None if the model is missing
+        """
+        model_path = self.get_model_path(drug)
+        
+        if not os.path.exists(model_path):
+            print(f"⚠️ Direct model for {drug} ({self.model_type}) not found at {model_path}.")
+            return None
+            
+        try:
+            model = self.load_model(model_path)
+            feature_cols = model_features(model, self.prepare_feature_names(drug) + ['Horizon'])
+            
+            n_origins, n_steps = len(positions), len(step_features)
+            
+            # One row per (origin, step), origin-major like the (origins, steps) result;
+            # the lags are those as of the origin for every step. Only the model's features are built.
+            features = {key: np.stack([base[key] for base in step_features], axis=1).ravel()
+                        for key in step_features[0] if key in feature_cols}
+            for key, values in self._lag_features(drug, self._origin_window(drug, positions)).items():
+                features[key] = np.repeat(values, n_steps)
+            features['Horizon'] = horizon_feature(n_steps, n_origins)
+            
+            zeros = np.zeros(n_origins * n_steps)
+            X_pred = pd.DataFrame({col: features.get(col, zeros) for col in feature_cols})
+            return np.maximum(model.predict(X_pred), 0).reshape(n_origins, n_steps)
+            
+        except Exception as e:
+            print(f"❌ Error processing {drug}: {str(e)}")
+            return None
+    
     def generate_monthly_forecast(self, start_month=None, num_months=12):
         """
         Generate monthly forecasts by aggregating daily forecasts.
@@ -440,6 +1035,10 @@ class MultiHorizonForecast:
         
         monthly_forecasts = []
         
+        # Publish the cubes once for the whole run instead of once per month
+        outer_defer = self._defer_cubes
+        self._defer_cubes = True
+        
         # For each month in the forecast period
         for i in range(num_months):
             # Calculate current month and year
@@ -473,18 +1072,61 @@ class MultiHorizonForecast:
                 
                 monthly_forecasts.append(month_data)
         
+        self._defer_cubes = outer_defer
+        if not outer_defer:
+            self.publish_cubes()
+        
         # Create monthly forecast dataframe
         if monthly_forecasts:
             monthly_df = pd.DataFrame(monthly_forecasts)
             
             # Save output
-            monthly_df.to_csv(f"{self.output_path}/monthly_forecast_{self.model_type}_{start_month.replace('-', '')}.csv", index=False)
+            write_frame(monthly_df, f"{self.output_path}/monthly_forecast_{self.output_label}_{start_month.replace('-', '')}",
+                        self.output_formats)
+            self.store_forecast(monthly_df, 'monthly')
             
             return monthly_df
         else:
             print("No monthly forecasts were generated!")
             return None
     
+    def store_forecast(self, forecast_df, forecast_type):
+        """
+        Upsert forecast rows into the SQL store when FORECAST_DB is configured.
+        
+        Args:
+            forecast_df (DataFrame): Daily long, monthly or yearly forecast frame
+            forecast_type (str): 'daily', 'monthly' or 'yearly'
+        """
+        if not self.forecast_db:
+            return
+        
+        try:
+            if self._forecast_store is None:
+                self._forecast_store = ForecastStore(self.forecast_db)
+            rows = to_long(forecast_df, forecast_type, self.drug_columns)
+            self._forecast_store.write(rows, self.run_id, self.output_label, forecast_type, self.branch_id)
+        except Exception as e:
+            print(f"⚠️ Could not write {forecast_type} forecasts to the forecast store: {str(e)}")
+    
+    def publish_cubes(self):
+        """
+        Merge the forecasts written since the last call into the day, month and
+        year cubes, with actuals from the sales history alongside.
+        """
+        frames, self._pending_cube_frames = self._pending_cube_frames, []
+        if not self.write_cubes or not frames:
+            return
+        
+        try:
+            if self.cube_store is None:
+                from utils.forecast_cubes import ForecastCubeStore
+                self.cube_store = ForecastCubeStore(self.cube_dir)
+            self.cube_store.update(self.output_label, pd.concat(frames, ignore_index=True),
+                                   self.df, self.drug_columns)
+        except Exception as e:
+            print(f"⚠️ Could not update forecast cubes: {str(e)}")
+    
     def generate_yearly_forecast(self, start_year=None, num_years=3):
         """
         Generate yearly forecasts by aggregating monthly forecasts.
@@ -518,7 +1160,8 @@ class MultiHorizonForecast:
             yearly_df = monthly_df.groupby('Year')[self.drug_columns].sum().reset_index()
             
             # Save output
-            yearly_df.to_csv(f"{self.output_path}/yearly_forecast_{self.model_type}_{start_year}.csv", index=False)
+            write_frame(yearly_df, f"{self.output_path}/yearly_forecast_{self.output_label}_{start_year}", self.output_formats)
+            self.store_forecast(yearly_df, 'yearly')
             
             return yearly_df
         else:
@@ -0,0 +1,11 @@
+# tests/conftest.py
+# The tests import the project's top-level scripts and utils package, so the
+# project root is put on the import path wherever pytest is started from.
+#
+# Usage (from the project root):
+#   python -m pytest -q tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
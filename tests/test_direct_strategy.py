@@ -0,0 +1,38 @@
+# tests/test_direct_strategy.py
+# Splitting the horizon-expanded training frame of utils.direct_strategy
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from utils.direct_strategy import TRAINING_HORIZONS, direct_training_frame, lag_feature_names, split_by_target_date
+
+
+def recursive_frame(drug='N02BE', n_days=120):
+    sales = pd.Series(np.random.default_rng(0).poisson(20, n_days + 7).astype(float))
+    frame = pd.DataFrame({'datum': pd.date_range('2019-01-01', periods=n_days + 7), drug: sales})
+    for lag in (1, 2, 3, 7):
+        frame[f'{drug}_lag{lag}'] = sales.shift(lag)
+    frame[f'{drug}_roll3_mean'] = sales.shift(1).rolling(3).mean()
+    frame[f'{drug}_roll7_mean'] = sales.shift(1).rolling(7).mean()
+    return frame.dropna().reset_index(drop=True)
+
+
+def test_target_dates_stay_in_one_set():
+    recursive = recursive_frame()
+    frame = direct_training_frame(recursive, 'N02BE')
+    assert set(frame['Horizon']) == set(TRAINING_HORIZONS)
+    assert frame[lag_feature_names('N02BE')].notna().all().all()
+
+    trainval, test = split_by_target_date(frame, 0.2, 42)
+    train, val = split_by_target_date(frame.loc[trainval], 0.25, 42)
+
+    date_sets = [set(frame.loc[rows, 'datum']) for rows in (train, val, test)]
+    assert not (date_sets[0] & date_sets[1] or date_sets[0] & date_sets[2] or date_sets[1] & date_sets[2])
+    assert sorted(np.concatenate([train, val, test])) == list(frame.index)
+    # The test dates are those of the recursive split with the same seed
+    _, recursive_test = train_test_split(recursive.index, test_size=0.2, random_state=42)
+    assert date_sets[2] == set(recursive.loc[recursive_test, 'datum'])
+    # Rows of a date are adjacent, so unshuffled CV folds do not split a date
+    dates = frame.loc[train, 'datum']
+    assert (dates != dates.shift()).sum() == dates.nunique()
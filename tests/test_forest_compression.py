@@ -0,0 +1,32 @@
+# tests/test_forest_compression.py
+# Seeding of the distilled student in utils.forest_compression
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from utils.forest_compression import compress_forest, distill_forest
+
+
+def forest():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(80, 3)), columns=['a', 'b', 'c'])
+    y = X.to_numpy() @ np.array([1.0, 2.0, 3.0]) + rng.normal(size=80)
+    return RandomForestRegressor(n_estimators=20, max_depth=3, random_state=0).fit(X, y), X, y
+
+
+def test_student_uses_the_training_seed(monkeypatch):
+    model, X, _ = forest()
+    assert distill_forest(model, X, random_state=7).random_state == 7
+    monkeypatch.setenv('FORECAST_SEED', '11')
+    assert distill_forest(model, X).random_state == 11
+    # Explicit parameters still win
+    assert distill_forest(model, X, params={'n_estimators': 5, 'random_state': 3}, random_state=7).random_state == 3
+
+
+def test_compression_is_reproducible_for_a_seed():
+    model, X, y = forest()
+    first, report = compress_forest(model, X.iloc[:40], X.iloc[40:], y[40:], tolerance=1.0, random_state=5)
+    second, _ = compress_forest(model, X.iloc[:40], X.iloc[40:], y[40:], tolerance=1.0, random_state=5)
+    assert report['Method'] in ('prune', 'distill')
+    np.testing.assert_array_equal(first.predict(X), second.predict(X))
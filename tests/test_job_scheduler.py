@@ -0,0 +1,168 @@
+# tests/test_job_scheduler.py
+# Scheduling behaviour of job_scheduler.JobScheduler on the in-process
+# MemoryJobQueue. Jobs run short Python commands instead of the forecast and
+# training scripts.
+
+import sys
+import time
+
+import pytest
+
+from job_scheduler import JobScheduler
+from utils.job_queue import MemoryJobQueue
+
+SLEEP = [sys.executable, '-c', 'import time; time.sleep(30)']
+SUCCEED = [sys.executable, '-c', 'pass']
+FAIL = [sys.executable, '-c', 'import sys; sys.exit(3)']
+PRINT_THREADS = [sys.executable, '-c', 'import os; print("threads", os.environ["OMP_NUM_THREADS"])']
+
+
+@pytest.fixture
+def queue():
+    return MemoryJobQueue()
+
+
+@pytest.fixture
+def make_scheduler(queue, tmp_path):
+    schedulers = []
+
+    def make(cpus=1, commands=None, **kwargs):
+        commands = dict({kind: SLEEP for kind in ('forecast', 'train', 'backtest', 'weather-refresh')},
+                        **(commands or {}))
+        scheduler = JobScheduler(queue, cpus=cpus, log_dir=str(tmp_path / "jobs"), commands=commands,
+                                 retry_delay=0, **kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop_all()
+
+
+def wait_until(condition, scheduler, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        scheduler.step()
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_ready_jobs_run_in_priority_then_submission_order(queue):
+    train = queue.submit('train')
+    backtest = queue.submit('backtest', ['--origin-start', '2019-06-01', '--origin-end', '2019-06-30'])
+    first_forecast = queue.submit('forecast')
+    second_forecast = queue.submit('forecast')
+    urgent_train = queue.submit('train', priority=5)
+
+    assert [job['id'] for job in queue.ready()] == [urgent_train, first_forecast, second_forecast, backtest, train]
+
+
+def test_backtest_without_origin_range_is_rejected(queue):
+    with pytest.raises(ValueError, match='--origin-start and --origin-end'):
+        queue.submit('backtest', ['--days', '7'])
+    with pytest.raises(ValueError, match='--origin-end'):
+        queue.submit('backtest', ['--origin-start', '2019-06-01'])
+    assert queue.jobs() == []
+
+    job_id = queue.submit('backtest', ['--origin-start=2019-06-01', '--origin-end=2019-06-30'])
+    assert queue.get(job_id)['state'] == 'queued'
+
+
+def test_forecast_preempts_running_training(queue, make_scheduler):
+    scheduler = make_scheduler(cpus=1)
+    train = queue.submit('train')
+    assert scheduler.step() == 1
+    assert queue.get(train)['state'] == 'running'
+
+    forecast = queue.submit('forecast')
+    assert scheduler.step() == 1
+    assert queue.get(forecast)['state'] == 'running'
+    preempted = queue.get(train)
+    assert preempted['state'] == 'queued'
+    assert preempted['preemptions'] == 1
+    # A preemption does not use up an attempt
+    assert preempted['attempts'] == 0
+    assert sorted(scheduler.running) == [forecast]
+
+
+def test_training_does_not_preempt_forecast(queue, make_scheduler):
+    scheduler = make_scheduler(cpus=1)
+    forecast = queue.submit('forecast')
+    scheduler.step()
+    train = queue.submit('train')
+    assert scheduler.step() == 0
+    assert queue.get(forecast)['state'] == 'running'
+    assert queue.get(train)['state'] == 'queued'
+
+
+def test_failed_job_is_retried_then_marked_failed(queue, make_scheduler):
+    scheduler = make_scheduler(commands={'forecast': FAIL})
+    job_id = queue.submit('forecast', max_retries=1)
+
+    assert wait_until(lambda: queue.get(job_id)['state'] == 'failed', scheduler)
+    job = queue.get(job_id)
+    assert job['attempts'] == 2
+    assert 'exit code 3' in job['error']
+
+
+def test_successful_job_is_done(queue, make_scheduler):
+    scheduler = make_scheduler(commands={'forecast': SUCCEED})
+    job_id = queue.submit('forecast')
+
+    assert wait_until(lambda: queue.get(job_id)['state'] == 'done', scheduler)
+    assert queue.get(job_id)['attempts'] == 1
+    assert scheduler.idle()
+
+
+def test_cancelled_jobs_do_not_run(queue, make_scheduler):
+    scheduler = make_scheduler(cpus=2)
+    running = queue.submit('forecast')
+    scheduler.step()
+    queued = queue.submit('train')
+
+    assert queue.cancel(queued)
+    assert queue.cancel(running)
+    assert not queue.cancel(running)
+    scheduler.step()
+    assert scheduler.running == {}
+    assert queue.get(queued)['state'] == 'cancelled'
+    assert queue.get(running)['state'] == 'cancelled'
+    assert queue.get(queued)['attempts'] == 0
+
+
+def test_jobs_wait_for_free_cpus(queue, make_scheduler):
+    scheduler = make_scheduler(cpus=3)
+    first = queue.submit('forecast', cpus=2)
+    second = queue.submit('forecast', cpus=2)
+
+    assert scheduler.step() == 1
+    assert scheduler.cpus_in_use() == 2
+    assert queue.get(second)['state'] == 'queued'
+
+    queue.cancel(first)
+    assert wait_until(lambda: queue.get(second)['state'] == 'running', scheduler)
+    assert scheduler.cpus_in_use() == 2
+
+
+def test_job_threads_follow_its_cpu_budget(queue, make_scheduler):
+    scheduler = make_scheduler(cpus=4, commands={'forecast': PRINT_THREADS, 'train': PRINT_THREADS})
+    forecast = queue.submit('forecast', cpus=2)
+    # An oversized budget is capped at the scheduler's CPUs
+    train = queue.submit('train', cpus=16)
+
+    assert wait_until(lambda: queue.get(train)['state'] == 'done', scheduler)
+    with open(scheduler.log_path(forecast)) as f:
+        assert 'threads 2' in f.read()
+    with open(scheduler.log_path(train)) as f:
+        assert 'threads 4' in f.read()
+
+
+def test_kind_limit_caps_concurrent_jobs(queue, make_scheduler):
+    scheduler = make_scheduler(cpus=4, limits={'forecast': 1})
+    queue.submit('forecast')
+    waiting = queue.submit('forecast')
+
+    assert scheduler.step() == 1
+    assert queue.get(waiting)['state'] == 'queued'
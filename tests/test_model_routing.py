@@ -0,0 +1,24 @@
+# tests/test_model_routing.py
+# Routing table updates of utils.model_routing across training runs
+
+import pandas as pd
+
+from utils.model_routing import write_routing_table
+
+
+def results(rows):
+    return pd.DataFrame([{'Drug': drug, 'Model': model, 'Set': 'Validation', 'RMSE': rmse, 'MAE': rmse,
+                          'Latency (ms)': 1.0, 'Model File': f"{model}_{drug}.pkl"} for drug, model, rmse in rows])
+
+
+def test_retrained_drug_replaces_all_its_rows(tmp_path):
+    write_routing_table(results([('N05C', 'RandomForest', 1.0), ('N05C', 'KNN', 1.2),
+                                 ('M01AB', 'RandomForest', 2.0)]), str(tmp_path))
+    # N05C is now scored with TSB only; its earlier model rows must not stay routable
+    table = write_routing_table(results([('N05C', 'TSB', 0.9)]), str(tmp_path))
+
+    assert table[table['Drug'] == 'N05C']['Model'].tolist() == ['TSB']
+    assert table[table['Drug'] == 'N05C']['Model_Type'].tolist() == ['tsb']
+    # Drugs that were not retrained keep their rows
+    assert table[table['Drug'] == 'M01AB']['Model'].tolist() == ['RandomForest']
+    assert pd.read_csv(tmp_path / 'model_routing.csv').equals(table.reset_index(drop=True))
@@ -0,0 +1,35 @@
+# tests/test_tuning_history.py
+# Iteration budget of the warm-started searches in utils.tuning_history
+
+import numpy as np
+import pytest
+from sklearn.linear_model import Ridge
+from skopt.space import Real
+
+from utils.tuning_history import WarmStartBayesSearchCV
+
+SPACE = {'alpha': Real(1e-3, 100, prior='log-uniform')}
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(60, 3))
+    return X, X @ np.array([1.0, 2.0, 3.0]) + rng.normal(size=60)
+
+
+@pytest.mark.parametrize('queued, n_iter, n_points', [
+    ([0.1, 1.0, 10.0], 4, 2),
+    ([0.1], 3, 2),
+    ([0.1, 1.0], 4, 1),
+    ([0.1, 1.0, 10.0], 2, 2),
+])
+def test_queued_points_keep_the_iteration_budget(data, queued, n_iter, n_points):
+    search = WarmStartBayesSearchCV(Ridge(), SPACE, initial_points=[{'alpha': alpha} for alpha in queued],
+                                    n_iter=n_iter, n_points=n_points, cv=3, random_state=0)
+    search.fit(*data)
+
+    evaluated = [params['alpha'] for params in search.cv_results_['params']]
+    assert len(evaluated) == n_iter
+    # Queued points are evaluated first, in order
+    assert evaluated[:min(len(queued), n_iter)] == queued[:n_iter]
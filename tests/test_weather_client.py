@@ -0,0 +1,147 @@
+# tests/test_weather_client.py
+# utils.weather_client.AsyncWeatherClient against the offline stand-in API of
+# utils.weather_stub_server: conditional revalidation, backoff after failures
+# and merging into the date-keyed weather store.
+
+import asyncio
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from utils.weather import load_fetch_meta, weather_store_path
+from utils.weather_client import AsyncWeatherClient
+from utils.weather_stub_server import WeatherStubServer, make_forecast
+
+START = date(2025, 5, 1)
+
+
+def client_for(base_url, weather_dir, **kwargs):
+    return AsyncWeatherClient(base_url=base_url, weather_dir=str(weather_dir), archive_dir=None, **kwargs)
+
+
+def read_store(weather_dir, location_id):
+    return pd.read_csv(weather_store_path(location_id, str(weather_dir)), parse_dates=['date'])
+
+
+def run_with_server(server, scenario):
+    """Run scenario(base_url) with the stub server serving in the same event loop"""
+    async def main():
+        base_url = await server.start()
+        try:
+            return await scenario(base_url)
+        finally:
+            await server.stop()
+
+    return asyncio.run(main())
+
+
+def test_refresh_revalidates_with_etag(tmp_path):
+    server = WeatherStubServer(start_date=START)
+
+    async def scenario(base_url):
+        async with client_for(base_url, tmp_path) as client:
+            first = await client.refresh(['St002'])
+            second = await client.refresh(['St002'])
+            server.bump()
+            third = await client.refresh(['St002'])
+        return first, second, third
+
+    first, second, third = run_with_server(server, scenario)
+    assert first['St002']['status'] == 'updated'
+    assert second['St002']['status'] == 'not_modified'
+    assert third['St002']['status'] == 'updated'
+    assert server.status_counts == {200: 2, 304: 1}
+    # The stored validators are those of the latest download
+    assert load_fetch_meta(weather_store_path('St002', str(tmp_path)))['etag'] == third['St002']['etag']
+    assert third['St002']['etag'] != first['St002']['etag']
+
+
+def test_if_modified_since_revalidation(tmp_path):
+    server = WeatherStubServer(start_date=START)
+
+    async def scenario(base_url):
+        async with client_for(base_url, tmp_path) as client:
+            first = await client.fetch_location('St003')
+            current = await client.fetch_location('St003', {'last_modified': first['last_modified']})
+            stale = await client.fetch_location('St003', {'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+        return first, current, stale
+
+    first, current, stale = run_with_server(server, scenario)
+    assert first['status'] == 'updated'
+    assert current['status'] == 'not_modified'
+    assert current['last_modified'] == first['last_modified']
+    assert stale['status'] == 'updated'
+    assert len(stale['records']) == 7
+
+
+def test_backs_off_and_retries_after_503(tmp_path):
+    server = WeatherStubServer(start_date=START, fail_first=2)
+
+    async def scenario(base_url):
+        async with client_for(base_url, tmp_path, retries=3, backoff=0.1) as client:
+            start = time.perf_counter()
+            result = await client.fetch_location('St004')
+            return result, time.perf_counter() - start
+
+    result, seconds = run_with_server(server, scenario)
+    assert result['status'] == 'updated'
+    assert server.request_counts['St004'] == 3
+    assert server.status_counts == {503: 2, 200: 1}
+    # Two backoff delays of at least half of 0.1 s and 0.2 s (the jitter keeps 50-100%)
+    assert seconds >= 0.15
+
+
+def test_gives_up_after_the_last_retry(tmp_path):
+    server = WeatherStubServer(start_date=START, fail_first=5)
+
+    async def scenario(base_url):
+        async with client_for(base_url, tmp_path, retries=2, backoff=0.01) as client:
+            return await client.refresh(['St005'])
+
+    result = run_with_server(server, scenario)['St005']
+    assert result['status'] == 'failed'
+    assert '503' in result['error']
+    assert server.request_counts['St005'] == 2
+    # Nothing is written for a failed location
+    assert not (tmp_path / 'St005.csv').exists()
+
+
+def test_merge_keeps_older_dates(tmp_path):
+    server = WeatherStubServer(start_date=START)
+
+    async def scenario(base_url):
+        async with client_for(base_url, tmp_path) as client:
+            await client.refresh(['St006'])
+            # Three days later the API returns a window shifted by three days, with new values
+            server.start_date = START + timedelta(days=3)
+            server.bump()
+            return await client.refresh(['St006'])
+
+    result = run_with_server(server, scenario)
+    assert result['St006']['status'] == 'updated'
+
+    store = read_store(tmp_path, 'St006')
+    assert list(store['date'].dt.date) == [START + timedelta(days=i) for i in range(10)]
+    # Overlapping dates hold the newer forecast, older dates keep the first one
+    newer = pd.DataFrame(make_forecast('St006', START + timedelta(days=3), 7, version=1))
+    older = pd.DataFrame(make_forecast('St006', START, 7, version=0))
+    assert store['max_temp'].tolist()[3:] == newer['max_temp'].tolist()
+    assert store['max_temp'].tolist()[:3] == older['max_temp'].tolist()[:3]
+
+
+def test_refreshes_many_locations_concurrently(tmp_path):
+    server = WeatherStubServer(start_date=START, latency=0.2)
+    locations = [f"St{i:03d}" for i in range(10, 30)]
+
+    async def scenario(base_url):
+        async with client_for(base_url, tmp_path) as client:
+            start = time.perf_counter()
+            results = await client.refresh(locations)
+            return results, time.perf_counter() - start
+
+    results, seconds = run_with_server(server, scenario)
+    assert all(result['status'] == 'updated' for result in results.values())
+    assert all(len(read_store(tmp_path, location_id)) == 7 for location_id in locations)
+    # 20 requests of 0.2 s each overlap instead of taking 4 s in sequence
+    assert seconds < 2
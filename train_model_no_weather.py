@@ -1,12 +1,26 @@
-from skopt import BayesSearchCV
 from skopt.space import Integer, Real
 from sklearn.metrics import make_scorer, mean_squared_error, mean_absolute_error, r2_score, mean_absolute_percentage_error
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.neighbors import KNeighborsRegressor
 from sklearn.model_selection import train_test_split
 import xgboost as xgb
-import joblib, os, pandas as pd, numpy as np
+import joblib, os, time, pandas as pd, numpy as np
 import warnings
+from utils.weather_archive import load_weather_frame
+from utils.sales_data import read_sales_history, add_calendar_features, memory_efficient_from_env
+from utils.sales_data import discover_drugs
+from utils.branches import branch_config, branch_from_env
+from utils.weather_features import attach_weather, monthly_weather_profile
+from utils.tuning_history import TuningHistory, sales_profile, warm_started_search
+from utils.residual_store import ResidualStore
+from utils.feature_selection import REPORT_COLUMNS, prune_features, prune_features_from_env
+from utils.feature_selection import summarize as summarize_pruning
+from utils.forest_compression import REPORT_COLUMNS as COMPRESSION_COLUMNS
+from utils.forest_compression import compress_forest, compress_forests_from_env, save_compressed
+from utils.demand_patterns import PATTERN_FILE, classify_demand, demand_metrics, evaluate_sparse, naive_scale
+from utils.demand_patterns import sparse_drugs, sparse_method_from_env, with_sparse_methods
+from utils.concurrency import apply_parallelism, parallelism_plan, search_context, seed_from_env
+from utils.concurrency import set_estimator_threads
 warnings.filterwarnings('ignore')
 def safe_mape(y_true, y_pred):
     y_true, y_pred = np.array(y_true), np.array(y_pred)
@@ -18,25 +32,64 @@ def safe_mape(y_true, y_pred):
 # ----------- Configuration -----------
 DATA_PATH = "dataset/salesdaily.csv"
 WEATHER_PATH = "dataset/weather/perlis_7day.csv"
+WEATHER_ARCHIVE = "dataset/weather/archive"
+LOCATION_ID = "St001"
 MODEL_DIR = "saved_models"
+# FORECAST_MEMORY_EFFICIENT=1 loads drug columns as float32 and calendar features as small ints
+MEMORY_EFFICIENT = memory_efficient_from_env()
+# Every evaluated hyperparameter point is kept; later searches start from them
+TUNING_DB = "tuning_history_no_weather.db"
+N_ITER = 25
+WARM_START_N_ITER = 10
+# Residuals of every run go to one dataset partitioned by Drug/Model/Set
+RESIDUAL_DATASET = "residuals/dataset_no_weather"
+# Tree models are refitted on the features that matter (FORECAST_PRUNE_FEATURES=0 keeps every feature)
+PRUNE_FEATURES = prune_features_from_env()
+PRUNING_FILE = "feature_pruning_results_no_weather.csv"
+# Random Forests also get a pruned or distilled *_compressed.pkl (FORECAST_COMPRESS_FORESTS=0 skips it)
+COMPRESS_FORESTS = compress_forests_from_env()
+COMPRESSION_FILE = "forest_compression_results_no_weather.csv"
+RESULTS_FILE = "model_comparison_results_no_weather.csv"
+# Intermittent and lumpy drugs skip the model search and are scored with the Croston/TSB
+# estimator instead (FORECAST_SPARSE_METHOD=croston|tsb|none, see utils/demand_patterns.py)
+SPARSE_METHOD = sparse_method_from_env()
+# FORECAST_BRANCH=B001 trains one branch: its sales history, weather location and
+# saved_models/B001/ (see utils/branches.py). The tuning history, residuals and reports
+# of a branch run are kept in its model directory.
+BRANCH_ID = branch_from_env()
+if BRANCH_ID:
+    BRANCH = branch_config(BRANCH_ID)
+    DATA_PATH, LOCATION_ID, WEATHER_PATH, MODEL_DIR = (BRANCH[key] for key in
+                                                       ('DATA_PATH', 'LOCATION_ID', 'WEATHER_PATH', 'MODEL_DIR'))
+    TUNING_DB, RESIDUAL_DATASET, RESULTS_FILE, PRUNING_FILE, COMPRESSION_FILE = (
+        os.path.join(MODEL_DIR, path)
+        for path in (TUNING_DB, RESIDUAL_DATASET, RESULTS_FILE, PRUNING_FILE, COMPRESSION_FILE))
+    print(f"🏬 Training branch {BRANCH_ID}: {DATA_PATH} -> {MODEL_DIR}")
+# One CPU budget split between the search's worker processes and each fit's threads;
+# deterministic unless FORECAST_DETERMINISTIC=0 (see utils/concurrency.py)
+PARALLELISM = parallelism_plan()
+apply_parallelism(PARALLELISM)
+SEED = seed_from_env()
+print(f"🧵 {PARALLELISM['cpus']} CPUs: {PARALLELISM['search_jobs']} search workers x "
+      f"{PARALLELISM['estimator_threads']} threads per fit{' (deterministic)' if PARALLELISM['deterministic'] else ''}")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
 # Define model types to train
 MODELS = ["RandomForest", "XGBoost", "KNN"]
 
-drug_columns = ['M01AB', 'M01AE', 'N02BA', 'N02BE', 'N05B', 'N05C', 'R03', 'R06']
+# Every drug in the sales history (wide or long layout, see utils/sales_data.py)
+drug_columns = discover_drugs(DATA_PATH)
 
 # ----------- Load Sales Data -----------
 print("Loading sales data...")
-df = pd.read_csv(DATA_PATH)
-df['datum'] = pd.to_datetime(df['datum'])
-df = df.sort_values('datum')
-df.rename(columns=lambda x: x.strip().replace(' ', '_'), inplace=True)
+df = read_sales_history(DATA_PATH, drug_columns, memory_efficient=MEMORY_EFFICIENT)
 print(f"Sales data loaded: {df.shape[0]} rows")
 
 # ----------- Load Weather Data -----------
 print("Loading weather data...")
-weather_df = pd.read_csv(WEATHER_PATH)
+# Range query from the start of the sales history; falls back to the CSV store
+weather_df = load_weather_frame(LOCATION_ID, start=df['datum'].min(), archive_dir=WEATHER_ARCHIVE,
+                                fallback_csv=WEATHER_PATH)
 weather_df.columns = weather_df.columns.str.strip().str.replace(" ", "_").str.lower()
 weather_df['date'] = pd.to_datetime(weather_df['date'])
 
@@ -76,12 +129,7 @@ print(f"Weather data loaded: {weather_df.shape[0]} rows")
 # ----------- Feature Engineering -----------
 print("Performing feature engineering...")
 # Add time-based features to main dataframe
-df['Year'] = df['datum'].dt.year
-df['Month'] = df['datum'].dt.month
-df['DayOfWeek'] = df['datum'].dt.dayofweek
-df['Is_Weekend'] = df['DayOfWeek'] >= 5
-df['Weekday_Name'] = df['datum'].dt.day_name()
-df = pd.get_dummies(df, columns=['Weekday_Name'])
+df = add_calendar_features(df, memory_efficient=MEMORY_EFFICIENT)
 
 # ----------- Handle Data Imbalance Issues -----------
 # Option 1: For historical analysis (using only available weather data)
@@ -90,51 +138,12 @@ df_historical = df[df['datum'].isin(available_dates)].copy()
 
 # Option 2: For future prediction (filling missing weather with averages or similar days)
 # Group weather by month to get seasonal patterns
-weather_df['Month'] = weather_df['date'].dt.month
-
-# Safe aggregation function for mode that handles empty series
-def safe_mode(x):
-    if x.empty:
-        return 0  # Default to 'Clear' if no data
-    mode_result = x.mode()
-    if len(mode_result) == 0:
-        return 0
-    return mode_result[0]
-
-monthly_weather_avg = weather_df.groupby('Month').agg({
-    'max_temp': 'mean',
-    'min_temp': 'mean',
-    'weather_code': safe_mode
-}).reset_index()
-
-# Function to get weather features for any date
-def get_weather_features(date, weather_df, monthly_avg):
-    # Try exact match first
-    exact_match = weather_df[weather_df['date'] == date]
-    if not exact_match.empty:
-        return exact_match[['max_temp', 'min_temp', 'weather_code']].iloc[0].to_dict()
-    
-    # Fall back to monthly average
-    month = date.month
-    avg_data = monthly_avg[monthly_avg['Month'] == month]
-    if not avg_data.empty:
-        return avg_data[['max_temp', 'min_temp', 'weather_code']].iloc[0].to_dict()
-    
-    # Last resort: return global averages
-    return {
-        'max_temp': weather_df['max_temp'].mean() if not weather_df['max_temp'].empty else 30,
-        'min_temp': weather_df['min_temp'].mean() if not weather_df['min_temp'].empty else 24,
-        'weather_code': weather_df['weather_code'].mode()[0] if not weather_df['weather_code'].empty else 0
-    }
-
-# Apply weather features to all dates in sales data
-print("Applying weather features to sales data...")
-weather_features = []
-for date in df['datum']:
-    features = get_weather_features(date, weather_df, monthly_weather_avg)
-    weather_features.append(features)
+monthly_weather_avg = monthly_weather_profile(weather_df)
 
-weather_features_df = pd.DataFrame(weather_features)
+# Apply weather features to all dates in sales data: observed weather of the
+# day, else the monthly average, else the overall average (one join for all dates)
+print("Applying weather features to sales data...")
+weather_features_df = attach_weather(df['datum'], weather_df, monthly_weather_avg)
 df = pd.concat([df.reset_index(drop=True), weather_features_df], axis=1)
 
 # Define RMSE scorer
@@ -146,7 +155,7 @@ rmse_scorer = make_scorer(rmse, greater_is_better=False)
 # ----------- Define model configurations -----------
 def get_model_config(model_type):
     if model_type == "RandomForest":
-        model = RandomForestRegressor(random_state=42)
+        model = RandomForestRegressor(random_state=SEED)
         search_space = {
             'n_estimators': Integer(50, 300),
             'max_depth': Integer(3, 20),
@@ -154,7 +163,7 @@ def get_model_config(model_type):
             'min_samples_leaf': Integer(1, 10)
         }
     elif model_type == "XGBoost":
-        model = xgb.XGBRegressor(random_state=42)
+        model = xgb.XGBRegressor(random_state=SEED)
         search_space = {
             'n_estimators': Integer(50, 300),
             'max_depth': Integer(3, 10),
@@ -174,15 +183,33 @@ def get_model_config(model_type):
     
     return model, search_space
 
+# ----------- Demand Patterns -----------
+# Smooth / erratic / intermittent / lumpy per drug over the trailing year, saved next to the models
+# with the estimator each sparse drug is scored with, which the forecaster then uses for it
+demand_patterns = classify_demand(df[drug_columns].to_numpy(dtype=float), drug_columns)
+with_sparse_methods(demand_patterns, SPARSE_METHOD).to_csv(os.path.join(MODEL_DIR, PATTERN_FILE), index=False)
+sparse = set(sparse_drugs(demand_patterns)) if SPARSE_METHOD else set()
+print(f"📊 Demand patterns: {demand_patterns['Pattern'].value_counts().to_dict()}"
+      f"{f'; {len(sparse)} sparse drug(s) scored with {SPARSE_METHOD.upper()}' if sparse else ''}")
+
 # ----------- Model Training Loop ----------- 
 min_required_rows = 20  # Minimum data points required
+
+# Columns shared by every drug's model frame; other drugs' columns are never copied
+base_columns = [col for col in ['Year', 'Month', 'DayOfWeek', 'Is_Weekend', 'max_temp', 'min_temp', 'weather_code']
+                if col in df.columns] + [col for col in df.columns if col.startswith('Weekday_Name_')]
 all_results = []
+tuning_history = TuningHistory(TUNING_DB)
+run_id = time.strftime("%Y%m%dT%H%M%S")
+residual_frames = []
+pruning_results = []
+compression_results = []
 
 for drug in drug_columns:
     print(f"\n🔍 Processing models for {drug}...")
     
-    # Create a copy to avoid modifying the original dataframe
-    df_drug = df.copy()
+    # Copy only this drug's columns so the original dataframe is not modified
+    df_drug = df[['datum', drug] + base_columns].copy()
     
     # Add lag features specifically for this drug
     df_drug[f'{drug}_lag1'] = df_drug[drug].shift(1)
@@ -200,6 +227,23 @@ for drug in drug_columns:
         print(f"⚠️ Not enough data for {drug} (only {df_model.shape[0]} rows). Skipping.")
         continue
 
+    # MASE denominator: mean absolute day-to-day change of the drug's sales
+    scale = naive_scale(df[drug])
+
+    if drug in sparse:
+        # No model search: one-day-ahead estimator forecasts scored on the same 60/20/20 split
+        trainval_rows, test_rows = train_test_split(df_model.index, test_size=0.2, random_state=SEED)
+        train_rows, val_rows = train_test_split(trainval_rows, test_size=0.25, random_state=SEED)
+        sparse_rows, sparse_residuals = evaluate_sparse(SPARSE_METHOD, df[['datum', drug]], drug,
+                                                        {'Train': train_rows, 'Validation': val_rows,
+                                                         'Test': test_rows})
+        all_results.extend(sparse_rows)
+        residual_frames.extend(sparse_residuals)
+        validation = sparse_rows[1]
+        print(f"⚡ {drug} is {demand_patterns.set_index('Drug').loc[drug, 'Pattern']}: {SPARSE_METHOD.upper()} "
+              f"estimator, validation MASE {validation['MASE']:.2f}, bias {validation['Bias']:+.1%}")
+        continue
+
     # Feature list - EXCLUDE weather features
     feature_cols = ['Year', 'Month', 'DayOfWeek', 'Is_Weekend'] + \
                   [col for col in df_model.columns if col.startswith('Weekday_Name_')] + \
@@ -219,10 +263,13 @@ for drug in drug_columns:
     
     # --- NEW: Split into train, validation, and test sets ---
     # First, split off the test set (20%)
-    X_trainval, X_test, y_trainval, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_trainval, X_test, y_trainval, y_test = train_test_split(X, y, test_size=0.2, random_state=SEED)
     # Then, split trainval into train (60%) and validation (20%)
-    X_train, X_val, y_train, y_val = train_test_split(X_trainval, y_trainval, test_size=0.25, random_state=42)
+    X_train, X_val, y_train, y_val = train_test_split(X_trainval, y_trainval, test_size=0.25, random_state=SEED)
     # 0.25 x 0.8 = 0.2, so you get 60/20/20
+    
+    # Sales profile used to transfer tuning results between similar drugs
+    tuning_history.set_profile(drug, sales_profile(y_train))
 
     # Train and evaluate each model type
     for model_type in MODELS:
@@ -231,31 +278,48 @@ for drug in drug_columns:
         try:
             # Get model and its hyperparameter search space
             model, search_space = get_model_config(model_type)
+            set_estimator_threads(model, PARALLELISM['estimator_threads'])
             
-            # Initialize the optimizer
-            opt = BayesSearchCV(
-                model,
-                search_spaces=search_space,
-                n_iter=25,
+            # Initialize the optimizer, warm-started from the tuning history
+            opt, warm_start = warm_started_search(
+                tuning_history, drug, model_type, model, search_space,
+                n_iter=N_ITER,
+                warm_n_iter=WARM_START_N_ITER,
                 scoring=rmse_scorer,
                 cv=3,
-                random_state=42,
-                n_jobs=-1,
+                random_state=SEED,
+                n_jobs=PARALLELISM['search_jobs'],
                 verbose=0
             )
+            print(f"🔍 Search: {warm_start} start, {opt.n_iter} iterations")
             
             # Train the model
-            opt.fit(X_train, y_train)
+            search_start = time.perf_counter()
+            with search_context(PARALLELISM):
+                opt.fit(X_train, y_train)
+            search_seconds = time.perf_counter() - search_start
+            tuning_history.record_search(drug, model_type, opt, warm_start, search_seconds, run_id)
             best_model = opt.best_estimator_
 
+            # Compact refit without redundant and low-importance features (tree models only)
+            features = feature_cols
+            if PRUNE_FEATURES and hasattr(best_model, 'feature_importances_'):
+                best_model, pruning = prune_features(best_model, X_train, y_train, X_val, y_val)
+                pruning_results.append({'Drug': drug, 'Model': model_type, **pruning})
+                if pruning['Pruned']:
+                    features = best_model.feature_schema_['features']
+                    print(f"✂️ Features: {pruning['Features_Full']} -> {pruning['Features']}, "
+                          f"size {pruning['Size_KB_Full']:.0f} -> {pruning['Size_KB']:.0f} KB, "
+                          f"latency {pruning['Latency_ms_Full']:.2f} -> {pruning['Latency_ms']:.2f} ms")
+
             # Validation predictions
-            val_pred = best_model.predict(X_val)
+            val_pred = best_model.predict(X_val[features])
             rmse_val = rmse(y_val, val_pred)
             mae_val = mean_absolute_error(y_val, val_pred)
             r2_val = r2_score(y_val, val_pred)
 
             # Test predictions (for final unbiased evaluation)
-            test_pred = best_model.predict(X_test)
+            test_pred = best_model.predict(X_test[features])
             rmse_test = rmse(y_test, test_pred)
             mae_test = mean_absolute_error(y_test, test_pred)
             r2_test = r2_score(y_test, test_pred)
@@ -267,7 +331,7 @@ for drug in drug_columns:
             if hasattr(best_model, 'feature_importances_'):
                 importance = best_model.feature_importances_
                 feature_importance = pd.DataFrame({
-                    'Feature': feature_cols,
+                    'Feature': features,
                     'Importance': importance
                 }).sort_values('Importance', ascending=False)
                 
@@ -279,8 +343,19 @@ for drug in drug_columns:
             joblib.dump(best_model, model_path)
             print(f"📁 Saved: {model_path}")
             
+            # Smaller forest or distilled student next to the original (main.py --compressed)
+            if COMPRESS_FORESTS and model_type == "RandomForest":
+                compressed, compression = compress_forest(best_model, X_train[features], X_val[features], y_val,
+                                                          X_test[features], y_test, random_state=SEED)
+                compressed_path = save_compressed(model_path, compressed, compression)
+                compression_results.append({'Drug': drug, 'Model_File': os.path.basename(model_path), **compression})
+                if compressed_path:
+                    print(f"📁 Saved: {compressed_path} ({compression['Method']}, {compression['Trees_Full']} -> "
+                          f"{compression['Trees']} trees, latency {compression['Latency_ms_Full']:.2f} -> "
+                          f"{compression['Latency_ms']:.2f} ms)")
+            
             # After fitting the model and before saving results:
-            train_pred = best_model.predict(X_train)
+            train_pred = best_model.predict(X_train[features])
 
             # Calculate training metrics
             rmse_train = rmse(y_train, train_pred)
@@ -294,7 +369,7 @@ for drug in drug_columns:
             # Test metrics
             mape_test = safe_mape(y_test, test_pred) * 100
 
-            # Save per-sample test predictions for residual analysis (optional)
+            # Per-sample test predictions for residual analysis
             test_results = pd.DataFrame({
                 'Date': df_model.loc[X_test.index, 'datum'],
                 'Drug': drug,
@@ -303,9 +378,8 @@ for drug in drug_columns:
                 'Predicted_Sales': test_pred,
                 'Set': 'Test'
             })
-            test_results.to_csv(f'residuals/residuals_{drug}_{model_type}_test.csv', index=False)
 
-            # Save per-sample training predictions for residual analysis
+            # Per-sample training predictions for residual analysis
             train_results = pd.DataFrame({
                 'Date': df_model.loc[X_train.index, 'datum'],
                 'Drug': drug,
@@ -314,9 +388,8 @@ for drug in drug_columns:
                 'Predicted_Sales': train_pred,
                 'Set': 'Train'
             })
-            train_results.to_csv(f'residuals/residuals_{drug}_{model_type}_train.csv', index=False)
 
-            # Save per-sample validation predictions for residual analysis
+            # Per-sample validation predictions for residual analysis
             val_results = pd.DataFrame({
                 'Date': df_model.loc[X_val.index, 'datum'],
                 'Drug': drug,
@@ -325,7 +398,7 @@ for drug in drug_columns:
                 'Predicted_Sales': val_pred,
                 'Set': 'Validation'
             })
-            val_results.to_csv(f'residuals/residuals_{drug}_{model_type}_val.csv', index=False)
+            residual_frames.extend([train_results, val_results, test_results])
 
             # Store train, validation, and test results
             all_results.append({
@@ -335,9 +408,12 @@ for drug in drug_columns:
                 'RMSE': rmse_train,
                 'MAE': mae_train,
                 'MAPE': mape_train,
+                **demand_metrics(y_train, train_pred, scale),
                 'R2': r2_train,
                 'Samples': X_train.shape[0],
-                'Best Params': opt.best_params_
+                'Best Params': opt.best_params_,
+                'Warm Start': warm_start,
+                'Search Seconds': search_seconds
             })
             all_results.append({
                 'Drug': drug,
@@ -346,9 +422,12 @@ for drug in drug_columns:
                 'RMSE': rmse_val,
                 'MAE': mae_val,
                 'MAPE': mape_val,
+                **demand_metrics(y_val, val_pred, scale),
                 'R2': r2_val,
                 'Samples': X_val.shape[0],
-                'Best Params': opt.best_params_
+                'Best Params': opt.best_params_,
+                'Warm Start': warm_start,
+                'Search Seconds': search_seconds
             })
             all_results.append({
                 'Drug': drug,
@@ -357,29 +436,61 @@ for drug in drug_columns:
                 'RMSE': rmse_test,
                 'MAE': mae_test,
                 'MAPE': mape_test,
+                **demand_metrics(y_test, test_pred, scale),
                 'R2': r2_test,
                 'Samples': X_test.shape[0],
-                'Best Params': opt.best_params_
+                'Best Params': opt.best_params_,
+                'Warm Start': warm_start,
+                'Search Seconds': search_seconds
             })
 
         except Exception as e:
             print(f"❌ Error training {model_type} model for {drug}: {str(e)}")
 
+# Residuals of the whole run in one write
+residual_rows = ResidualStore(RESIDUAL_DATASET).write_run(residual_frames, run_id, {'features': 'no_weather'})
+if residual_rows:
+    print(f"\n📁 Saved {residual_rows} residuals to {RESIDUAL_DATASET} (run {run_id})")
+
+# Feature pruning: features, model size, feature-build cost and latency before and after
+if pruning_results:
+    pruning_df = pd.DataFrame(pruning_results)[REPORT_COLUMNS]
+    pruning_df.to_csv(PRUNING_FILE, index=False)
+    print("\n✂️ Feature pruning (averages per model type):")
+    print(summarize_pruning(pruning_df).to_string())
+    print(f"📁 Pruning report saved to {PRUNING_FILE}")
+
+# Forest compression: trees, size, load time and latency before and after
+if compression_results:
+    compression_df = pd.DataFrame(compression_results)[COMPRESSION_COLUMNS]
+    compression_df.to_csv(COMPRESSION_FILE, index=False)
+    print("\n🗜️ Forest compression:")
+    print(compression_df[['Drug', 'Method', 'Trees_Full', 'Trees', 'Validation_RMSE_Full', 'Validation_RMSE',
+                          'Load_ms_Full', 'Load_ms', 'Latency_ms_Full', 'Latency_ms']].round(3).to_string(index=False))
+    print(f"📁 Compression report saved to {COMPRESSION_FILE}")
+
+# Search time of warm-started searches compared with cold ones
+search_report = tuning_history.search_report()
+tuning_history.close()
+if not search_report.empty:
+    print("\n⏱️ Hyperparameter search time by warm start:")
+    print(search_report.to_string(index=False))
+
 # Print summary of results
 if all_results:
     results_df = pd.DataFrame(all_results)
 
     # Print overall summary
     print("\n📋 Summary of All Models:")
-    print(results_df[['Drug', 'Model', 'Set', 'RMSE', 'MAE', 'R2']])
+    print(results_df[['Drug', 'Model', 'Set', 'RMSE', 'MAE', 'MASE', 'Bias', 'R2']])
 
     # Print best model for each drug (based on validation RMSE)
     print("\n🏆 Best Model for Each Drug (Validation Set):")
     best_models = results_df[results_df['Set'] == 'Validation'].loc[results_df[results_df['Set'] == 'Validation'].groupby('Drug')['RMSE'].idxmin()]
-    print(best_models[['Drug', 'Model', 'RMSE', 'MAE', 'R2']])
+    print(best_models[['Drug', 'Model', 'RMSE', 'MAE', 'MASE', 'R2']])
 
     # Save results
-    results_df.to_csv('model_comparison_results_no_weather.csv', index=False)
+    results_df.to_csv(RESULTS_FILE, index=False)
 else:
     print("\n❌ No models were successfully trained. Check your data.")
 
@@ -0,0 +1,258 @@
+# utils/baseline_models.py
+# Vectorized statistical baselines
+# Every drug series is fitted and forecast at once as one (days x drugs)
+# array, from any number of forecast origins:
+#   snaive   last observed value on the same weekday (seasonal naive, period 7)
+#   profile  trailing-year level x month factor x weekday factor
+#   ets      additive exponential smoothing with weekday seasonality; the
+#            smoothing weight is picked per drug from a grid by one-step error
+#   croston  Croston's method with the Syntetos-Boylan bias correction: demand
+#            size and interval between demands smoothed separately, updated
+#            on demand days only (intermittent series, see utils/demand_patterns.py)
+#   tsb      Teunter-Syntetos-Babai: demand size smoothed on demand days and
+#            demand probability smoothed every day, so the forecast decays
+#            when a drug stops selling (intermittent and lumpy series)
+# They need no trained model, so they are selectable as model types to
+# compare the tree models against, and the forecaster falls back to one for
+# drugs whose model file is missing.
+#
+# Usage (from the project root, backtest on the sales history):
+#   python -m utils.baseline_models --origin-start 2019-06-01 --origin-end 2019-08-31 --days 14
+#   python -m utils.baseline_models --origin-start 2019-06-01 --origin-end 2019-08-31 --compare rf
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+BASELINE_MODELS = ['snaive', 'profile', 'ets', 'croston', 'tsb']
+
+# Baseline used for drugs without a model file
+DEFAULT_FALLBACK = 'ets'
+
+SEASON_LENGTH = 7
+
+# Days of history the profile level is averaged over
+PROFILE_LEVEL_DAYS = 365
+
+# Level smoothing weights tried for every drug, and the weekday smoothing weight
+ETS_ALPHAS = np.array([0.02, 0.05, 0.1, 0.2, 0.3, 0.5])
+ETS_GAMMA = 0.05
+
+# Smoothing weights of the intermittent demand estimators
+CROSTON_ALPHA = 0.1
+TSB_ALPHA = 0.1
+TSB_BETA = 0.05
+
+
+def baseline_forecast(method, values, dates, positions, target_dates):
+    """
+    Forecast every drug from every origin with one baseline.
+
+    Args:
+        method (str): One of BASELINE_MODELS
+        values (ndarray): Sales history, shape (days, drugs), one row per consecutive day
+        dates (array-like): Date of each history row
+        positions (ndarray): History rows available at each origin (rows strictly before it)
+        target_dates (array-like): Dates to forecast, shape (origins, steps)
+
+    Returns:
+        ndarray: Non-negative forecasts with shape (origins, steps, drugs)
+    """
+    if method not in BASELINE_MODELS:
+        raise ValueError(f"Unknown baseline '{method}'. Choose from {BASELINE_MODELS}.")
+    values = np.asarray(values, dtype=float)
+    dates = pd.DatetimeIndex(dates)
+    positions = np.asarray(positions, dtype=int)
+    target_dates = np.asarray(target_dates, dtype='datetime64[ns]')
+    targets = pd.DatetimeIndex(target_dates.ravel())
+    target_weekday = targets.dayofweek.values.reshape(target_dates.shape)
+
+    fallback = _mean_before(values, positions)
+    if method == 'snaive':
+        forecast = _seasonal_naive(values, dates.dayofweek.values, positions, target_weekday, fallback)
+    elif method == 'profile':
+        forecast = _profile(values, dates.month.values, dates.dayofweek.values, positions,
+                            targets.month.values.reshape(target_dates.shape), target_weekday, fallback)
+    elif method == 'ets':
+        forecast = _ets(values, dates.dayofweek.values, positions, target_weekday, fallback)
+    else:
+        # Intermittent estimators forecast a flat rate per drug for every step
+        rate = _intermittent_rate(method, values, positions, fallback)
+        forecast = np.broadcast_to(rate[:, None, :], target_weekday.shape + (values.shape[1],))
+    return np.maximum(forecast, 0)
+
+
+def _mean_before(values, positions):
+    """Mean of each drug over the rows before each origin, shape (origins, drugs)"""
+    observed = ~np.isnan(values)
+    zero = np.zeros((1, values.shape[1]))
+    sums = np.concatenate([zero, np.cumsum(np.where(observed, values, 0), axis=0)])
+    counts = np.concatenate([zero, np.cumsum(observed, axis=0)])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums[positions] / counts[positions]
+        overall = sums[-1] / counts[-1]
+    # Origins without history use the overall mean; drugs without any sales use 0
+    means = np.where(np.isnan(means), overall, means)
+    return np.nan_to_num(means)
+
+
+def _seasonal_naive(values, weekdays, positions, target_weekday, fallback):
+    # Row of the last observation on each target weekday; the history is consecutive
+    # days, so it is found from the weekday of the last row before the origin
+    last = positions - 1
+    rows = last[:, None] - (weekdays[np.clip(last, 0, None)][:, None] - target_weekday) % SEASON_LENGTH
+    picked = np.where((rows >= 0)[..., None], values[np.clip(rows, 0, None)], np.nan)
+    return np.where(np.isnan(picked), fallback[:, None, :], picked)
+
+
+def _group_factors(filled, observed, groups, n_groups):
+    """Mean of each group relative to the overall mean, shape (groups, drugs); 1 where undefined"""
+    one_hot = (groups[None, :] == np.arange(n_groups)[:, None]).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        group_means = (one_hot @ filled) / (one_hot @ observed)
+        factors = group_means / (filled.sum(axis=0) / observed.sum(axis=0))
+    return np.where(np.isfinite(factors), factors, 1.0)
+
+
+def _profile(values, months, weekdays, positions, target_month, target_weekday, fallback):
+    observed = ~np.isnan(values)
+    filled = np.where(observed, values, 0)
+    forecast = np.empty(target_weekday.shape + (values.shape[1],))
+    for i, position in enumerate(positions):
+        start = max(0, position - PROFILE_LEVEL_DAYS)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            level = filled[start:position].sum(axis=0) / observed[start:position].sum(axis=0)
+        level = np.where(np.isnan(level), fallback[i], level)
+        month_factor = _group_factors(filled[:position], observed[:position], months[:position] - 1, 12)
+        weekday_factor = _group_factors(filled[:position], observed[:position], weekdays[:position],
+                                        SEASON_LENGTH)
+        forecast[i] = level * month_factor[target_month[i] - 1] * weekday_factor[target_weekday[i]]
+    return forecast
+
+
+def _ets(values, weekdays, positions, target_weekday, fallback):
+    n_days, n_drugs = values.shape
+    alphas = ETS_ALPHAS[:, None]
+
+    # States are initialised from the first week and snapshotted at every origin
+    # while the whole history is smoothed once, for all weights and drugs together
+    first_week = values[:SEASON_LENGTH]
+    with np.errstate(invalid='ignore'):
+        level0 = np.nan_to_num(np.nanmean(first_week, axis=0)) if len(first_week) else np.zeros(n_drugs)
+    level = np.tile(level0, (len(ETS_ALPHAS), 1))
+    season = np.zeros((SEASON_LENGTH, len(ETS_ALPHAS), n_drugs))
+    for t in range(len(first_week)):
+        season[weekdays[t]] = np.nan_to_num(values[t] - level0)
+    sse = np.zeros_like(level)
+
+    wanted = set(positions[positions >= SEASON_LENGTH].tolist())
+    states = {}
+    last_wanted = max(wanted, default=SEASON_LENGTH - 1)
+    for t in range(SEASON_LENGTH, last_wanted + 1):
+        if t in wanted:
+            states[t] = (level.copy(), season.copy(), sse.copy())
+            if t == last_wanted:
+                break
+        weekday = weekdays[t]
+        error = np.nan_to_num(values[t] - (level + season[weekday]))
+        sse += error ** 2
+        level += alphas * error
+        season[weekday] += ETS_GAMMA * error
+
+    drug_index = np.arange(n_drugs)
+    forecast = np.empty(target_weekday.shape + (n_drugs,))
+    for i, position in enumerate(positions):
+        if position not in states:
+            # Less than a week of history: the mean so far
+            forecast[i] = fallback[i]
+            continue
+        level_t, season_t, sse_t = states[position]
+        best = sse_t.argmin(axis=0)
+        forecast[i] = level_t[best, drug_index] + season_t[:, best, drug_index][target_weekday[i]]
+    return forecast
+
+
+def _intermittent_rate(method, values, positions, fallback):
+    """Demand per day of every drug at every origin from Croston (SBA) or TSB, shape (origins, drugs)"""
+    n_drugs = values.shape[1]
+    # Size and interval (Croston) or probability (TSB) start at the first demand
+    size = np.full(n_drugs, np.nan)
+    interval = np.full(n_drugs, np.nan)
+    probability = np.full(n_drugs, np.nan)
+    since_demand = np.ones(n_drugs)
+    seen = np.zeros(n_drugs, dtype=bool)
+
+    def rate():
+        if method == 'croston':
+            return (1 - CROSTON_ALPHA / 2) * size / interval
+        return probability * size
+
+    wanted = set(positions.tolist())
+    states = {}
+    last_wanted = max(wanted, default=0)
+    for t in range(last_wanted + 1):
+        if t in wanted:
+            states[t] = rate()
+            if t == last_wanted:
+                break
+        observed = ~np.isnan(values[t])
+        demand = np.where(observed, values[t], 0) > 0
+        first = demand & ~seen
+        later = demand & seen
+        if method == 'croston':
+            size = np.where(first, values[t], size)
+            interval = np.where(first, since_demand, interval)
+            size = np.where(later, size + CROSTON_ALPHA * (values[t] - size), size)
+            interval = np.where(later, interval + CROSTON_ALPHA * (since_demand - interval), interval)
+            since_demand = np.where(demand, 1, since_demand + observed)
+        else:
+            # The probability starts at the demand rate up to the first demand
+            probability = np.where(first, 1 / since_demand, probability)
+            size = np.where(first, values[t], size)
+            update = seen & observed
+            probability = np.where(update, probability + TSB_BETA * (demand - probability), probability)
+            size = np.where(later, size + TSB_ALPHA * (values[t] - size), size)
+            since_demand = np.where(demand, 1, since_demand + observed)
+        seen |= demand
+
+    forecast = np.stack([states[position] for position in positions]) if len(positions) else \
+        np.empty((0, n_drugs))
+    # Drugs without a demand before the origin keep the mean so far (0 without sales)
+    return np.where(np.isnan(forecast), fallback, forecast)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Backtest the statistical baselines')
+    parser.add_argument('--origin-start', type=str, required=True, help='First forecast origin (YYYY-MM-DD)')
+    parser.add_argument('--origin-end', type=str, required=True, help='Last forecast origin (YYYY-MM-DD)')
+    parser.add_argument('--days', type=int, default=14, help='Days forecast from each origin')
+    parser.add_argument('--compare', type=str, choices=['rf', 'knn', 'xgboost', 'auto'],
+                        help='Also backtest this trained model type')
+    parser.add_argument('--models', type=str, default="saved_models", help='Model directory')
+    parser.add_argument('--drugs', type=str, help='Comma-separated drug codes (default: all)')
+    parser.add_argument('--output', type=str, default="forecasts/backtest", help='Output directory')
+    args = parser.parse_args()
+
+    from multi_horizon_forecast import MultiHorizonForecast
+    from utils.direct_strategy import backtest
+
+    origins = pd.date_range(args.origin_start, args.origin_end, freq='D')
+    # Without a fallback, a trained model type is scored on its own forecasts only
+    config = {'MODEL_DIR': args.models, 'OUTPUT_PATH': args.output, 'WRITE_CUBES': False,
+              'FALLBACK_BASELINE': 'none'}
+    if args.drugs:
+        config['DRUG_COLUMNS'] = args.drugs.split(',')
+    forecaster = MultiHorizonForecast(config)
+
+    results = {}
+    for model_type in BASELINE_MODELS + ([args.compare] if args.compare else []):
+        forecaster.set_model_type(model_type)
+        results[model_type] = backtest(forecaster, origins, args.days)
+
+    print(f"\n⏱️ {len(origins)} origins x {args.days} days:")
+    for model_type, (seconds, _) in results.items():
+        print(f"   {model_type}: {seconds * 1000:.1f} ms")
+    comparison = pd.concat({model_type: metrics for model_type, (_, metrics) in results.items()}, axis=1)
+    print("\n📊 Backtest error by horizon:")
+    print(comparison.round(3).to_string())
@@ -0,0 +1,92 @@
+# utils/branches.py
+# Branch (outlet) registry and per-branch path resolution
+#
+# Each branch is resolved by key to its own partition of data, models and outputs:
+#   dataset/branches/branches.csv                  branch_id,location_id[,name]
+#   dataset/branches/{branch_id}/salesdaily.csv    sales history
+#   saved_models/{branch_id}/                      branch models (falls back to saved_models/)
+#   forecasts/{branch_id}/                         forecast outputs
+# Weather is looked up by the branch's location_id.
+#
+# Training (FORECAST_BRANCH resolves the sales, weather location and model directory):
+#   FORECAST_BRANCH=B001 python train_model_saperately.py
+
+import csv
+import os
+
+from utils.weather import DEFAULT_WEATHER_DIR, weather_store_path
+
+DEFAULT_BRANCH_ROOT = "dataset/branches"
+DEFAULT_REGISTRY = os.path.join(DEFAULT_BRANCH_ROOT, "branches.csv")
+DEFAULT_LOCATION_ID = "St001"
+
+
+def branch_from_env():
+    """Branch trained by the module-level training scripts (FORECAST_BRANCH; unset trains the shared models)"""
+    return os.environ.get("FORECAST_BRANCH", "").strip() or None
+
+
+def iter_branches(registry_path=DEFAULT_REGISTRY, branch_root=DEFAULT_BRANCH_ROOT):
+    """
+    Lazily yield the registered branches. Without a registry file, every
+    directory under branch_root holding a salesdaily.csv is a branch.
+
+    Args:
+        registry_path (str): Path to the branch registry CSV
+        branch_root (str): Directory holding one sub-directory per branch
+
+    Yields:
+        dict: Branch with 'branch_id' and 'location_id'
+    """
+    if os.path.exists(registry_path):
+        with open(registry_path, newline='') as f:
+            for row in csv.DictReader(f):
+                branch_id = (row.get('branch_id') or '').strip()
+                if branch_id:
+                    yield {
+                        'branch_id': branch_id,
+                        'location_id': (row.get('location_id') or DEFAULT_LOCATION_ID).strip()
+                    }
+    elif os.path.isdir(branch_root):
+        for entry in sorted(os.scandir(branch_root), key=lambda e: e.name):
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, "salesdaily.csv")):
+                yield {'branch_id': entry.name, 'location_id': DEFAULT_LOCATION_ID}
+
+
+def get_branch(branch_id, registry_path=DEFAULT_REGISTRY, branch_root=DEFAULT_BRANCH_ROOT):
+    """Look up a single branch; unregistered branches use the default location"""
+    for branch in iter_branches(registry_path, branch_root):
+        if branch['branch_id'] == branch_id:
+            return branch
+    return {'branch_id': branch_id, 'location_id': DEFAULT_LOCATION_ID}
+
+
+def branch_config(branch_id, config=None, registry_path=DEFAULT_REGISTRY, branch_root=DEFAULT_BRANCH_ROOT,
+                  model_root="saved_models", output_root="forecasts", weather_dir=DEFAULT_WEATHER_DIR):
+    """
+    Build a MultiHorizonForecast configuration for a branch. Keys already set
+    in config take precedence over the resolved branch paths.
+
+    Args:
+        branch_id (str): Branch key
+        config (dict, optional): Base configuration
+        registry_path (str): Path to the branch registry CSV
+        branch_root (str): Directory holding one sub-directory per branch
+        model_root (str): Shared model directory; branch models live in a sub-directory
+        output_root (str): Forecast output root; branch outputs live in a sub-directory
+        weather_dir (str): Directory holding the per-location weather stores
+
+    Returns:
+        dict: Configuration dictionary
+    """
+    branch = get_branch(branch_id, registry_path, branch_root)
+    cfg = {key: value for key, value in (config or {}).items() if value is not None}
+
+    cfg.setdefault('DATA_PATH', os.path.join(branch_root, branch_id, "salesdaily.csv"))
+    cfg.setdefault('MODEL_DIR', os.path.join(model_root, branch_id))
+    cfg.setdefault('FALLBACK_MODEL_DIR', model_root)
+    cfg.setdefault('OUTPUT_PATH', os.path.join(output_root, branch_id))
+    cfg.setdefault('LOCATION_ID', branch['location_id'])
+    cfg.setdefault('WEATHER_PATH', weather_store_path(cfg['LOCATION_ID'], weather_dir))
+    cfg['BRANCH_ID'] = branch_id
+    return cfg
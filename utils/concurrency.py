@@ -0,0 +1,213 @@
+# utils/concurrency.py
+# Thread and process budgets for training and forecasting
+# One CPU budget is split between the hyperparameter search's worker
+# processes and the threads of each estimator fit, so that nested parallelism
+# never runs more threads than CPUs:
+#   FORECAST_CPUS           CPU budget (default: LOKY_MAX_CPU_COUNT as set by the
+#                           job scheduler, else every CPU)
+#   FORECAST_DETERMINISTIC  on unless 0: every fit and prediction is single-threaded
+#                           and the parallelism comes only from the search's
+#                           worker processes, so a given seed gives bit-identical
+#                           models for any CPU budget. Off, the spare CPUs become
+#                           estimator threads (faster when the budget is larger
+#                           than the search's parallel fits, but multi-threaded
+#                           reductions may differ in the last bits).
+#   FORECAST_SEED           seed of the splits, estimators and searches (default 42)
+# BLAS/OpenMP pools (threadpoolctl), XGBoost and scikit-learn n_jobs, joblib
+# worker processes and the thread variables inherited by subprocesses are all
+# set from the same plan.
+#
+# Usage (from the project root, search throughput and output hash per configuration):
+#   python -m utils.concurrency --drug N02BE --model RandomForest --cpus 1,2,4
+#   python -m utils.concurrency --drug N02BE --model XGBoost --cpus 1,4 --n-iter 6
+
+import argparse
+import contextlib
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SEED = 42
+
+# Fits the search runs at once: one candidate point x 3 cross-validation folds.
+# Fixed, because the number of candidates per iteration changes the search path.
+SEARCH_POINTS = 1
+SEARCH_FOLDS = 3
+
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, default).lower() not in ("0", "false", "no")
+
+
+def cpu_budget():
+    """CPU budget of this process (FORECAST_CPUS, else the job scheduler's LOKY_MAX_CPU_COUNT, else all CPUs)"""
+    for name in ("FORECAST_CPUS", "LOKY_MAX_CPU_COUNT"):
+        value = os.environ.get(name)
+        if value and value.isdigit() and int(value) > 0:
+            return int(value)
+    return os.cpu_count() or 1
+
+
+def deterministic_from_env():
+    """Deterministic mode switch (on unless FORECAST_DETERMINISTIC=0)"""
+    return _env_flag("FORECAST_DETERMINISTIC", "1")
+
+
+def seed_from_env():
+    """Random seed of training runs (FORECAST_SEED, default 42)"""
+    return int(os.environ.get("FORECAST_SEED", DEFAULT_SEED))
+
+
+def parallelism_plan(cpus=None, deterministic=None, parallel_tasks=SEARCH_POINTS * SEARCH_FOLDS):
+    """
+    Split a CPU budget between parallel tasks and the threads of each task.
+
+    Args:
+        cpus (int, optional): CPU budget. Defaults to cpu_budget().
+        deterministic (bool, optional): Single-threaded tasks. Defaults to deterministic_from_env().
+        parallel_tasks (int): Tasks that can run at once (fits of one search iteration)
+
+    Returns:
+        dict: cpus, deterministic, search_jobs (worker processes) and
+            estimator_threads (threads per fit or prediction)
+    """
+    cpus = max(1, cpus or cpu_budget())
+    deterministic = deterministic_from_env() if deterministic is None else deterministic
+    search_jobs = max(1, min(cpus, parallel_tasks))
+    return {
+        'cpus': cpus,
+        'deterministic': deterministic,
+        'search_jobs': search_jobs,
+        'estimator_threads': 1 if deterministic else max(1, cpus // search_jobs),
+    }
+
+
+def apply_parallelism(plan):
+    """
+    Limit the BLAS/OpenMP pools of this process to the plan's estimator threads and
+    export the same limits to subprocesses.
+
+    Args:
+        plan (dict): Plan from parallelism_plan
+    """
+    threads = str(plan['estimator_threads'])
+    for name in THREAD_VARIABLES:
+        os.environ[name] = threads
+    # joblib's n_jobs=-1 follows the budget as well
+    os.environ['LOKY_MAX_CPU_COUNT'] = str(plan['cpus'])
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=plan['estimator_threads'])
+    except ImportError:
+        pass
+
+
+def search_context(plan):
+    """
+    Context in which a search's worker processes get the plan's thread limit.
+
+    Args:
+        plan (dict): Plan from parallelism_plan
+
+    Returns:
+        context manager
+    """
+    try:
+        from joblib import parallel_config
+    except ImportError:
+        return contextlib.nullcontext()
+    return parallel_config(backend='loky', inner_max_num_threads=plan['estimator_threads'])
+
+
+def set_estimator_threads(model, threads):
+    """
+    Set the thread count of an estimator that has one (n_jobs of scikit-learn and XGBoost models).
+
+    Args:
+        model: Estimator (changed in place)
+        threads (int): Threads per fit or prediction
+
+    Returns:
+        The estimator
+    """
+    if hasattr(model, 'get_params') and 'n_jobs' in model.get_params(deep=False):
+        model.set_params(n_jobs=threads)
+    return model
+
+
+def output_hash(predictions):
+    """Short hash of a prediction array, identical only for bit-identical predictions"""
+    return hashlib.sha1(np.ascontiguousarray(predictions, dtype=np.float64).tobytes()).hexdigest()[:12]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure search throughput and output stability per '
+                                                 'concurrency configuration')
+    parser.add_argument('--drug', type=str, default='N02BE', help='Drug to tune')
+    parser.add_argument('--model', type=str, choices=['RandomForest', 'XGBoost', 'KNN'], default='RandomForest')
+    parser.add_argument('--cpus', type=str, default=str(os.cpu_count() or 1),
+                        help='Comma-separated CPU budgets to compare')
+    parser.add_argument('--n-iter', type=int, default=5, help='Search iterations')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Random seed')
+    parser.add_argument('--output', type=str, help='Write the results to this CSV')
+    args = parser.parse_args()
+
+    import xgboost as xgb
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import make_scorer
+    from sklearn.neighbors import KNeighborsRegressor
+    from skopt import BayesSearchCV
+    from skopt.space import Integer, Real
+
+    from multi_horizon_forecast import MultiHorizonForecast
+
+    forecaster = MultiHorizonForecast({'DRUG_COLUMNS': [args.drug], 'WRITE_CUBES': False})
+    X, y = forecaster.history_features(args.drug, forecaster.prepare_feature_names(args.drug))
+    split = int(len(X) * 0.8)
+    X_train, y_train, X_test = X.iloc[:split], y.iloc[:split], X.iloc[split:]
+
+    def make_search(plan):
+        if args.model == 'RandomForest':
+            model = RandomForestRegressor(random_state=args.seed)
+            space = {'n_estimators': Integer(50, 300), 'max_depth': Integer(3, 20)}
+        elif args.model == 'XGBoost':
+            model = xgb.XGBRegressor(random_state=args.seed)
+            space = {'n_estimators': Integer(50, 300), 'max_depth': Integer(3, 10),
+                     'learning_rate': Real(0.01, 0.3, prior='log-uniform')}
+        else:
+            model = KNeighborsRegressor()
+            space = {'n_neighbors': Integer(3, 20), 'p': Integer(1, 2)}
+        set_estimator_threads(model, plan['estimator_threads'])
+        scorer = make_scorer(lambda t, p: np.sqrt(np.mean((t - p) ** 2)), greater_is_better=False)
+        return BayesSearchCV(model, space, n_iter=args.n_iter, cv=SEARCH_FOLDS, n_points=SEARCH_POINTS,
+                             scoring=scorer, random_state=args.seed, n_jobs=plan['search_jobs'])
+
+    rows = []
+    for deterministic in (True, False):
+        for cpus in [int(value) for value in args.cpus.split(',')]:
+            plan = parallelism_plan(cpus, deterministic)
+            apply_parallelism(plan)
+            search = make_search(plan)
+            start = time.perf_counter()
+            with search_context(plan):
+                search.fit(X_train, y_train)
+            seconds = time.perf_counter() - start
+            fits = args.n_iter * SEARCH_FOLDS + 1
+            rows.append({**plan, 'seconds': seconds, 'fits_per_s': fits / seconds,
+                         'best_params': str(dict(search.best_params_)),
+                         'output_hash': output_hash(search.best_estimator_.predict(X_test))})
+            print(f"⏱️ {cpus} CPUs, deterministic={deterministic}: {seconds:.2f} s, hash {rows[-1]['output_hash']}")
+
+    results = pd.DataFrame(rows)
+    print(results.drop(columns=['best_params']).round(3).to_string(index=False))
+    stable = results[results['deterministic']]['output_hash'].nunique() == 1
+    print(f"{'✅' if stable else '❌'} Deterministic outputs "
+          f"{'identical' if stable else 'differ'} across {results['deterministic'].sum()} CPU budgets")
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"📁 Results saved to {args.output}")
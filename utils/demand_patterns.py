@@ -0,0 +1,262 @@
+# utils/demand_patterns.py
+# Demand pattern classification and the sparse-demand fast path
+# Every drug is classified over its trailing year by the Syntetos-Boylan
+# scheme, from the average interval between demand days (ADI) and the squared
+# coefficient of variation of the demand sizes (CV2):
+#   smooth        ADI < 1.32, CV2 < 0.49
+#   erratic       ADI < 1.32, CV2 >= 0.49
+#   intermittent  ADI >= 1.32, CV2 < 0.49
+#   lumpy         ADI >= 1.32, CV2 >= 0.49
+# Intermittent and lumpy drugs are sparse: a tuned forest mostly learns to
+# predict the zero days, and MAPE, which skips them, is unstable. Sparse drugs
+# are forecast with the vectorized Croston / TSB estimators of
+# utils/baseline_models.py instead (all of them in one pass), and are scored
+# with MASE (MAE relative to the one-day naive forecast) and relative bias.
+#
+# Training:  python train_model_saperately.py   (FORECAST_SPARSE_METHOD=none trains every drug)
+# Forecast:  python main.py daily --days 30     (sparse drugs follow the training run's demand_patterns.csv;
+#            --sparse-method tsb|croston overrides it, --sparse-method none uses their models)
+#
+# Usage (from the project root, classification of the sales history):
+#   python -m utils.demand_patterns
+#   python -m utils.demand_patterns --data dataset/sales_long.csv --output demand_patterns.csv
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+PATTERNS = ['smooth', 'erratic', 'intermittent', 'lumpy']
+
+# Patterns forecast by the sparse estimators
+SPARSE_PATTERNS = ['intermittent', 'lumpy']
+
+SPARSE_METHODS = ['croston', 'tsb']
+DEFAULT_SPARSE_METHOD = 'tsb'
+
+# Syntetos-Boylan cut-offs
+ADI_CUTOFF = 1.32
+CV2_CUTOFF = 0.49
+
+# Trailing days of history the classification is computed on
+CLASSIFY_DAYS = 365
+
+PATTERN_FILE = "demand_patterns.csv"
+PATTERN_COLUMNS = ['Drug', 'Pattern', 'ADI', 'CV2', 'Demand_Days', 'Mean_Demand']
+# The training run's file adds the estimator each sparse drug was scored with (empty for the others)
+METHOD_COLUMN = 'Sparse_Method'
+
+# Training model name of each sparse estimator (the forecaster model type is the lower-case name)
+SPARSE_MODEL_NAMES = {'croston': 'Croston', 'tsb': 'TSB'}
+
+
+def sparse_method_from_env():
+    """Sparse estimator of the module-level training scripts (FORECAST_SPARSE_METHOD, default tsb; none disables)"""
+    method = os.environ.get("FORECAST_SPARSE_METHOD", DEFAULT_SPARSE_METHOD).lower()
+    return None if method in ("none", "0", "false", "no") else method
+
+
+def classify_demand(values, drugs, window_days=CLASSIFY_DAYS):
+    """
+    Classify every drug series at once.
+
+    Args:
+        values (ndarray): Sales history, shape (days, drugs)
+        drugs (list): Drug code of each column
+        window_days (int, optional): Trailing days classified. None uses the whole history.
+
+    Returns:
+        DataFrame: PATTERN_COLUMNS, one row per drug. Drugs without any demand are
+            'intermittent' with an infinite ADI.
+    """
+    values = np.asarray(values, dtype=float)
+    if window_days:
+        values = values[-window_days:]
+    observed = ~np.isnan(values)
+    demand = np.where(observed, values, 0)
+    is_demand = demand > 0
+    demand_days = is_demand.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        adi = observed.sum(axis=0) / demand_days
+        # Mean and variance of the sizes on demand days only
+        size_mean = demand.sum(axis=0) / demand_days
+        size_var = (np.where(is_demand, demand - size_mean, 0) ** 2).sum(axis=0) / demand_days
+        cv2 = np.nan_to_num(size_var / size_mean ** 2)
+        mean_demand = demand.sum(axis=0) / observed.sum(axis=0)
+
+    sparse = ~(adi < ADI_CUTOFF)
+    variable = cv2 >= CV2_CUTOFF
+    pattern = np.where(sparse, np.where(variable, 'lumpy', 'intermittent'),
+                       np.where(variable, 'erratic', 'smooth'))
+    return pd.DataFrame({
+        'Drug': list(drugs),
+        'Pattern': pattern,
+        'ADI': adi,
+        'CV2': cv2,
+        'Demand_Days': demand_days,
+        'Mean_Demand': np.nan_to_num(mean_demand),
+    })[PATTERN_COLUMNS]
+
+
+def with_sparse_methods(patterns, method):
+    """Classification with the METHOD_COLUMN of a training run that scores its sparse drugs with `method`"""
+    patterns = patterns.copy()
+    patterns[METHOD_COLUMN] = np.where(patterns['Drug'].isin(sparse_drugs(patterns)), method or '', '')
+    return patterns
+
+
+def trained_sparse_methods(*model_dirs):
+    """
+    Sparse estimator of each drug the last training run scored with one, read from
+    the demand_patterns.csv of the first model directory that has one.
+
+    Args:
+        *model_dirs (str): Model directories in order of preference (None entries are skipped)
+
+    Returns:
+        dict: Drug -> 'croston' or 'tsb'; empty if no file is found
+    """
+    for model_dir in model_dirs:
+        path = os.path.join(model_dir, PATTERN_FILE) if model_dir else None
+        if path and os.path.exists(path):
+            patterns = pd.read_csv(path, dtype={'Drug': str})
+            if METHOD_COLUMN not in patterns.columns:
+                return {}
+            trained = patterns[patterns[METHOD_COLUMN].isin(SPARSE_METHODS)]
+            return dict(zip(trained['Drug'], trained[METHOD_COLUMN]))
+    return {}
+
+
+def sparse_drugs(patterns):
+    """Drugs of a classification whose pattern is in SPARSE_PATTERNS"""
+    return patterns.loc[patterns['Pattern'].isin(SPARSE_PATTERNS), 'Drug'].tolist()
+
+
+def naive_scale(series):
+    """Mean absolute one-day change of a series, the MASE denominator (NaN if the series never changes)"""
+    changes = np.abs(np.diff(np.asarray(series, dtype=float)))
+    changes = changes[~np.isnan(changes)]
+    scale = changes.mean() if len(changes) else np.nan
+    return scale if scale > 0 else np.nan
+
+
+def demand_metrics(y_true, y_pred, scale):
+    """
+    Error measures that stay defined on zero-demand days.
+
+    Args:
+        y_true, y_pred: Actual and predicted sales
+        scale (float): MASE denominator from naive_scale
+
+    Returns:
+        dict: MASE (MAE / scale) and Bias ((total predicted - total actual) / total actual)
+    """
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    total = y_true.sum()
+    return {
+        'MASE': float(np.mean(np.abs(y_true - y_pred)) / scale) if scale == scale else np.nan,
+        'Bias': float((y_pred.sum() - total) / total) if total > 0 else np.nan,
+    }
+
+
+def one_step_forecasts(method, values, dates, rows):
+    """
+    One-day-ahead sparse estimator forecasts of history rows, each from the rows before it.
+
+    Args:
+        method (str): 'croston' or 'tsb'
+        values (ndarray): Sales history of one or more drugs, shape (days, drugs)
+        dates (array-like): Date of each history row
+        rows (ndarray): Row positions to forecast
+
+    Returns:
+        tuple: (forecasts with shape (rows, drugs), seconds per forecast origin)
+    """
+    from utils.baseline_models import baseline_forecast
+
+    dates = pd.DatetimeIndex(dates)
+    rows = np.asarray(rows, dtype=int)
+    start = time.perf_counter()
+    forecasts = baseline_forecast(method, values, dates, rows, dates.values[rows][:, None])[:, 0, :]
+    seconds = (time.perf_counter() - start) / max(len(rows), 1)
+    return forecasts, seconds
+
+
+def evaluate_sparse(method, history, drug, splits):
+    """
+    Score a sparse estimator on the training scripts' splits instead of searching models.
+
+    Every row is forecast one day ahead from the rows before it, as the
+    one-step models are evaluated, in one vectorized pass.
+
+    Args:
+        method (str): 'croston' or 'tsb'
+        history (DataFrame): 'datum' and drug columns, one row per consecutive day,
+            with the row positions as its index
+        drug (str): Drug code
+        splits (dict): Set name ('Train', 'Validation', 'Test') -> row index of the set
+
+    Returns:
+        tuple: (result rows in the training results layout, residual frames)
+    """
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    values = history[[drug]].to_numpy(dtype=float)
+    scale = naive_scale(values[:, 0])
+    model_name = SPARSE_MODEL_NAMES[method]
+    rows, residuals = [], []
+    for set_name, index in splits.items():
+        index = np.sort(np.asarray(index))
+        predictions, seconds = one_step_forecasts(method, values, history['datum'].values, index)
+        actual = values[index, 0]
+        predictions = predictions[:, 0]
+        rows.append({
+            'Drug': drug,
+            'Model': model_name,
+            'Set': set_name,
+            'RMSE': float(np.sqrt(mean_squared_error(actual, predictions))),
+            'MAE': mean_absolute_error(actual, predictions),
+            # MAPE skips the zero-demand days that make up most of a sparse series
+            'MAPE': np.nan,
+            **demand_metrics(actual, predictions, scale),
+            'R2': r2_score(actual, predictions),
+            'Samples': len(index),
+            'Best Params': {},
+            'Warm Start': 'none',
+            'Search Seconds': 0.0,
+            'Latency (ms)': seconds * 1000,
+            'Model File': '',
+        })
+        residuals.append(pd.DataFrame({
+            'Date': history['datum'].values[index],
+            'Drug': drug,
+            'Model': model_name,
+            'Actual_Sales': actual,
+            'Predicted_Sales': predictions,
+            'Set': set_name,
+        }))
+    return rows, residuals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Classify the demand pattern of every drug')
+    parser.add_argument('--data', type=str, default="dataset/salesdaily.csv", help='Sales history CSV (wide or long)')
+    parser.add_argument('--days', type=int, default=CLASSIFY_DAYS, help='Trailing days classified')
+    parser.add_argument('--output', type=str, help='Write the classification to this CSV')
+    args = parser.parse_args()
+
+    from utils.sales_data import read_sales_history, sales_drug_columns
+
+    history = read_sales_history(args.data)
+    drugs = sales_drug_columns(history)
+    patterns = classify_demand(history[drugs].to_numpy(dtype=float), drugs, args.days)
+    print(patterns.round(3).to_string(index=False))
+    counts = patterns['Pattern'].value_counts().reindex(PATTERNS, fill_value=0)
+    print(f"\n📊 {', '.join(f'{pattern}: {count}' for pattern, count in counts.items())}")
+    print(f"⚡ {len(sparse_drugs(patterns))} of {len(drugs)} drugs take the sparse fast path")
+    if args.output:
+        patterns.to_csv(args.output, index=False)
+        print(f"📁 Classification saved to {args.output}")
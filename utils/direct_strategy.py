@@ -0,0 +1,200 @@
+# utils/direct_strategy.py
+# Direct multi-horizon strategy
+# The recursive forecaster feeds each prediction back in as the next day's
+# lags, so a horizon is predicted one step at a time and errors compound. A
+# direct model predicts the sales h days after the forecast origin from
+# features known at the origin: the lags as of the origin, the calendar and
+# weather of the target date, and the horizon h itself. One
+# horizon-conditioned model per drug covers every horizon, so all steps of all
+# origins are predicted in a single call.
+#
+# Training:   FORECAST_STRATEGY=direct python train_model_saperately.py
+# Forecasting: python main.py daily --strategy direct
+#
+# Usage (from the project root, backtest of both strategies on the sales history):
+#   python -m utils.direct_strategy --origin-start 2019-06-01 --origin-end 2019-08-31 --days 14
+#   python -m utils.direct_strategy --origin-start 2019-06-01 --origin-end 2019-08-31 --model-type xgboost --drugs N02BE
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+STRATEGIES = ['recursive', 'direct']
+
+# Horizons (days after the origin) sampled into the training frame. Horizons in
+# between share the splits the model learns around them; longer horizons are
+# predicted as MAX_HORIZON.
+TRAINING_HORIZONS = (1, 2, 3, 4, 5, 6, 7, 10, 14, 21, 28)
+MAX_HORIZON = TRAINING_HORIZONS[-1]
+
+# Forecaster model types and the training model names their direct files use
+DIRECT_MODEL_PREFIXES = {'rf': 'randomforest', 'xgboost': 'xgboost', 'knn': 'knn'}
+
+
+def lag_feature_names(drug):
+    """Lag features of a drug, in training order"""
+    return [f'{drug}_lag1', f'{drug}_lag2', f'{drug}_lag3', f'{drug}_lag7',
+            f'{drug}_roll3_mean', f'{drug}_roll7_mean']
+
+
+def direct_model_filename(model_name, drug):
+    """
+    File name of a direct model.
+
+    Args:
+        model_name (str): Forecaster model type ('rf', 'xgboost', 'knn') or
+            training model name ('RandomForest', 'XGBoost', 'KNN')
+        drug (str): Drug code
+
+    Returns:
+        str: e.g. randomforest_direct_model_N02BE.pkl
+    """
+    prefix = DIRECT_MODEL_PREFIXES.get(model_name, model_name.lower())
+    return f"{prefix}_direct_model_{drug}.pkl"
+
+
+def direct_training_frame(df_model, drug, horizons=TRAINING_HORIZONS):
+    """
+    Expand a recursive training frame into one row per (origin, horizon).
+
+    A row for horizon h keeps the target, calendar and weather of its own date
+    and takes the lag features of the date h - 1 rows earlier, i.e. the lags as
+    of the origin. Horizon 1 rows are the recursive training rows.
+
+    Args:
+        df_model (DataFrame): Consecutive daily rows of one drug with the target,
+            calendar, weather and lag features (as built by the training scripts)
+        drug (str): Drug code
+        horizons (tuple): Horizons to sample
+
+    Returns:
+        DataFrame: Rows of every horizon with an extra 'Horizon' column, fresh index
+    """
+    lag_cols = lag_feature_names(drug)
+    frames = []
+    for horizon in horizons:
+        frame = df_model.assign(Horizon=horizon)
+        frame[lag_cols] = df_model[lag_cols].shift(horizon - 1)
+        frames.append(frame.dropna(subset=lag_cols))
+    return pd.concat(frames, ignore_index=True)
+
+
+def split_by_target_date(frame, test_size, random_state):
+    """
+    train_test_split of a direct training frame by target date. The horizon
+    rows of a date share its target, so all of them go to the same set. The
+    dates are drawn as train_test_split draws the rows of a recursive frame of
+    the same dates, so both strategies are scored on the same test dates.
+
+    Args:
+        frame (DataFrame): Frame from direct_training_frame, with 'datum'
+        test_size (float): Share of the dates in the second set
+        random_state (int): Seed of the split
+
+    Returns:
+        tuple: (first index, second index); rows of a date are adjacent and the
+            dates follow the shuffled order, so unshuffled CV folds stay grouped by date
+    """
+    dates = frame['datum'].unique()
+    split = []
+    for part in train_test_split(dates, test_size=test_size, random_state=random_state):
+        rows = frame[frame['datum'].isin(part)]
+        rank = pd.Series(np.arange(len(part)), index=part)
+        split.append(rows.index[np.argsort(rows['datum'].map(rank).to_numpy(), kind='stable')])
+    return tuple(split)
+
+
+def horizon_feature(n_steps, n_origins=1):
+    """Horizon column for origin-major (origin, step) rows, capped at MAX_HORIZON"""
+    return np.tile(np.minimum(np.arange(1, n_steps + 1), MAX_HORIZON), n_origins)
+
+
+def backtest(forecaster, origins, num_days):
+    """
+    Forecast from every origin with one strategy.
+
+    Args:
+        forecaster (MultiHorizonForecast): Forecaster with the strategy to test
+        origins (DatetimeIndex): Forecast origins inside the history
+        num_days (int): Days forecast from each origin
+
+    Returns:
+        tuple: (seconds, long-format forecast DataFrame)
+    """
+    start = time.perf_counter()
+    forecast_df = forecaster.generate_multi_origin_forecast(origins, num_days)
+    seconds = time.perf_counter() - start
+    if forecast_df is None:
+        raise ValueError(f"The {forecaster.strategy} strategy produced no forecasts: no "
+                         f"{forecaster.model_type} model files for these drugs in {forecaster.model_dir}")
+    return seconds, forecast_df
+
+
+def score_backtest(forecaster, forecast_df, drugs):
+    """
+    Score backtest forecasts of some drugs against the history.
+
+    Args:
+        forecaster (MultiHorizonForecast): Forecaster holding the sales history
+        forecast_df (DataFrame): Forecasts from backtest()
+        drugs (list): Drugs to score
+
+    Returns:
+        DataFrame: MAE and RMSE per horizon
+    """
+    actuals = forecaster.df.melt(id_vars='datum', value_vars=list(drugs),
+                                 var_name='Drug', value_name='Actual_Sales')
+    scored = forecast_df[forecast_df['Drug'].isin(drugs)].merge(
+        actuals, left_on=['Date', 'Drug'], right_on=['datum', 'Drug'])
+    error = scored['Actual_Sales'] - scored['Predicted_Sales']
+    return scored.assign(abs_error=error.abs(), sq_error=error ** 2).groupby('Horizon').agg(
+        MAE=('abs_error', 'mean'), RMSE=('sq_error', lambda values: np.sqrt(values.mean())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Backtest the recursive and direct strategies')
+    parser.add_argument('--origin-start', type=str, required=True, help='First forecast origin (YYYY-MM-DD)')
+    parser.add_argument('--origin-end', type=str, required=True, help='Last forecast origin (YYYY-MM-DD)')
+    parser.add_argument('--days', type=int, default=14, help='Days forecast from each origin')
+    parser.add_argument('--model-type', type=str, choices=['rf', 'knn', 'xgboost'], default='rf')
+    parser.add_argument('--models', type=str, default="saved_models", help='Model directory')
+    parser.add_argument('--drugs', type=str, help='Comma-separated drug codes (default: all)')
+    parser.add_argument('--output', type=str, default="forecasts/backtest", help='Output directory')
+    args = parser.parse_args()
+
+    from multi_horizon_forecast import MultiHorizonForecast
+
+    origins = pd.date_range(args.origin_start, args.origin_end, freq='D')
+    # Only model forecasts are compared: drugs without a model file of a strategy are
+    # skipped instead of getting a baseline, and sparse drugs are not routed to Croston/TSB
+    config = {'MODEL_TYPE': args.model_type, 'MODEL_DIR': args.models, 'OUTPUT_PATH': args.output,
+              'WRITE_CUBES': False, 'FALLBACK_BASELINE': 'none', 'SPARSE_METHOD': 'none'}
+    if args.drugs:
+        config['DRUG_COLUMNS'] = args.drugs.split(',')
+    results, forecasters = {}, {}
+    for strategy in STRATEGIES:
+        forecasters[strategy] = MultiHorizonForecast(dict(config, STRATEGY=strategy))
+        try:
+            results[strategy] = backtest(forecasters[strategy], origins, args.days)
+        except ValueError as error:
+            parser.error(str(error))
+
+    # Drugs modelled by both strategies, in the forecaster's order
+    modelled = [set(forecast_df['Drug']) for _, forecast_df in results.values()]
+    drugs = [drug for drug in forecasters['recursive'].drug_columns if all(drug in found for found in modelled)]
+    if not drugs:
+        parser.error("No drug has both recursive and direct models; train with FORECAST_STRATEGY=direct as well")
+    skipped = sorted(set.union(*modelled) - set(drugs))
+    if skipped:
+        print(f"⚠️ Not scored (modelled by one strategy only): {', '.join(skipped)}")
+
+    print(f"\n⏱️ {len(origins)} origins x {args.days} days:")
+    for strategy, (seconds, _) in results.items():
+        print(f"   {strategy}: {seconds:.2f} s")
+    comparison = pd.concat({strategy: score_backtest(forecasters[strategy], forecast_df, drugs)
+                            for strategy, (_, forecast_df) in results.items()}, axis=1)
+    print(f"\n📊 Backtest error by horizon ({len(drugs)} drugs):")
+    print(comparison.round(3).to_string())
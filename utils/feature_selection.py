@@ -0,0 +1,198 @@
+# utils/feature_selection.py
+# Feature pruning of tuned tree models
+# Every model is trained on the full feature list, including the
+# Weekday_Name_* dummies that duplicate DayOfWeek. After the search, tree
+# models (RandomForest, XGBoost) are refitted with the same hyperparameters
+# on the features that matter: constant and redundant columns are dropped
+# first, then those with low importance in the refit. The compact model is
+# kept when its validation RMSE stays within a tolerance of the full model's;
+# its reduced schema is stored on the model (feature_schema_), and the
+# forecaster only builds the features listed there.
+#
+# Training:  python train_model_saperately.py   (FORECAST_PRUNE_FEATURES=0 keeps every feature)
+#
+# Usage (from the project root, reductions of the last training run):
+#   python -m utils.feature_selection
+#   python -m utils.feature_selection --results feature_pruning_results_no_weather.csv
+
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+# Refit features below this share of the total importance are dropped
+MIN_IMPORTANCE = 0.01
+
+# Validation RMSE the compact model may lose relative to the full one (0.02 = 2%)
+PRUNING_TOLERANCE = 0.02
+
+FEATURE_BUILD_REPEATS = 50
+
+REPORT_COLUMNS = ['Drug', 'Model', 'Pruned', 'Features_Full', 'Features', 'Validation_RMSE_Full',
+                  'Validation_RMSE', 'Size_KB_Full', 'Size_KB', 'Latency_ms_Full', 'Latency_ms',
+                  'Feature_Build_ms_Full', 'Feature_Build_ms', 'Dropped']
+
+
+def prune_features_from_env():
+    """Feature pruning switch for the module-level training scripts (on unless FORECAST_PRUNE_FEATURES=0)"""
+    return os.environ.get("FORECAST_PRUNE_FEATURES", "1").lower() not in ("0", "false", "no")
+
+
+def model_features(model, default=None):
+    """
+    Features a model predicts from, in order.
+
+    Args:
+        model: Fitted model
+        default (list, optional): Features of models that record none
+
+    Returns:
+        list: The reduced schema of pruned models, else the fitted column names, else the default
+    """
+    schema = getattr(model, 'feature_schema_', None)
+    if schema:
+        return list(schema['features'])
+    if hasattr(model, 'feature_names_in_'):
+        return model.feature_names_in_.tolist()
+    return default
+
+
+def redundant_features(X):
+    """
+    Features that carry no information of their own.
+
+    Args:
+        X (DataFrame): Training features
+
+    Returns:
+        dict: Feature -> reason it is dropped
+    """
+    dropped = {col: 'constant' for col in X.columns if X[col].nunique(dropna=False) <= 1}
+    if 'DayOfWeek' in X.columns and 'DayOfWeek' not in dropped:
+        dropped.update({col: 'duplicates DayOfWeek' for col in X.columns
+                        if col.startswith('Weekday_Name_') and col not in dropped})
+    return dropped
+
+
+def _rmse(y_true, y_pred):
+    return float(np.sqrt(np.mean((np.asarray(y_true) - y_pred) ** 2)))
+
+
+def _size_kb(model):
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1024
+
+
+def _feature_build_ms(X, features, repeats=FEATURE_BUILD_REPEATS):
+    """Median time to build a one-row feature frame the way the recursive forecaster does"""
+    row = X.iloc[0].to_dict()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        pd.DataFrame([{col: row.get(col, 0) for col in features}])
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def prune_features(model, X_train, y_train, X_val, y_val, min_importance=MIN_IMPORTANCE,
+                   tolerance=PRUNING_TOLERANCE):
+    """
+    Refit a tuned tree model on a reduced feature set.
+
+    Two candidate sets are tried, smallest first: without redundant and
+    low-importance features, and without redundant features only. The first
+    whose validation RMSE is within the tolerance of the full model is kept.
+
+    Args:
+        model: Fitted model with feature_importances_, trained on all of X_train's columns
+        X_train, y_train: Training data
+        X_val, y_val: Validation data the compact model is checked on
+        min_importance (float): Importance share below which a feature is dropped
+        tolerance (float): Relative validation RMSE the compact model may lose
+
+    Returns:
+        tuple: (model to save, report dict with the REPORT_COLUMNS measurements)
+    """
+    from sklearn.base import clone
+
+    from utils.model_routing import measure_latency_ms
+
+    full_features = list(X_train.columns)
+    full_rmse = _rmse(y_val, model.predict(X_val))
+
+    dropped = redundant_features(X_train)
+    candidates = []
+    kept = [col for col in full_features if col not in dropped]
+    if kept and len(kept) < len(full_features):
+        compact = clone(model).fit(X_train[kept], y_train)
+        candidates.append((compact, kept, dict(dropped)))
+        importance = pd.Series(compact.feature_importances_, index=kept)
+        importance = importance / importance.sum() if importance.sum() > 0 else importance
+        low = importance[importance < min_importance]
+        if 0 < len(low) < len(kept):
+            dropped.update({col: f'importance {share:.4f}' for col, share in low.items()})
+            kept = [col for col in kept if col not in low.index]
+            candidates.insert(0, (clone(model).fit(X_train[kept], y_train), kept, dict(dropped)))
+
+    chosen, features, chosen_dropped, chosen_rmse = model, full_features, {}, full_rmse
+    for compact, kept, dropped in candidates:
+        compact_rmse = _rmse(y_val, compact.predict(X_val[kept]))
+        if compact_rmse <= full_rmse * (1 + tolerance):
+            compact.feature_schema_ = {'features': kept, 'dropped': dropped}
+            chosen, features, chosen_dropped, chosen_rmse = compact, kept, dropped, compact_rmse
+            break
+
+    report = {
+        'Pruned': chosen is not model,
+        'Features_Full': len(full_features),
+        'Features': len(features),
+        'Validation_RMSE_Full': full_rmse,
+        'Validation_RMSE': chosen_rmse,
+        'Size_KB_Full': _size_kb(model),
+        'Size_KB': _size_kb(chosen),
+        'Latency_ms_Full': measure_latency_ms(model, X_val),
+        'Latency_ms': measure_latency_ms(chosen, X_val[features]),
+        'Feature_Build_ms_Full': _feature_build_ms(X_val, full_features),
+        'Feature_Build_ms': _feature_build_ms(X_val, features),
+        'Dropped': ';'.join(f'{col} ({reason})' for col, reason in chosen_dropped.items()),
+    }
+    return chosen, report
+
+
+def summarize(report_df):
+    """
+    Average reductions per model type.
+
+    Args:
+        report_df (DataFrame): Pruning report with the REPORT_COLUMNS
+
+    Returns:
+        DataFrame: One row per model type
+    """
+    summary = report_df.groupby('Model').agg(
+        Pruned=('Pruned', 'sum'), Models=('Pruned', 'size'),
+        Features_Full=('Features_Full', 'mean'), Features=('Features', 'mean'),
+        Size_KB_Full=('Size_KB_Full', 'mean'), Size_KB=('Size_KB', 'mean'),
+        Latency_ms_Full=('Latency_ms_Full', 'mean'), Latency_ms=('Latency_ms', 'mean'),
+        Feature_Build_ms_Full=('Feature_Build_ms_Full', 'mean'), Feature_Build_ms=('Feature_Build_ms', 'mean'))
+    summary['RMSE_Change_%'] = (report_df['Validation_RMSE'] / report_df['Validation_RMSE_Full'] - 1).groupby(
+        report_df['Model']).mean() * 100
+    return summary.round(3)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Show the feature pruning reductions of a training run')
+    parser.add_argument('--results', type=str, default="feature_pruning_results.csv",
+                        help='Pruning report written by the training script')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.results):
+        print(f"❌ No pruning report at {args.results}. Run train_model_saperately.py first.")
+    else:
+        report = pd.read_csv(args.results)
+        print(report[['Drug', 'Model', 'Features_Full', 'Features', 'Validation_RMSE_Full',
+                      'Validation_RMSE']].to_string(index=False))
+        print("\n📊 Average reductions:")
+        print(summarize(report).to_string())
@@ -0,0 +1,245 @@
+# utils/forecast_cubes.py
+# Pre-aggregated forecast cubes for the dashboard
+# Keeps drug x period cubes at day, month and year grain with actuals next to
+# forecasts, stored as Parquet sorted by (drug, period) so that range and
+# aggregation queries only read the matching row groups.
+#
+# Layout:
+#   forecasts/cubes/{model_type}/day.parquet
+#   forecasts/cubes/{model_type}/month.parquet
+#   forecasts/cubes/{model_type}/year.parquet
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+GRAINS = ['day', 'month', 'year']
+
+# Sorted data plus small row groups lets Parquet statistics prune by drug and period
+ROW_GROUP_ROWS = 16384
+
+CUBE_SCHEMA = pa.schema([
+    ('drug', pa.dictionary(pa.int32(), pa.string())),
+    ('period', pa.timestamp('ns')),
+    ('actual', pa.float32()),
+    ('forecast', pa.float32()),
+    ('actual_days', pa.int32()),
+    ('forecast_days', pa.int32()),
+])
+
+
+def _period_start(dates, grain):
+    if grain == 'month':
+        return dates.dt.to_period('M').dt.to_timestamp()
+    if grain == 'year':
+        return dates.dt.to_period('Y').dt.to_timestamp()
+    return dates
+
+
+# Rows are keyed by drug code * KEY_STRIDE + (day number + DAY_OFFSET), so that
+# merging and aggregating work on int64 arrays instead of string columns
+KEY_STRIDE = 1 << 32
+DAY_OFFSET = 1 << 31
+
+
+def _day_numbers(dates):
+    return pd.to_datetime(pd.Series(dates)).values.astype('datetime64[D]').astype(np.int64) + DAY_OFFSET
+
+
+def _keep_last(keys, values):
+    """Sorted unique keys with the value of each key's last occurrence"""
+    reversed_keys = keys[::-1]
+    unique_keys, first = np.unique(reversed_keys, return_index=True)
+    return unique_keys, values[::-1][first]
+
+
+def _union(a, b):
+    """Sorted union of two key arrays; a plain sort beats np.union1d's hashing on millions of keys"""
+    keys = np.concatenate([a, b])
+    keys.sort()
+    return keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if len(keys) else keys
+
+
+def _place(keys, row_keys, row_values):
+    column = np.full(len(keys), np.nan, dtype=np.float32)
+    column[np.searchsorted(keys, row_keys)] = row_values
+    return column
+
+
+def _cube_table(keys, categories, actual, forecast, actual_days, forecast_days):
+    """Arrow table of cube rows, built from the key arrays without a pandas round trip"""
+    codes = keys // KEY_STRIDE
+    days = keys - codes * KEY_STRIDE - DAY_OFFSET
+    return pa.table([
+        pa.DictionaryArray.from_arrays(codes.astype(np.int32), pa.array(categories, type=pa.string())),
+        days.astype('datetime64[D]').astype('datetime64[ns]'),
+        actual.astype(np.float32),
+        forecast.astype(np.float32),
+        actual_days.astype(np.int32),
+        forecast_days.astype(np.int32),
+    ], schema=CUBE_SCHEMA)
+
+
+def _roll_up(keys, actual, forecast, grain):
+    """Sum day rows into month or year rows; sums over no values stay empty"""
+    codes = keys // KEY_STRIDE
+    days = (keys - codes * KEY_STRIDE - DAY_OFFSET).astype('datetime64[D]')
+    unit = 'M' if grain == 'month' else 'Y'
+    period_days = days.astype(f'datetime64[{unit}]').astype('datetime64[D]').astype(np.int64) + DAY_OFFSET
+    group_keys, inverse = np.unique(codes * KEY_STRIDE + period_days, return_inverse=True)
+
+    sums = []
+    for values in (actual, forecast):
+        present = ~np.isnan(values)
+        total = np.bincount(inverse, weights=np.where(present, values, 0.0), minlength=len(group_keys))
+        count = np.bincount(inverse, weights=present, minlength=len(group_keys))
+        total[count == 0] = np.nan
+        sums.extend([total, count])
+    return group_keys, sums
+
+
+class ForecastCubeStore:
+    """
+    Columnar store of pre-aggregated forecast cubes, one set per model type.
+    """
+
+    def __init__(self, root="forecasts/cubes"):
+        """
+        Args:
+            root (str): Directory holding the cubes
+        """
+        self.root = root
+
+    def path(self, model_type, grain):
+        return os.path.join(self.root, model_type, f"{grain}.parquet")
+
+    def _write(self, table, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_ROWS)
+        os.replace(tmp_path, path)
+
+    def update(self, model_type, forecast_df, history_df, drug_columns):
+        """
+        Merge new daily forecasts into the day cube and rebuild the month and
+        year cubes from it. Forecasts for dates that were already in the cube
+        are replaced; actuals always come from the current history.
+
+        Args:
+            model_type (str): Model type the forecasts were produced with
+            forecast_df (DataFrame): Long format forecasts with Drug, Date, Predicted_Sales
+            history_df (DataFrame): Wide sales history with a 'datum' column
+            drug_columns (list): Drug columns of the history
+        """
+        day_path = self.path(model_type, 'day')
+
+        existing = None
+        if os.path.exists(day_path):
+            existing = pq.read_table(day_path, columns=['drug', 'period', 'actual', 'forecast']).to_pandas()
+
+        forecast_drugs = forecast_df['Drug'].astype(str).to_numpy()
+        history_drugs = [drug for drug in drug_columns if drug in history_df.columns]
+        known = set(history_drugs) | set(np.unique(forecast_drugs))
+        if existing is not None:
+            known |= set(existing['drug'].cat.categories)
+        categories = sorted(known)
+        code_of = {drug: code for code, drug in enumerate(categories)}
+
+        # Actuals from the current history
+        history_days = _day_numbers(history_df['datum'])
+        actual_keys = (np.repeat(np.array([code_of[drug] for drug in history_drugs], dtype=np.int64),
+                                 len(history_days)) * KEY_STRIDE + np.tile(history_days, len(history_drugs)))
+        actual_values = np.concatenate([history_df[drug].to_numpy(dtype=np.float32) for drug in history_drugs]) \
+            if history_drugs else np.array([], dtype=np.float32)
+
+        forecast_keys = np.array([code_of[drug] for drug in forecast_drugs], dtype=np.int64) * KEY_STRIDE + \
+            _day_numbers(forecast_df['Date'])
+        forecast_values = forecast_df['Predicted_Sales'].to_numpy(dtype=np.float32)
+
+        if existing is not None:
+            category_codes = np.array([code_of[drug] for drug in existing['drug'].cat.categories], dtype=np.int64)
+            existing_days = _day_numbers(existing['period'])
+            existing_keys = category_codes[existing['drug'].cat.codes.to_numpy()] * KEY_STRIDE + existing_days
+            existing_actual = existing['actual'].to_numpy(dtype=np.float32)
+            existing_forecast = existing['forecast'].to_numpy(dtype=np.float32)
+
+            # Actuals older than the loaded history (e.g. a trailing window) are kept
+            earlier = ~np.isnan(existing_actual)
+            if len(history_days):
+                earlier &= existing_days < history_days.min()
+            actual_keys = np.concatenate([existing_keys[earlier], actual_keys])
+            actual_values = np.concatenate([existing_actual[earlier], actual_values])
+
+            # New forecasts replace earlier ones for the same drug and date
+            forecasted = ~np.isnan(existing_forecast)
+            forecast_keys = np.concatenate([existing_keys[forecasted], forecast_keys])
+            forecast_values = np.concatenate([existing_forecast[forecasted], forecast_values])
+            del existing
+
+        actual_keys, actual_values = _keep_last(actual_keys, actual_values)
+        forecast_keys, forecast_values = _keep_last(forecast_keys, forecast_values)
+
+        # Sorted keys order rows by drug, then period
+        keys = _union(actual_keys, forecast_keys)
+        actual = _place(keys, actual_keys, actual_values)
+        forecast = _place(keys, forecast_keys, forecast_values)
+        self._write(_cube_table(keys, categories, actual, forecast, ~np.isnan(actual), ~np.isnan(forecast)),
+                    day_path)
+
+        for grain in ['month', 'year']:
+            group_keys, (actual_sum, actual_days, forecast_sum, forecast_days) = \
+                _roll_up(keys, actual, forecast, grain)
+            self._write(_cube_table(group_keys, categories, actual_sum, forecast_sum, actual_days, forecast_days),
+                        self.path(model_type, grain))
+
+    def query(self, model_type, grain='day', drugs=None, start=None, end=None):
+        """
+        Read a slice of a cube. Only row groups whose statistics overlap the
+        requested drugs and period range are read.
+
+        Args:
+            model_type (str): Model type of the cube
+            grain (str): 'day', 'month' or 'year'
+            drugs (list, optional): Drug codes to return. Defaults to all.
+            start (date-like, optional): First period (inclusive)
+            end (date-like, optional): Last period (inclusive)
+
+        Returns:
+            DataFrame: Columns drug, period, actual, forecast, actual_days, forecast_days
+        """
+        if grain not in GRAINS:
+            raise ValueError(f"Unsupported grain: {grain}")
+        path = self.path(model_type, grain)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=[field.name for field in CUBE_SCHEMA])
+
+        filters = []
+        if drugs:
+            filters.append(('drug', 'in', list(drugs)))
+        if start is not None:
+            filters.append(('period', '>=', _period_start(pd.Series([pd.Timestamp(start)]), grain).iloc[0]))
+        if end is not None:
+            filters.append(('period', '<=', pd.Timestamp(end)))
+
+        df = pq.read_table(path, filters=filters or None).to_pandas()
+        df['drug'] = df['drug'].astype(str)
+        return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Query pre-aggregated forecast cubes')
+    parser.add_argument('--cube-dir', type=str, default="forecasts/cubes", help='Directory holding the cubes')
+    parser.add_argument('--model-type', type=str, default='rf', help='Model type of the cube')
+    parser.add_argument('--grain', type=str, choices=GRAINS, default='month', help='Aggregation grain')
+    parser.add_argument('--drugs', type=str, help='Comma-separated drug codes')
+    parser.add_argument('--start', type=str, help='First period (YYYY-MM-DD)')
+    parser.add_argument('--end', type=str, help='Last period (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    store = ForecastCubeStore(args.cube_dir)
+    drugs = args.drugs.split(',') if args.drugs else None
+    print(store.query(args.model_type, args.grain, drugs, args.start, args.end).to_string(index=False))
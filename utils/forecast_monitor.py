@@ -0,0 +1,471 @@
+# utils/forecast_monitor.py
+# Forecast accuracy monitoring
+# Keeps a running join of issued forecasts to the actuals as they arrive.
+# Forecasts wait in a pending table until their date has an actual; each
+# (forecast, actual) pair is scored exactly once and folded into running
+# accuracy metrics per (model type, drug, horizon), so an update costs
+# O(new rows) instead of re-reading and re-merging the full history.
+#
+# Every metrics row keeps a frozen baseline MAE (its first BASELINE_SAMPLES
+# errors) and an exponentially weighted rolling MAE. A drug/model whose
+# rolling MAE exceeds DRIFT_RATIO x baseline on any horizon is flagged for
+# retraining in the drift flag file.
+#
+# Usage (from the project root):
+#   python -m utils.forecast_monitor                                   # ingest forecasts + new actuals
+#   python -m utils.forecast_monitor --fail-on-drift || python train_model_saperately.py
+#   python -m utils.forecast_monitor --reset-baseline N02BE,R06 --model-type rf   # after retraining
+
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS monitor_actuals (
+        drug VARCHAR(32) NOT NULL,
+        date DATE NOT NULL,
+        actual_sales REAL NOT NULL,
+        PRIMARY KEY (drug, date)
+    )""",
+    # Forecasts whose date has no actual yet
+    """CREATE TABLE IF NOT EXISTS monitor_pending (
+        model_type VARCHAR(16) NOT NULL,
+        drug VARCHAR(32) NOT NULL,
+        origin DATE NOT NULL,
+        date DATE NOT NULL,
+        horizon INTEGER NOT NULL,
+        predicted_sales REAL NOT NULL,
+        PRIMARY KEY (model_type, drug, origin, date)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_monitor_pending_date ON monitor_pending (drug, date)",
+    # Forecasts joined to their actual, for actual-vs-forecast dashboard views
+    """CREATE TABLE IF NOT EXISTS monitor_scored (
+        model_type VARCHAR(16) NOT NULL,
+        drug VARCHAR(32) NOT NULL,
+        origin DATE NOT NULL,
+        date DATE NOT NULL,
+        horizon INTEGER NOT NULL,
+        predicted_sales REAL NOT NULL,
+        actual_sales REAL NOT NULL,
+        PRIMARY KEY (model_type, drug, origin, date)
+    )""",
+    """CREATE TABLE IF NOT EXISTS monitor_metrics (
+        model_type VARCHAR(16) NOT NULL,
+        drug VARCHAR(32) NOT NULL,
+        horizon INTEGER NOT NULL,
+        n INTEGER NOT NULL,
+        sum_abs REAL NOT NULL,
+        sum_sq REAL NOT NULL,
+        sum_ape REAL NOT NULL,
+        n_ape INTEGER NOT NULL,
+        baseline_n INTEGER NOT NULL,
+        baseline_abs REAL NOT NULL,
+        rolling_n INTEGER NOT NULL,
+        rolling_mae REAL,
+        last_date DATE,
+        updated_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (model_type, drug, horizon)
+    )""",
+    """CREATE TABLE IF NOT EXISTS monitor_files (
+        path TEXT PRIMARY KEY,
+        mtime REAL NOT NULL
+    )""",
+]
+
+FORECAST_KEY = ['model_type', 'drug', 'origin', 'date']
+METRIC_KEY = ['model_type', 'drug', 'horizon']
+STATE_COLUMNS = ['n', 'sum_abs', 'sum_sq', 'sum_ape', 'n_ape', 'baseline_n', 'baseline_abs',
+                 'rolling_n', 'rolling_mae', 'last_date']
+
+# Errors of a metrics row that make up its baseline
+BASELINE_SAMPLES = 28
+
+# Span of the exponentially weighted rolling MAE (in scored forecasts)
+ROLLING_SPAN = 28
+
+# Rolling MAE relative to the baseline MAE above which a row is drifting
+DRIFT_RATIO = 1.5
+
+# Errors after the baseline before a row can be flagged
+MIN_DRIFT_SAMPLES = 7
+
+# Forecast files the monitor picks up from the forecast output directory
+FORECAST_FILE_PATTERN = re.compile(
+    r"^(?:daily_forecast_(?P<model>[a-z-]+)_(?P<start>\d{8})"
+    r"|multi_origin_forecast_(?P<mo_model>[a-z-]+)_\d{8}_\d{8})\.(?:csv|parquet)$")
+
+
+def _read_forecast_file(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+class ForecastMonitor:
+    """
+    SQLite store of the forecast/actual join and the accuracy metrics derived from it.
+    """
+
+    def __init__(self, path="forecasts/monitoring.db", baseline_samples=BASELINE_SAMPLES,
+                 rolling_span=ROLLING_SPAN, drift_ratio=DRIFT_RATIO):
+        """
+        Args:
+            path (str): SQLite database file
+            baseline_samples (int): Errors of a metrics row that make up its baseline
+            rolling_span (int): Span of the exponentially weighted rolling MAE
+            drift_ratio (float): Rolling / baseline MAE ratio above which a row is drifting
+        """
+        self.path = path
+        self.baseline_samples = baseline_samples
+        self.alpha = 2.0 / (rolling_span + 1)
+        self.drift_ratio = drift_ratio
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def register_forecasts(self, forecast_df, model_type, origin=None):
+        """
+        Add issued forecasts to the join. Forecasts for dates that already have
+        an actual are scored right away; forecasts that were already scored are
+        ignored, and re-issued pending forecasts replace the earlier ones.
+
+        Args:
+            forecast_df (DataFrame): Long forecasts with Drug, Date and Predicted_Sales
+                columns, plus Origin (and Horizon) for multi-origin forecasts
+            model_type (str): Model type the forecasts were produced with
+            origin (date-like, optional): Forecast origin when there is no Origin
+                column. Defaults to the first forecast date.
+
+        Returns:
+            int: Number of forecasts scored
+        """
+        if forecast_df is None or forecast_df.empty:
+            return 0
+        dates = pd.to_datetime(forecast_df['Date']).dt.normalize()
+        if 'Origin' in forecast_df.columns:
+            origins = pd.to_datetime(forecast_df['Origin']).dt.normalize()
+        else:
+            origins = pd.Series(pd.Timestamp(origin).normalize() if origin is not None else dates.min(),
+                                index=dates.index)
+        rows = pd.DataFrame({
+            'model_type': model_type,
+            'drug': forecast_df['Drug'].astype(str),
+            'origin': origins.dt.strftime('%Y-%m-%d'),
+            'date': dates.dt.strftime('%Y-%m-%d'),
+            'horizon': (dates - origins).dt.days + 1,
+            'predicted_sales': forecast_df['Predicted_Sales'].astype(float),
+        })
+        rows = rows[rows['horizon'] >= 1].drop_duplicates(FORECAST_KEY, keep='last')
+
+        columns = ', '.join(rows.columns)
+        self.conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS staging_forecasts AS "
+                          f"SELECT {columns} FROM monitor_pending WHERE 0")
+        self.conn.execute("DELETE FROM staging_forecasts")
+        self.conn.executemany(f"INSERT INTO staging_forecasts ({columns}) VALUES (?, ?, ?, ?, ?, ?)",
+                              rows.itertuples(index=False, name=None))
+        self.conn.execute(f"INSERT OR REPLACE INTO monitor_pending ({columns}) SELECT {columns} "
+                          f"FROM staging_forecasts s WHERE NOT EXISTS (SELECT 1 FROM monitor_scored c "
+                          f"WHERE c.model_type = s.model_type AND c.drug = s.drug "
+                          f"AND c.origin = s.origin AND c.date = s.date)")
+        self.conn.commit()
+        return self._score_pending()
+
+    def register_forecast_directory(self, directory):
+        """
+        Register the daily and multi-origin forecast files of a forecast output
+        directory that are new or changed since the last call.
+
+        Args:
+            directory (str): Forecast output directory
+
+        Returns:
+            int: Number of forecasts scored
+        """
+        seen = dict(self.conn.execute("SELECT path, mtime FROM monitor_files"))
+        scored = 0
+        for path in sorted(glob.glob(os.path.join(directory, "*forecast_*"))):
+            match = FORECAST_FILE_PATTERN.match(os.path.basename(path))
+            mtime = os.path.getmtime(path)
+            if not match or seen.get(path) == mtime:
+                continue
+            if match.group('model'):
+                scored += self.register_forecasts(_read_forecast_file(path), match.group('model'),
+                                                  datetime.strptime(match.group('start'), "%Y%m%d"))
+            else:
+                scored += self.register_forecasts(_read_forecast_file(path), match.group('mo_model'))
+            self.conn.execute("INSERT OR REPLACE INTO monitor_files (path, mtime) VALUES (?, ?)", (path, mtime))
+            self.conn.commit()
+        return scored
+
+    def update_actuals(self, sales_df, drug_columns):
+        """
+        Add the actuals after each drug's last known date and score the pending
+        forecasts they complete. Earlier dates are not read again.
+
+        Args:
+            sales_df (DataFrame): Wide sales history with a 'datum' column
+            drug_columns (list): Drug columns of the history
+
+        Returns:
+            int: Number of forecasts scored
+        """
+        watermarks = dict(self.conn.execute("SELECT drug, MAX(date) FROM monitor_actuals GROUP BY drug"))
+        drugs = [drug for drug in drug_columns if drug in sales_df.columns]
+        dates = pd.to_datetime(sales_df['datum']).dt.normalize()
+
+        # Only the rows after the oldest watermark can hold new actuals
+        oldest = min((watermarks.get(drug) for drug in drugs), key=lambda d: d or '', default=None)
+        recent = dates > pd.Timestamp(oldest) if oldest else pd.Series(True, index=dates.index)
+        new = sales_df.loc[recent, drugs].assign(date=dates[recent].dt.strftime('%Y-%m-%d'))
+        new = new.melt(id_vars='date', var_name='drug', value_name='actual_sales').dropna()
+        new = new[new['date'] > new['drug'].map(watermarks).fillna('')]
+
+        self.conn.executemany("INSERT OR REPLACE INTO monitor_actuals (drug, date, actual_sales) VALUES (?, ?, ?)",
+                              new[['drug', 'date', 'actual_sales']].itertuples(index=False, name=None))
+        self.conn.commit()
+        return self._score_pending()
+
+    def _score_pending(self):
+        """Move the pending forecasts that have an actual into the scored table and the metrics"""
+        joined = pd.read_sql_query(
+            "SELECT p.model_type, p.drug, p.origin, p.date, p.horizon, p.predicted_sales, a.actual_sales "
+            "FROM monitor_pending p JOIN monitor_actuals a ON a.drug = p.drug AND a.date = p.date",
+            self.conn)
+        if joined.empty:
+            return 0
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO monitor_scored (model_type, drug, origin, date, horizon, predicted_sales, "
+            "actual_sales) VALUES (?, ?, ?, ?, ?, ?, ?)", joined.itertuples(index=False, name=None))
+        self.conn.execute("DELETE FROM monitor_pending WHERE EXISTS (SELECT 1 FROM monitor_actuals a "
+                          "WHERE a.drug = monitor_pending.drug AND a.date = monitor_pending.date)")
+        self._update_metrics(joined)
+        self.conn.commit()
+        return len(joined)
+
+    def _update_metrics(self, joined):
+        """Fold newly scored forecasts, in date order, into the running metrics rows"""
+        batch = joined.sort_values(METRIC_KEY + ['date', 'origin'], kind='stable').reset_index(drop=True)
+        error = batch['actual_sales'] - batch['predicted_sales']
+        batch['abs'] = error.abs()
+        batch['sq'] = error ** 2
+        nonzero = batch['actual_sales'] != 0
+        batch['ape'] = np.where(nonzero, batch['abs'] / batch['actual_sales'].abs().where(nonzero, 1.0), 0.0)
+        batch['has_ape'] = nonzero.astype(int)
+
+        placeholders = ', '.join(['?'] * len(METRIC_KEY))
+        previous = pd.read_sql_query(f"SELECT {', '.join(METRIC_KEY + STATE_COLUMNS)} FROM monitor_metrics", self.conn)
+        batch = batch.merge(previous, on=METRIC_KEY, how='left')
+        for column in STATE_COLUMNS[:-2]:
+            batch[column] = batch[column].fillna(0)
+
+        groups = batch.groupby(METRIC_KEY, sort=False)
+        position = groups.cumcount()
+        size = groups['abs'].transform('size')
+
+        # Baseline: the first errors of a row until it holds BASELINE_SAMPLES of them
+        in_baseline = position < (self.baseline_samples - batch['baseline_n'])
+        batch['baseline_add'] = batch['abs'].where(in_baseline, 0.0)
+        batch['baseline_count'] = in_baseline.astype(int)
+
+        # Exponentially weighted MAE: new = (1-a)^k * old + sum a (1-a)^(k-1-i) e_i, seeded
+        # with the first error of a row that has none yet
+        decay = 1.0 - self.alpha
+        first = batch['rolling_n'] == 0
+        batch['rolling_mae'] = batch['rolling_mae'].where(~first, groups['abs'].transform('first'))
+        batch['weighted'] = self.alpha * decay ** (size - 1 - position) * batch['abs']
+
+        update = groups.agg(
+            n=('n', 'first'), sum_abs=('sum_abs', 'first'), sum_sq=('sum_sq', 'first'),
+            sum_ape=('sum_ape', 'first'), n_ape=('n_ape', 'first'),
+            baseline_n=('baseline_n', 'first'), baseline_abs=('baseline_abs', 'first'),
+            rolling_n=('rolling_n', 'first'), rolling_mae=('rolling_mae', 'first'),
+            add_n=('abs', 'size'), add_sum_abs=('abs', 'sum'), add_sum_sq=('sq', 'sum'),
+            add_sum_ape=('ape', 'sum'), add_n_ape=('has_ape', 'sum'),
+            add_baseline_n=('baseline_count', 'sum'), add_baseline_abs=('baseline_add', 'sum'),
+            add_weighted=('weighted', 'sum'), last_date=('date', 'max'),
+        ).reset_index()
+
+        update['rolling_mae'] = decay ** update['add_n'] * update['rolling_mae'] + update['add_weighted']
+        for column in ['n', 'sum_abs', 'sum_sq', 'sum_ape', 'n_ape', 'baseline_n', 'baseline_abs']:
+            update[column] = update[column] + update[f"add_{column}"]
+        update['rolling_n'] = update['rolling_n'] + update['add_n']
+        update['updated_at'] = datetime.now().isoformat(timespec='seconds')
+
+        columns = METRIC_KEY + STATE_COLUMNS + ['updated_at']
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO monitor_metrics ({', '.join(columns)}) "
+            f"VALUES ({placeholders}, {', '.join(['?'] * (len(columns) - len(METRIC_KEY)))})",
+            update[columns].astype(object).itertuples(index=False, name=None))
+
+    def metrics(self, by_horizon=True):
+        """
+        Accuracy metrics for the dashboard.
+
+        Args:
+            by_horizon (bool): One row per horizon; otherwise horizons are pooled per
+                (model type, drug) and a row drifts if any of its horizons does
+
+        Returns:
+            DataFrame: model_type, drug, (horizon,) n, mae, rmse, mape, baseline_mae,
+                rolling_mae, drift_ratio, drift and last_date columns
+        """
+        state = pd.read_sql_query(f"SELECT * FROM monitor_metrics ORDER BY {', '.join(METRIC_KEY)}", self.conn)
+        baseline_mae = (state['baseline_abs'] / state['baseline_n'].where(state['baseline_n'] > 0)).astype(float)
+        state['drift_ratio'] = state['rolling_mae'] / baseline_mae.where(baseline_mae > 0)
+        # A row is only judged once its baseline is complete and a few errors followed it
+        judged = (state['baseline_n'] >= self.baseline_samples) & \
+            (state['rolling_n'] >= state['baseline_n'] + MIN_DRIFT_SAMPLES)
+        state['drift'] = judged & ((state['drift_ratio'] > self.drift_ratio) |
+                                   ((baseline_mae == 0) & (state['rolling_mae'] > 0)))
+        state['baseline_mae'] = baseline_mae
+        key = METRIC_KEY
+
+        if not by_horizon:
+            key = ['model_type', 'drug']
+            state = state.groupby(key, as_index=False).agg(
+                n=('n', 'sum'), sum_abs=('sum_abs', 'sum'), sum_sq=('sum_sq', 'sum'),
+                sum_ape=('sum_ape', 'sum'), n_ape=('n_ape', 'sum'),
+                baseline_mae=('baseline_mae', 'mean'), rolling_mae=('rolling_mae', 'mean'),
+                drift_ratio=('drift_ratio', 'max'), drift=('drift', 'any'), last_date=('last_date', 'max'))
+
+        state['mae'] = state['sum_abs'] / state['n']
+        state['rmse'] = np.sqrt(state['sum_sq'] / state['n'])
+        state['mape'] = 100 * state['sum_ape'] / state['n_ape'].where(state['n_ape'] > 0)
+        return state[key + ['n', 'mae', 'rmse', 'mape', 'baseline_mae', 'rolling_mae', 'drift_ratio',
+                            'drift', 'last_date']]
+
+    def scored(self, model_type=None, drugs=None, start=None, end=None):
+        """
+        Scored forecasts (forecast next to actual) for a date range.
+
+        Args:
+            model_type (str, optional): Model type. Defaults to all.
+            drugs (list, optional): Drug codes. Defaults to all.
+            start (str, optional): First date (YYYY-MM-DD, inclusive)
+            end (str, optional): Last date (YYYY-MM-DD, inclusive)
+
+        Returns:
+            DataFrame: model_type, drug, origin, date, horizon, predicted_sales, actual_sales
+        """
+        clauses, params = [], []
+        if model_type:
+            clauses.append("model_type = ?")
+            params.append(model_type)
+        if drugs:
+            clauses.append(f"drug IN ({', '.join(['?'] * len(drugs))})")
+            params.extend(drugs)
+        if start is not None:
+            clauses.append("date >= ?")
+            params.append(str(start))
+        if end is not None:
+            clauses.append("date <= ?")
+            params.append(str(end))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return pd.read_sql_query(f"SELECT * FROM monitor_scored {where} ORDER BY model_type, drug, date, origin",
+                                 self.conn, params=params)
+
+    def drift_flags(self):
+        """
+        Drugs whose forecasts are drifting and should be retrained.
+
+        Returns:
+            list: One dict per drifting (model type, drug) with the drifting horizons
+        """
+        metrics = self.metrics()
+        flags = []
+        for (model_type, drug), rows in metrics[metrics['drift']].groupby(['model_type', 'drug']):
+            flags.append({'model_type': model_type, 'drug': drug,
+                          'horizons': [int(h) for h in rows['horizon']],
+                          'max_drift_ratio': round(float(rows['drift_ratio'].max()), 3)})
+        return flags
+
+    def write_drift_flags(self, path):
+        """
+        Write the drift flags to a JSON file that a retraining job can watch.
+
+        Args:
+            path (str): Flag file
+
+        Returns:
+            list: The drift flags
+        """
+        flags = self.drift_flags()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'created_at': datetime.now().isoformat(timespec='seconds'),
+                       'drift_ratio': self.drift_ratio, 'flags': flags}, f, indent=2)
+        return flags
+
+    def reset_baseline(self, drugs, model_type):
+        """
+        Start new baselines for drugs after their models were retrained. The
+        cumulative metrics are kept.
+
+        Args:
+            drugs (list): Drug codes
+            model_type (str): Model type that was retrained
+        """
+        self.conn.execute(
+            f"UPDATE monitor_metrics SET baseline_n = 0, baseline_abs = 0, rolling_n = 0, rolling_mae = NULL "
+            f"WHERE model_type = ? AND drug IN ({', '.join(['?'] * len(drugs))})", [model_type] + list(drugs))
+        self.conn.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Join forecasts to new actuals and update accuracy metrics')
+    parser.add_argument('--db', type=str, default="forecasts/monitoring.db", help='Monitoring database')
+    parser.add_argument('--data', type=str, default="dataset/salesdaily.csv", help='Sales history CSV')
+    parser.add_argument('--forecasts', type=str, default="forecasts", help='Forecast output directory')
+    parser.add_argument('--drugs', type=str, default='M01AB,M01AE,N02BA,N02BE,N05B,N05C,R03,R06',
+                        help='Comma-separated drug columns')
+    parser.add_argument('--metrics-csv', type=str, default="forecasts/accuracy_metrics.csv",
+                        help='Per-horizon metrics export for the dashboard')
+    parser.add_argument('--flags', type=str, default="forecasts/drift_flags.json", help='Drift flag file')
+    parser.add_argument('--drift-ratio', type=float, default=DRIFT_RATIO,
+                        help='Rolling / baseline MAE ratio that counts as drift')
+    parser.add_argument('--reset-baseline', type=str, metavar='DRUGS',
+                        help='Comma-separated drugs whose baselines restart (after retraining)')
+    parser.add_argument('--model-type', type=str, default='rf', help='Model type for --reset-baseline')
+    parser.add_argument('--fail-on-drift', action='store_true', help='Exit with status 2 when any drug drifts')
+    args = parser.parse_args()
+
+    monitor = ForecastMonitor(args.db, drift_ratio=args.drift_ratio)
+    if args.reset_baseline:
+        monitor.reset_baseline(args.reset_baseline.split(','), args.model_type)
+        print(f"✅ Baselines reset for {args.reset_baseline} ({args.model_type})")
+        raise SystemExit(0)
+
+    from utils.sales_data import read_sales_history
+    drug_columns = args.drugs.split(',')
+    scored = monitor.register_forecast_directory(args.forecasts)
+    scored += monitor.update_actuals(read_sales_history(args.data, drug_columns), drug_columns)
+    print(f"✅ Scored {scored} new forecasts")
+
+    metrics = monitor.metrics()
+    metrics.to_csv(args.metrics_csv, index=False)
+    print(f"📁 Metrics written to {args.metrics_csv}")
+    print(monitor.metrics(by_horizon=False).to_string(index=False) if not metrics.empty
+          else "No forecasts have actuals yet.")
+
+    flags = monitor.write_drift_flags(args.flags)
+    for flag in flags:
+        print(f"⚠️ Drift: {flag['drug']} ({flag['model_type']}) on horizons {flag['horizons']}, "
+              f"rolling MAE {flag['max_drift_ratio']}x baseline")
+    monitor.close()
+    if flags and args.fail_on_drift:
+        raise SystemExit(2)
@@ -0,0 +1,111 @@
+# utils/forecast_output.py
+# Forecast result container and writers
+# Predictions are accumulated into one preallocated (dates x drugs) array;
+# the wide (pivot) and long layouts are built from it only when needed.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+OUTPUT_FORMATS = ['csv', 'parquet', 'arrow']
+FORMAT_EXTENSIONS = {'csv': 'csv', 'parquet': 'parquet', 'arrow': 'arrow'}
+
+
+class ForecastArray:
+    """
+    Daily forecasts for many drugs held as a single (dates x drugs) array.
+    """
+
+    def __init__(self, dates, drugs):
+        """
+        Args:
+            dates (DatetimeIndex): Forecast dates (rows)
+            drugs (list): Drug codes (columns)
+        """
+        self.dates = pd.DatetimeIndex(dates)
+        self.drugs = list(drugs)
+        # Column-major so each drug's series, and the long layout, are contiguous views
+        self.values = np.full((len(self.dates), len(self.drugs)), np.nan, order='F')
+        self.filled = np.zeros(len(self.drugs), dtype=bool)
+
+    def set_drug(self, column, predictions):
+        """Store one drug's predictions in its column"""
+        self.values[:len(predictions), column] = predictions
+        self.filled[column] = True
+
+    def set_drugs(self, columns, predictions):
+        """Store the predictions of several drugs, shape (dates, len(columns)), at once"""
+        self.values[:, columns] = predictions
+        self.filled[columns] = True
+
+    def _produced(self):
+        if self.filled.all():
+            return self.drugs, self.values
+        return [drug for drug, ok in zip(self.drugs, self.filled) if ok], self.values[:, self.filled]
+
+    def __len__(self):
+        return int(self.filled.sum()) * len(self.dates)
+
+    def wide(self):
+        """
+        Pivot layout (Date column plus one column per drug) backed by the array.
+
+        Returns:
+            DataFrame: Wide forecasts
+        """
+        drugs, values = self._produced()
+        df = pd.DataFrame(values, index=self.dates, columns=pd.Index(drugs, name='Drug'), copy=False)
+        return df.rename_axis('Date').reset_index()
+
+    def long(self):
+        """
+        Long layout (Drug, Date, Predicted_Sales), drug-major as in the CSV outputs.
+
+        Returns:
+            DataFrame: Long forecasts
+        """
+        drugs, values = self._produced()
+        n_dates = len(self.dates)
+        return pd.DataFrame({
+            'Drug': pd.Categorical.from_codes(np.repeat(np.arange(len(drugs)), n_dates), categories=drugs),
+            'Date': np.tile(self.dates.values, len(drugs)),
+            'Predicted_Sales': values.ravel(order='F'),
+        })
+
+
+def write_frame(df, base_path, formats=('csv',)):
+    """
+    Write a forecast frame in each requested format.
+
+    Args:
+        df (DataFrame): Frame to write
+        base_path (str): Output path without extension
+        formats (iterable): Any of 'csv', 'parquet', 'arrow' (Arrow IPC file)
+
+    Returns:
+        list: Written paths
+    """
+    paths = []
+    for fmt in formats:
+        if fmt not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unsupported output format: {fmt}")
+        path = f"{base_path}.{FORMAT_EXTENSIONS[fmt]}"
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if fmt == 'csv':
+            df.to_csv(path, index=False)
+        else:
+            # pyarrow is only loaded when a columnar format is requested
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if fmt == 'parquet':
+                pq.write_table(table, path)
+            else:
+                with pa.OSFile(path, 'wb') as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+        paths.append(path)
+    return paths
@@ -0,0 +1,382 @@
+# utils/forecast_refresh.py
+# Event-driven forecast refresh
+# Watches the sales history and the weather sources (archive segments and
+# partitions, and the CSV store) by polling their file signatures. When one
+# changes, the new inputs are compared with a snapshot kept from the last
+# refresh to find what the change affects:
+#   sales    drugs whose history changed (content hash per drug column)
+#   weather  forecast dates whose weather features changed; only drugs whose
+#            model reads a weather feature are forecast again
+# Only the affected drugs are recomputed. The forecaster keeps recursion
+# checkpoints (lags, rolling means, weather and prediction of every step), so
+# a weather change resumes each recursion from the first changed date and the
+# unchanged prefix is reused. The recomputed columns are merged into the
+# published daily forecast, which is rewritten, and the changed rows go to the
+# forecast store and the cubes.
+#
+# Usage (from the project root):
+#   python -m utils.forecast_refresh --once --start-date 2025-05-01           # one check, e.g. from cron
+#   python -m utils.forecast_refresh --interval 60 --fetch-weather --forecast-db sqlite:///forecasts/forecasts.db
+
+import argparse
+import glob
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_INTERVAL_SECONDS = 60
+
+# Weather features compared between snapshots, rounded so that re-fetching the
+# same values does not count as a change
+WEATHER_DECIMALS = 2
+
+
+def file_signature(paths):
+    """
+    Signature of a set of files that changes whenever one is added, removed or rewritten.
+
+    Args:
+        paths (iterable): File paths (missing files are skipped)
+
+    Returns:
+        list: [path, mtime_ns, size] per existing file, sorted by path
+    """
+    signature = []
+    for path in sorted(set(paths)):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature.append([path, stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def drug_hashes(df, drug_columns):
+    """
+    Content hash of each drug's sales history.
+
+    Args:
+        df (DataFrame): Wide sales history with a 'datum' column
+        drug_columns (list): Drug columns to hash
+
+    Returns:
+        dict: Drug -> hash string
+    """
+    dates = pd.util.hash_pandas_object(df['datum'], index=False).to_numpy()
+    hashes = {}
+    for drug in drug_columns:
+        values = pd.util.hash_pandas_object(df[drug], index=False).to_numpy()
+        # Order-sensitive combination, so shifted or swapped rows change the hash
+        combined = (values ^ dates) * np.arange(1, len(values) + 1, dtype=np.uint64)
+        hashes[drug] = f"{len(values)}:{int(combined.sum(dtype=np.uint64)):x}"
+    return hashes
+
+
+def weather_snapshot(weather_frame, dates):
+    """
+    Weather features of each forecast date in a JSON-friendly layout.
+
+    Args:
+        weather_frame (DataFrame): max_temp, min_temp and weather_code, one row per date
+        dates (DatetimeIndex): Dates of the rows
+
+    Returns:
+        dict: 'YYYY-MM-DD' -> rounded feature values
+    """
+    values = weather_frame.to_numpy(dtype=float).round(WEATHER_DECIMALS)
+    return {day.strftime('%Y-%m-%d'): [None if np.isnan(v) else float(v) for v in row]
+            for day, row in zip(dates, values)}
+
+
+class ForecastRefresher:
+    """
+    Recomputes the published daily forecast of the drugs affected by changed inputs.
+    """
+
+    def __init__(self, config, state_path=None, fetch_weather=False):
+        """
+        Args:
+            config (dict): MultiHorizonForecast configuration
+            state_path (str, optional): Snapshot of the last refresh. Defaults to
+                {OUTPUT_PATH}/refresh_state_{label}.json; the recursion checkpoints are
+                kept next to it.
+            fetch_weather (bool): Refresh the weather store (when it is stale) before each check
+        """
+        from multi_horizon_forecast import MultiHorizonForecast
+
+        self.forecaster = MultiHorizonForecast(dict({'RECURSION_CHECKPOINTS': True}, **config))
+        self.fetch_weather = fetch_weather
+        self.state_path = state_path or os.path.join(
+            self.forecaster.output_path, f"refresh_state_{self.forecaster.output_label}.json")
+        self.checkpoint_path = f"{os.path.splitext(self.state_path)[0]}.checkpoints.pkl"
+        self.state = self._load_state()
+        if self.state and self.forecaster.use_checkpoints:
+            self.forecaster.load_checkpoints(self.checkpoint_path)
+        # Signatures of the inputs the forecaster currently holds
+        self._loaded = self.signatures()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read refresh state {self.state_path}: {e}. Refreshing everything.")
+            return {}
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def weather_paths(self):
+        """Files the forecaster's weather is read from"""
+        forecaster = self.forecaster
+        paths = [forecaster.weather_path]
+        if forecaster.weather_archive:
+            paths += glob.glob(os.path.join(forecaster.weather_archive, "incoming", forecaster.location_id,
+                                            "*.parquet"))
+            paths += glob.glob(os.path.join(forecaster.weather_archive, "compacted",
+                                            f"location_id={forecaster.location_id}", "*", "*.parquet"))
+        return paths
+
+    def signatures(self):
+        """File signatures of the sales history and the weather sources"""
+        return {'sales': file_signature([self.forecaster.data_path]),
+                'weather': file_signature(self.weather_paths())}
+
+    def published_path(self, start_date):
+        """Published daily forecast file the refresh rewrites"""
+        forecaster = self.forecaster
+        fmt = forecaster.output_formats[0]
+        return (f"{forecaster.output_path}/daily_forecast_{forecaster.output_label}_"
+                f"{start_date.strftime('%Y%m%d')}.{fmt}")
+
+    def load_published(self, forecast_dates):
+        """
+        Previously published forecast for the window as a forecast array.
+
+        Args:
+            forecast_dates (DatetimeIndex): Forecast window
+
+        Returns:
+            ForecastArray: Published values (drugs not in the file are left unfilled), or None
+        """
+        from utils.forecast_output import ForecastArray
+
+        path = self.published_path(forecast_dates[0])
+        if not os.path.exists(path):
+            return None
+        if path.endswith('.csv'):
+            published = pd.read_csv(path)
+        elif path.endswith('.parquet'):
+            published = pd.read_parquet(path)
+        else:
+            published = pd.read_feather(path)
+
+        wide = published.pivot(index='Date', columns='Drug', values='Predicted_Sales')
+        wide.index = pd.to_datetime(wide.index)
+        wide = wide.reindex(forecast_dates)
+        forecast = ForecastArray(forecast_dates, self.forecaster.drug_columns)
+        for column, drug in enumerate(forecast.drugs):
+            if drug in wide.columns and not wide[drug].isna().any():
+                forecast.set_drug(column, wide[drug].to_numpy())
+        return forecast
+
+    def weather_drugs(self, drugs):
+        """
+        Drugs whose forecast depends on the weather.
+
+        Args:
+            drugs (list): Candidate drugs
+
+        Returns:
+            list: Drugs whose model reads a weather feature (drugs without a model fall back to a
+                baseline, which does not)
+        """
+        from utils.baseline_models import BASELINE_MODELS
+        from utils.feature_selection import model_features
+        from utils.weather_features import WEATHER_FEATURES
+
+        forecaster = self.forecaster
+        if forecaster.model_type in BASELINE_MODELS:
+            return []
+        affected = []
+        for drug in drugs:
+            model_path = forecaster.get_model_path(drug)
+            if not os.path.exists(model_path):
+                continue
+            features = model_features(forecaster.load_model(model_path), forecaster.prepare_feature_names(drug))
+            if set(features) & set(WEATHER_FEATURES):
+                affected.append(drug)
+        return affected
+
+    def refresh(self, start_date=None, num_days=None, force=False):
+        """
+        Check the inputs once and recompute the affected part of the forecast.
+
+        Args:
+            start_date (date or str, optional): First forecast date. Defaults to today.
+            num_days (int, optional): Days in the window. Defaults to the forecaster's FORECAST_DAYS.
+            force (bool): Recompute every drug
+
+        Returns:
+            dict: Refresh summary (reason, drugs, changed_dates, steps_reused, steps_computed,
+                seconds), or None when nothing changed
+        """
+        from utils.forecast_output import ForecastArray
+        from utils.forecast_store import new_run_id
+
+        forecaster = self.forecaster
+        if start_date is None:
+            start_date = datetime.now().date()
+        elif isinstance(start_date, str):
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        num_days = num_days or forecaster.forecast_days
+        window = {'start_date': start_date.strftime('%Y-%m-%d'), 'days': num_days,
+                  'label': forecaster.output_label}
+
+        if self.fetch_weather:
+            from utils.weather import get_weather_data
+            get_weather_data(forecaster.location_id, forecaster.weather_path)
+
+        signatures = self.signatures()
+        forecast_dates = pd.date_range(start=start_date, periods=num_days, freq='D')
+        published_exists = os.path.exists(self.published_path(forecast_dates[0]))
+        if not force and published_exists and self.state.get('window') == window and \
+                self.state.get('signatures') == signatures:
+            return None
+
+        started = time.perf_counter()
+        if signatures != self._loaded:
+            print("🔍 Inputs changed, reloading...")
+            forecaster.load_data()
+            self._loaded = signatures
+
+        hashes = drug_hashes(forecaster.df, forecaster.drug_columns)
+        weather = {} if forecaster.weather_df is None else \
+            weather_snapshot(forecaster.get_weather_frame(forecast_dates), forecast_dates)
+        previous = None if force or self.state.get('window') != window else self.load_published(forecast_dates)
+
+        if previous is None:
+            reason = 'full'
+            drugs = list(forecaster.drug_columns)
+            changed_dates = list(weather)
+        else:
+            old_hashes = self.state.get('drug_hashes', {})
+            old_weather = self.state.get('weather', {})
+            changed_dates = [day for day, values in weather.items() if old_weather.get(day) != values]
+            sales_drugs = [drug for drug in forecaster.drug_columns if old_hashes.get(drug) != hashes[drug]]
+            weather_drugs = self.weather_drugs(forecaster.drug_columns) if changed_dates else []
+            unpublished = [drug for drug, ok in zip(previous.drugs, previous.filled) if not ok]
+            affected = set(sales_drugs) | set(weather_drugs) | set(unpublished)
+            drugs = [drug for drug in forecaster.drug_columns if drug in affected]
+            reason = ', '.join(name for name, changed in (('sales', sales_drugs), ('weather', changed_dates),
+                                                          ('unpublished', unpublished)) if changed) or 'none'
+
+        stats = dict(forecaster.checkpoint_stats)
+        if drugs:
+            print(f"🔄 Refreshing {len(drugs)} of {len(forecaster.drug_columns)} drugs ({reason})"
+                  f"{': weather changed on ' + ', '.join(changed_dates) if reason != 'full' and changed_dates else ''}")
+            updated = forecaster.forecast_daily(forecast_dates, drugs)
+            merged = previous if previous is not None else ForecastArray(forecast_dates, forecaster.drug_columns)
+            column_of = {drug: column for column, drug in enumerate(merged.drugs)}
+            for column, drug in enumerate(updated.drugs):
+                if updated.filled[column]:
+                    merged.set_drug(column_of[drug], updated.values[:, column])
+            if len(updated):
+                # Every refresh is its own run in the forecast store
+                forecaster.run_id = new_run_id()
+                forecaster.publish_daily(merged, start_date, updated=updated)
+                print(f"✅ Published {self.published_path(start_date)}")
+            if forecaster.use_checkpoints:
+                forecaster.save_checkpoints(self.checkpoint_path)
+        else:
+            print(f"✅ Inputs changed ({reason}) but no drug's forecast depends on the change")
+
+        self.state = {'window': window, 'signatures': signatures, 'drug_hashes': hashes, 'weather': weather,
+                      'refreshed_at': datetime.now().isoformat(timespec='seconds')}
+        self._save_state()
+        steps_reused = forecaster.checkpoint_stats['reused'] - stats['reused']
+        steps_computed = forecaster.checkpoint_stats['computed'] - stats['computed']
+        if steps_reused:
+            print(f"♻️ Resumed from checkpoints: {steps_reused} of {steps_reused + steps_computed} steps reused")
+        return {'reason': reason, 'drugs': drugs, 'changed_dates': changed_dates, 'steps_reused': steps_reused,
+                'steps_computed': steps_computed, 'seconds': time.perf_counter() - started}
+
+    def watch(self, start_date=None, num_days=None, interval=DEFAULT_INTERVAL_SECONDS):
+        """
+        Poll the inputs and refresh whenever they change, until interrupted.
+
+        Args:
+            start_date (date or str, optional): First forecast date. Defaults to today on every check.
+            num_days (int, optional): Days in the window
+            interval (float): Seconds between checks
+        """
+        print(f"👀 Watching {self.forecaster.data_path} and the weather of {self.forecaster.location_id} "
+              f"every {interval:g} s (Ctrl+C to stop)")
+        try:
+            while True:
+                try:
+                    summary = self.refresh(start_date, num_days)
+                    if summary:
+                        print(f"⏱️ Refresh took {summary['seconds']:.2f} s")
+                except Exception as e:
+                    print(f"❌ Refresh failed: {e}")
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recompute forecasts when the sales or weather data change')
+    parser.add_argument('--model-type', type=str,
+                        choices=['rf', 'knn', 'xgboost', 'auto', 'snaive', 'profile', 'ets', 'croston', 'tsb'],
+                        default='rf', help='Model type to forecast with')
+    parser.add_argument('--strategy', type=str, choices=['recursive', 'direct'], help='Multi-step strategy')
+    parser.add_argument('--start-date', type=str, help='First forecast date (YYYY-MM-DD, default: today)')
+    parser.add_argument('--days', type=int, default=7, help='Days in the forecast window')
+    parser.add_argument('--data', type=str, help='Sales history CSV')
+    parser.add_argument('--models', type=str, help='Model directory')
+    parser.add_argument('--output', type=str, help='Output directory')
+    parser.add_argument('--location', type=str, help='Weather location ID')
+    parser.add_argument('--weather-archive', type=str, help='Historical weather archive directory')
+    parser.add_argument('--forecast-db', type=str, help='Forecast store receiving the refreshed rows')
+    parser.add_argument('--drugs', type=str, help='Comma-separated drug codes (default: all)')
+    parser.add_argument('--state', type=str, help='Refresh state file')
+    parser.add_argument('--fetch-weather', action='store_true',
+                        help='Fetch the weather forecast before each check when the store is stale')
+    parser.add_argument('--no-checkpoints', action='store_true',
+                        help='Recompute affected drugs from the first window day instead of resuming')
+    parser.add_argument('--once', action='store_true', help='Check once and exit')
+    parser.add_argument('--force', action='store_true', help='Recompute every drug on the first check')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL_SECONDS, help='Seconds between checks')
+    args = parser.parse_args()
+
+    config = {
+        'MODEL_TYPE': args.model_type,
+        'STRATEGY': args.strategy,
+        'FORECAST_DAYS': args.days,
+        'DATA_PATH': args.data,
+        'MODEL_DIR': args.models,
+        'OUTPUT_PATH': args.output,
+        'LOCATION_ID': args.location,
+        'WEATHER_ARCHIVE': args.weather_archive,
+        'FORECAST_DB': args.forecast_db,
+        'DRUG_COLUMNS': args.drugs.split(',') if args.drugs else None,
+        'RECURSION_CHECKPOINTS': False if args.no_checkpoints else None,
+    }
+    refresher = ForecastRefresher({key: value for key, value in config.items() if value is not None},
+                                  state_path=args.state, fetch_weather=args.fetch_weather)
+    if args.once or args.force:
+        summary = refresher.refresh(args.start_date, args.days, force=args.force)
+        print("✅ Nothing changed since the last refresh." if summary is None else
+              f"⏱️ Refresh took {summary['seconds']:.2f} s")
+    if not args.once:
+        refresher.watch(args.start_date, args.days, args.interval)
@@ -0,0 +1,261 @@
+# utils/forest_compression.py
+# Compression of tuned Random Forests
+# The search often settles on a few hundred shallow trees, which are slow to
+# load and to evaluate for little accuracy gain. Two compact replacements are
+# built and the fastest one within a tolerance of the forest's validation
+# RMSE is saved next to the original as {model}_compressed.pkl:
+#   prune    the smallest subset of the forest's own trees, chosen by greedy
+#            forward selection on the validation set
+#   distill  a small gradient-boosted model fitted to the forest's predictions
+# The forecaster uses the compressed files with main.py --compressed.
+#
+# Training:  python train_model_saperately.py   (FORECAST_COMPRESS_FORESTS=0 skips the stage)
+#
+# Usage (from the project root, compress existing models on the sales history):
+#   python -m utils.forest_compression --model-type rf
+#   python -m utils.forest_compression --model-type rf --drugs N02BE,R06 --tolerance 0.02
+
+import argparse
+import copy
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.concurrency import seed_from_env
+
+# Validation RMSE a compressed model may lose relative to the forest (0.01 = 1%)
+COMPRESSION_TOLERANCE = 0.01
+
+# Student model of the distillation (seeded with the training seed, FORECAST_SEED)
+DISTILL_PARAMS = {'n_estimators': 50, 'max_depth': 3, 'learning_rate': 0.1}
+
+# Trailing days of history the command line scores models on
+VALIDATION_DAYS = 365
+
+LOAD_REPEATS = 5
+
+REPORT_COLUMNS = ['Drug', 'Model_File', 'Method', 'Trees_Full', 'Trees', 'Validation_RMSE_Full', 'Validation_RMSE',
+                  'Test_RMSE_Full', 'Test_RMSE', 'Size_KB_Full', 'Size_KB', 'Load_ms_Full', 'Load_ms',
+                  'Latency_ms_Full', 'Latency_ms']
+
+
+def compress_forests_from_env():
+    """Forest compression switch for the module-level training scripts (on unless FORECAST_COMPRESS_FORESTS=0)"""
+    return os.environ.get("FORECAST_COMPRESS_FORESTS", "1").lower() not in ("0", "false", "no")
+
+
+def compressed_model_path(model_path):
+    """Path of the compressed model saved next to a model file"""
+    stem, ext = os.path.splitext(model_path)
+    return f"{stem}_compressed{ext}"
+
+
+def _rmse(y_true, y_pred):
+    return float(np.sqrt(np.mean((np.asarray(y_true) - y_pred) ** 2)))
+
+
+def _size_kb(model):
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1024
+
+
+def load_ms(path, repeats=LOAD_REPEATS):
+    """Median time to load a model file in milliseconds"""
+    import joblib
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        joblib.load(path)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def prune_forest(model, X_val, y_val, tolerance=COMPRESSION_TOLERANCE):
+    """
+    Smallest subset of a forest's trees within the tolerance of its validation RMSE.
+
+    Trees are added greedily, each time the one that lowers the RMSE of the
+    averaged prediction the most, until the subset is within the tolerance.
+    The trees are chosen on the even validation rows and the tolerance is
+    checked on the odd ones, so the subset is not judged on the rows it was
+    picked for.
+
+    Args:
+        model (RandomForestRegressor): Fitted forest
+        X_val, y_val: Validation data
+        tolerance (float): Relative validation RMSE the subset may lose
+
+    Returns:
+        RandomForestRegressor: Copy of the forest holding only the chosen trees
+    """
+    # One row of validation predictions per tree (trees are fitted on arrays)
+    X = np.asarray(X_val, dtype=np.float32)
+    y = np.asarray(y_val, dtype=float)
+    tree_predictions = np.stack([tree.predict(X) for tree in model.estimators_])
+    select, check = tree_predictions[:, 0::2], tree_predictions[:, 1::2]
+    y_select, y_check = y[0::2], y[1::2]
+    target = _rmse(y_check, check.mean(axis=0)) * (1 + tolerance)
+
+    chosen = []
+    available = np.ones(len(tree_predictions), dtype=bool)
+    total = np.zeros(len(y_select))
+    while available.any():
+        # RMSE of the average after adding each remaining tree
+        errors = np.sqrt((((total + select) / (len(chosen) + 1) - y_select) ** 2).mean(axis=1))
+        errors[~available] = np.inf
+        best = int(errors.argmin())
+        chosen.append(best)
+        available[best] = False
+        total += select[best]
+        if _rmse(y_check, check[chosen].mean(axis=0)) <= target:
+            break
+
+    pruned = copy.copy(model)
+    pruned.estimators_ = [model.estimators_[i] for i in sorted(chosen)]
+    pruned.n_estimators = len(chosen)
+    return pruned
+
+
+def distill_forest(model, X_train, params=None, random_state=None):
+    """
+    Fit a small gradient-boosted model to a forest's predictions.
+
+    Args:
+        model: Fitted forest (the teacher)
+        X_train (DataFrame): Inputs the student learns the teacher's predictions on
+        params (dict, optional): GradientBoostingRegressor parameters. Defaults to DISTILL_PARAMS.
+        random_state (int, optional): Seed of the student. Defaults to seed_from_env().
+
+    Returns:
+        GradientBoostingRegressor: The student
+    """
+    from sklearn.ensemble import GradientBoostingRegressor
+
+    seed = seed_from_env() if random_state is None else random_state
+    student = GradientBoostingRegressor(**{'random_state': seed, **(params or DISTILL_PARAMS)})
+    student.fit(X_train, model.predict(X_train))
+    # Pruned forests keep their reduced feature schema
+    if hasattr(model, 'feature_schema_'):
+        student.feature_schema_ = model.feature_schema_
+    return student
+
+
+def compress_forest(model, X_train, X_val, y_val, X_test=None, y_test=None, tolerance=COMPRESSION_TOLERANCE,
+                    random_state=None):
+    """
+    Build the pruned and distilled candidates and keep the fastest one within the tolerance.
+
+    Args:
+        model (RandomForestRegressor): Fitted forest
+        X_train: Inputs for the distillation
+        X_val, y_val: Validation data the candidates are chosen on
+        X_test, y_test (optional): Held-out data, only reported
+        tolerance (float): Relative validation RMSE a candidate may lose
+        random_state (int, optional): Seed of the distilled student. Defaults to seed_from_env().
+
+    Returns:
+        tuple: (compressed model or None, report dict with the REPORT_COLUMNS measurements
+            except Drug, Model_File and the load times)
+    """
+    from utils.model_routing import measure_latency_ms
+
+    full_rmse = _rmse(y_val, model.predict(X_val))
+    candidates = [('prune', prune_forest(model, X_val, y_val, tolerance)), ('distill', distill_forest(model, X_train, random_state=random_state))]
+
+    best = None
+    for method, candidate in candidates:
+        candidate_rmse = _rmse(y_val, candidate.predict(X_val))
+        if candidate_rmse > full_rmse * (1 + tolerance):
+            continue
+        latency = measure_latency_ms(candidate, X_val)
+        if best is None or latency < best[3]:
+            best = (method, candidate, candidate_rmse, latency)
+
+    report = {
+        'Method': best[0] if best else 'none',
+        'Trees_Full': len(model.estimators_),
+        'Trees': len(best[1].estimators_) if best else len(model.estimators_),
+        'Validation_RMSE_Full': full_rmse,
+        'Validation_RMSE': best[2] if best else full_rmse,
+        'Test_RMSE_Full': _rmse(y_test, model.predict(X_test)) if X_test is not None else np.nan,
+        'Test_RMSE': _rmse(y_test, best[1].predict(X_test)) if X_test is not None and best else np.nan,
+        'Size_KB_Full': _size_kb(model),
+        'Size_KB': _size_kb(best[1]) if best else np.nan,
+        'Latency_ms_Full': measure_latency_ms(model, X_val),
+        'Latency_ms': best[3] if best else np.nan,
+    }
+    return (best[1] if best else None), report
+
+
+def save_compressed(model_path, compressed, report):
+    """
+    Save a compressed model next to its original and add both load times to the report.
+
+    Args:
+        model_path (str): Original model file
+        compressed: Compressed model (None saves nothing)
+        report (dict): Report of compress_forest, updated in place
+
+    Returns:
+        str: Path of the compressed file, or None
+    """
+    import joblib
+
+    report['Load_ms_Full'] = load_ms(model_path)
+    if compressed is None:
+        report['Load_ms'] = np.nan
+        return None
+    path = compressed_model_path(model_path)
+    joblib.dump(compressed, path)
+    report['Load_ms'] = load_ms(path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compress existing Random Forest models')
+    parser.add_argument('--model-type', type=str, choices=['rf', 'randomforest'], default='rf',
+                        help='Model file prefix (rf_model_*.pkl or randomforest_model_*.pkl)')
+    parser.add_argument('--models', type=str, default="saved_models", help='Model directory')
+    parser.add_argument('--drugs', type=str, help='Comma-separated drug codes (default: all)')
+    parser.add_argument('--tolerance', type=float, default=COMPRESSION_TOLERANCE,
+                        help='Validation RMSE a compressed model may lose (0.01 = 1%%)')
+    parser.add_argument('--report', type=str, default="forest_compression_results.csv", help='Report CSV')
+    args = parser.parse_args()
+
+    import joblib
+    from multi_horizon_forecast import MultiHorizonForecast
+    from utils.feature_selection import model_features
+
+    config = {'MODEL_DIR': args.models, 'WRITE_CUBES': False}
+    if args.drugs:
+        config['DRUG_COLUMNS'] = args.drugs.split(',')
+    forecaster = MultiHorizonForecast(config)
+
+    rows = []
+    for drug in forecaster.drug_columns:
+        model_path = os.path.join(args.models, f"{args.model_type}_model_{drug}.pkl")
+        if not os.path.exists(model_path):
+            print(f"⚠️ {model_path} not found. Skipping.")
+            continue
+        model = joblib.load(model_path)
+        X, y = forecaster.history_features(drug, model_features(model, forecaster.prepare_feature_names(drug)))
+        # The trailing year is split into validation (candidates are chosen on it) and test
+        # halves; the earlier rows train the student
+        split = len(X) - VALIDATION_DAYS // 2
+        X_train, y_train = X.iloc[:-VALIDATION_DAYS], y.iloc[:-VALIDATION_DAYS]
+        X_val, y_val = X.iloc[-VALIDATION_DAYS:split], y.iloc[-VALIDATION_DAYS:split]
+        X_test, y_test = X.iloc[split:], y.iloc[split:]
+        compressed, report = compress_forest(model, X_train, X_val, y_val, X_test, y_test, tolerance=args.tolerance)
+        path = save_compressed(model_path, compressed, report)
+        rows.append({'Drug': drug, 'Model_File': os.path.basename(model_path), **report})
+        print(f"{'📁' if path else '⚠️'} {drug}: {report['Method']}, {report['Trees_Full']} -> {report['Trees']} trees, "
+              f"latency {report['Latency_ms_Full']:.2f} -> {report['Latency_ms']:.2f} ms")
+
+    if rows:
+        report_df = pd.DataFrame(rows)[REPORT_COLUMNS]
+        report_df.to_csv(args.report, index=False)
+        print(report_df.drop(columns=['Model_File']).round(3).to_string(index=False))
+        print(f"📁 Report saved to {args.report}")
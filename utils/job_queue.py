@@ -0,0 +1,278 @@
+# utils/job_queue.py
+# Job queues of the local job scheduler (job_scheduler.py)
+# A job is a forecast, train, backtest or weather-refresh run with a
+# priority (lower runs first), a CPU budget and a retry allowance. Two
+# backends share one interface:
+#   SQLiteJobQueue  persistent queue in forecasts/jobs.db, survives restarts
+#   MemoryJobQueue  in-process queue for tests and one-off runs
+#
+# Job states: queued -> running -> done | failed | cancelled. A failed attempt
+# is queued again after a delay while retries are left; a preempted job is
+# queued again without using up an attempt.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+JOB_KINDS = ['forecast', 'train', 'backtest', 'weather-refresh']
+
+# Default priority of each kind (lower runs first); forecasts preempt training
+DEFAULT_PRIORITIES = {'forecast': 10, 'weather-refresh': 20, 'backtest': 30, 'train': 40}
+
+# Default CPU budget of each kind; None means every CPU the scheduler manages
+DEFAULT_CPUS = {'forecast': 1, 'weather-refresh': 1, 'backtest': 1, 'train': None}
+
+# Retries after the first failed attempt (weather fetches fail transiently)
+DEFAULT_RETRIES = {'forecast': 1, 'weather-refresh': 3, 'backtest': 1, 'train': 1}
+
+# Arguments a kind's command cannot run without (utils.direct_strategy needs the origin range)
+REQUIRED_ARGS = {'backtest': ['--origin-start', '--origin-end']}
+
+# Seconds before a failed job is retried, multiplied by its attempt number
+RETRY_DELAY_SECONDS = 30
+
+JOB_STATES = ['queued', 'running', 'done', 'failed', 'cancelled']
+
+JOB_FIELDS = ['id', 'kind', 'args', 'priority', 'cpus', 'state', 'attempts', 'max_retries', 'preemptions',
+              'not_before', 'submitted_at', 'started_at', 'finished_at', 'pid', 'error']
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind VARCHAR(32) NOT NULL,
+        args TEXT NOT NULL,
+        priority INTEGER NOT NULL,
+        cpus INTEGER,
+        state VARCHAR(16) NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_retries INTEGER NOT NULL,
+        preemptions INTEGER NOT NULL DEFAULT 0,
+        not_before REAL NOT NULL,
+        submitted_at TIMESTAMP NOT NULL,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        pid INTEGER,
+        error TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, priority, id)",
+]
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class JobQueue:
+    """
+    Scheduling logic shared by the queue backends; subclasses store the jobs.
+    """
+
+    def _insert(self, job):
+        raise NotImplementedError
+
+    def _update(self, job_id, **fields):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """Job as a dict, or None"""
+        raise NotImplementedError
+
+    def jobs(self, state=None):
+        """Jobs (optionally in one state) ordered by id"""
+        raise NotImplementedError
+
+    def submit(self, kind, args=None, priority=None, cpus=None, max_retries=None):
+        """
+        Add a job to the queue.
+
+        Args:
+            kind (str): One of JOB_KINDS
+            args (list, optional): Command line arguments passed to the job's command
+                (must include the kind's REQUIRED_ARGS)
+            priority (int, optional): Lower runs first. Defaults to DEFAULT_PRIORITIES.
+            cpus (int, optional): CPU budget. Defaults to DEFAULT_CPUS (None = all).
+            max_retries (int, optional): Retries after a failed attempt. Defaults to DEFAULT_RETRIES.
+
+        Returns:
+            int: Job ID
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}'. Choose from {JOB_KINDS}.")
+        args = list(args or [])
+        missing = [flag for flag in REQUIRED_ARGS.get(kind, [])
+                   if not any(arg == flag or arg.startswith(f"{flag}=") for arg in args)]
+        if missing:
+            raise ValueError(f"A {kind} job needs {' and '.join(missing)}.")
+        return self._insert({
+            'kind': kind, 'args': args,
+            'priority': DEFAULT_PRIORITIES[kind] if priority is None else priority,
+            'cpus': DEFAULT_CPUS[kind] if cpus is None else cpus,
+            'state': 'queued', 'attempts': 0,
+            'max_retries': DEFAULT_RETRIES[kind] if max_retries is None else max_retries,
+            'preemptions': 0, 'not_before': 0.0, 'submitted_at': _now(),
+            'started_at': None, 'finished_at': None, 'pid': None, 'error': None,
+        })
+
+    def ready(self, now=None):
+        """Queued jobs whose retry delay has passed, in run order (priority, then submission)"""
+        now = time.time() if now is None else now
+        return sorted((job for job in self.jobs('queued') if job['not_before'] <= now),
+                      key=lambda job: (job['priority'], job['id']))
+
+    def start(self, job_id, pid=None):
+        """Mark a job as running and count the attempt"""
+        job = self.get(job_id)
+        self._update(job_id, state='running', attempts=job['attempts'] + 1, started_at=_now(), pid=pid,
+                     finished_at=None)
+
+    def complete(self, job_id):
+        """Mark a running job as done"""
+        self._update(job_id, state='done', finished_at=_now(), pid=None, error=None)
+
+    def fail(self, job_id, error, retry_delay=RETRY_DELAY_SECONDS):
+        """
+        Record a failed attempt; the job is queued again while retries are left.
+
+        Returns:
+            bool: True if the job will be retried
+        """
+        job = self.get(job_id)
+        if job['attempts'] <= job['max_retries']:
+            self._update(job_id, state='queued', pid=None, error=error,
+                         not_before=time.time() + retry_delay * job['attempts'])
+            return True
+        self._update(job_id, state='failed', finished_at=_now(), pid=None, error=error)
+        return False
+
+    def requeue(self, job_id):
+        """Put a preempted (or interrupted) job back in the queue without using up an attempt"""
+        job = self.get(job_id)
+        self._update(job_id, state='queued', attempts=max(0, job['attempts'] - 1),
+                     preemptions=job['preemptions'] + 1, pid=None)
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job; the scheduler stops the process of a running one.
+
+        Returns:
+            bool: True if the job was queued or running and is now cancelled
+        """
+        job = self.get(job_id)
+        if job is None or job['state'] not in ('queued', 'running'):
+            return False
+        self._update(job_id, state='cancelled', finished_at=_now())
+        return True
+
+    def recover(self):
+        """
+        Queue again the jobs left running by a scheduler that stopped without cleaning up.
+
+        Returns:
+            list: Recovered job IDs
+        """
+        recovered = [job['id'] for job in self.jobs('running')]
+        for job_id in recovered:
+            self.requeue(job_id)
+        return recovered
+
+    def counts(self):
+        """Number of jobs in each state"""
+        counts = dict.fromkeys(JOB_STATES, 0)
+        for job in self.jobs():
+            counts[job['state']] += 1
+        return counts
+
+    def close(self):
+        pass
+
+
+class MemoryJobQueue(JobQueue):
+    """
+    In-process job queue; jobs are lost when the process exits.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def _insert(self, job):
+        with self._lock:
+            job = dict(job, id=self._next_id)
+            self._jobs[job['id']] = job
+            self._next_id += 1
+        return job['id']
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, args=list(job['args'])) if job else None
+
+    def jobs(self, state=None):
+        with self._lock:
+            return [dict(job, args=list(job['args'])) for job_id, job in sorted(self._jobs.items())
+                    if state is None or job['state'] == state]
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Persistent job queue in a SQLite database.
+    """
+
+    def __init__(self, path="forecasts/jobs.db"):
+        """
+        Args:
+            path (str): Database file
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        # The status server reads from another thread; writes are serialised by the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+
+    @staticmethod
+    def _row(row):
+        job = dict(row)
+        job['args'] = json.loads(job['args'])
+        return job
+
+    def _insert(self, job):
+        fields = [field for field in JOB_FIELDS if field != 'id']
+        values = [json.dumps(job['args']) if field == 'args' else job[field] for field in fields]
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                f"INSERT INTO jobs ({', '.join(fields)}) VALUES ({', '.join('?' for _ in fields)})", values)
+        return cursor.lastrowid
+
+    def _update(self, job_id, **fields):
+        with self._lock, self.conn:
+            self.conn.execute(f"UPDATE jobs SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?",
+                              list(fields.values()) + [job_id])
+
+    def get(self, job_id):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def jobs(self, state=None):
+        with self._lock:
+            if state is None:
+                rows = self.conn.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+            else:
+                rows = self.conn.execute("SELECT * FROM jobs WHERE state = ? ORDER BY id", (state,)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def close(self):
+        self.conn.close()
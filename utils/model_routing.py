@@ -0,0 +1,149 @@
+# utils/model_routing.py
+# Per-drug model routing for the 'auto' model type
+# Training writes a routing table with every candidate model of every drug,
+# its validation error and its measured single-row inference latency. At
+# forecast time each drug is routed to the fastest candidate whose validation
+# RMSE is within a tolerance of that drug's best.
+#
+# Usage (from the project root):
+#   python -m utils.model_routing                       # routes with the default trade-off
+#   python -m utils.model_routing --tolerance 0.10 --max-latency-ms 5
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+ROUTING_FILE = "model_routing.csv"
+ROUTING_COLUMNS = ['Drug', 'Model', 'Model_Type', 'Model_File', 'Validation_RMSE', 'Validation_MAE', 'Latency_ms']
+
+# Training model names and the forecaster model type each one corresponds to; sparse drugs
+# are scored with a Croston or TSB estimator, which needs no model file
+MODEL_TYPES = {'RandomForest': 'rf', 'XGBoost': 'xgboost', 'KNN': 'knn', 'Croston': 'croston', 'TSB': 'tsb'}
+
+# Validation RMSE a faster model may lose relative to the drug's best (0.05 = 5%)
+DEFAULT_TOLERANCE = 0.05
+
+LATENCY_REPEATS = 20
+
+
+def measure_latency_ms(model, X, repeats=LATENCY_REPEATS):
+    """
+    Median latency of predicting a single row, as the recursive forecaster does.
+
+    Args:
+        model: Fitted model
+        X (DataFrame): Feature rows; the first one is predicted
+        repeats (int): Number of timed predictions
+
+    Returns:
+        float: Median latency in milliseconds
+    """
+    row = X.iloc[[0]]
+    model.predict(row)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def write_routing_table(results_df, model_dir):
+    """
+    Write the routing table from training results. A drug in the results gets
+    only its new rows; rows of drugs that were not retrained are kept from the
+    existing table.
+
+    Args:
+        results_df (DataFrame): Training results with Drug, Model, Set, RMSE, MAE,
+            Latency (ms) and Model File columns
+        model_dir (str): Model directory the table is written to
+
+    Returns:
+        DataFrame: The routing table
+    """
+    validation = results_df[results_df['Set'] == 'Validation']
+    table = pd.DataFrame({
+        'Drug': validation['Drug'],
+        'Model': validation['Model'],
+        'Model_Type': validation['Model'].map(MODEL_TYPES),
+        'Model_File': validation['Model File'],
+        'Validation_RMSE': validation['RMSE'],
+        'Validation_MAE': validation['MAE'],
+        'Latency_ms': validation['Latency (ms)'],
+    })
+
+    path = os.path.join(model_dir, ROUTING_FILE)
+    if os.path.exists(path):
+        # Earlier rows of a re-scored drug are dropped, also those of models it no longer
+        # trains (e.g. a drug now scored with TSB keeps no stale RandomForest route)
+        existing = pd.read_csv(path)
+        existing = existing[~existing['Drug'].isin(set(table['Drug']))]
+        table = pd.concat([existing, table], ignore_index=True)
+    table = table.sort_values(['Drug', 'Model'])[ROUTING_COLUMNS]
+    table.to_csv(path, index=False)
+    return table
+
+
+def load_routing_table(*model_dirs):
+    """
+    Read the routing table from the first model directory that has one.
+
+    Args:
+        *model_dirs (str): Model directories in order of preference (None entries are skipped)
+
+    Returns:
+        DataFrame: Routing table, or None if there is none
+    """
+    for model_dir in model_dirs:
+        if model_dir and os.path.exists(os.path.join(model_dir, ROUTING_FILE)):
+            return pd.read_csv(os.path.join(model_dir, ROUTING_FILE))
+    return None
+
+
+def choose_routes(table, tolerance=DEFAULT_TOLERANCE, max_latency_ms=None):
+    """
+    Pick one model per drug.
+
+    Candidates over the latency budget are dropped (unless that would drop all
+    of a drug's candidates); of the rest, the fastest whose validation RMSE is
+    within the tolerance of the best is chosen.
+
+    Args:
+        table (DataFrame): Routing table
+        tolerance (float): Relative validation RMSE a faster model may lose
+        max_latency_ms (float, optional): Latency budget per prediction
+
+    Returns:
+        dict: Drug -> chosen routing table row (dict)
+    """
+    routes = {}
+    for drug, candidates in table.dropna(subset=['Validation_RMSE']).groupby('Drug', sort=False):
+        if max_latency_ms is not None:
+            within_budget = candidates[candidates['Latency_ms'] <= max_latency_ms]
+            if not within_budget.empty:
+                candidates = within_budget
+        best_rmse = candidates['Validation_RMSE'].min()
+        eligible = candidates[candidates['Validation_RMSE'] <= best_rmse * (1 + tolerance)]
+        chosen = eligible.sort_values(['Latency_ms', 'Validation_RMSE'], kind='stable').iloc[0]
+        routes[drug] = chosen.to_dict()
+    return routes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Show the per-drug model routes')
+    parser.add_argument('--models', type=str, default="saved_models", help='Model directory holding the routing table')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Validation RMSE a faster model may lose (0.05 = 5%%)')
+    parser.add_argument('--max-latency-ms', type=float, help='Latency budget per prediction')
+    args = parser.parse_args()
+
+    table = load_routing_table(args.models)
+    if table is None:
+        print(f"❌ No routing table in {args.models}. Run train_model_saperately.py first.")
+    else:
+        routes = choose_routes(table, args.tolerance, args.max_latency_ms)
+        print(pd.DataFrame(routes.values())[ROUTING_COLUMNS].to_string(index=False))
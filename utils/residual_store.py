@@ -0,0 +1,183 @@
+# utils/residual_store.py
+# Partitioned residual dataset written once per training run
+# Per-sample predictions of every (drug, model, set) are appended as one
+# bulk Parquet write, hive-partitioned by Drug/Model/Set so that a query for a
+# few drugs or models only opens the matching directories. Run metadata is
+# kept next to the data in _runs.jsonl (ignored by the dataset reader).
+#
+# Layout:
+#   residuals/dataset/Drug=M01AB/Model=KNN/Set=Test/part-{run_id}-0.parquet
+#   residuals/dataset/_runs.jsonl
+#
+# Usage (from the project root):
+#   python -m utils.residual_store --drugs N02BE --models RandomForest --sets Test
+#   python -m utils.residual_store --import-csv residuals      # convert legacy per-file CSVs
+
+import argparse
+import glob
+import json
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+
+PARTITION_COLUMNS = ['Drug', 'Model', 'Set']
+COLUMNS = ['Date', 'Drug', 'Model', 'Set', 'Actual_Sales', 'Predicted_Sales', 'Residual', 'Run_ID']
+RUNS_FILE = "_runs.jsonl"
+
+# Legacy file names: residuals_{drug}_{model}_{test|train|val}.csv
+LEGACY_SETS = {'test': 'Test', 'train': 'Train', 'val': 'Validation'}
+LEGACY_PATTERN = re.compile(r"residuals_(?P<drug>.+)_(?P<model>[^_]+)_(?P<set>test|train|val)\.csv$")
+
+
+def _pyarrow():
+    # pyarrow is only needed once residuals are written or read
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return pa, ds
+
+
+class ResidualStore:
+    """
+    Hive-partitioned Parquet dataset of training residuals, one bulk write per run.
+    """
+
+    def __init__(self, root="residuals/dataset"):
+        """
+        Args:
+            root (str): Directory holding the dataset
+        """
+        self.root = root
+
+    def runs(self):
+        """
+        Metadata of every run written to the dataset, oldest first.
+
+        Returns:
+            list: Run metadata dictionaries (run_id, created_at, rows, ...)
+        """
+        path = os.path.join(self.root, RUNS_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def latest_run(self):
+        runs = self.runs()
+        return runs[-1]['run_id'] if runs else None
+
+    def write_run(self, frames, run_id, metadata=None):
+        """
+        Write all residual frames of a training run at once.
+
+        Args:
+            frames (list): DataFrames with Date, Drug, Model, Set, Actual_Sales
+                and Predicted_Sales columns
+            run_id (str): Run identifier
+            metadata (dict, optional): Extra run metadata (script, features, ...)
+
+        Returns:
+            int: Number of rows written
+        """
+        if not frames:
+            return 0
+        pa, ds = _pyarrow()
+
+        df = pd.concat(frames, ignore_index=True)
+        df['Date'] = pd.to_datetime(df['Date'])
+        df['Residual'] = df['Actual_Sales'] - df['Predicted_Sales']
+        df['Run_ID'] = run_id
+        df = df[COLUMNS].sort_values(PARTITION_COLUMNS + ['Date'], kind='stable')
+
+        os.makedirs(self.root, exist_ok=True)
+        ds.write_dataset(pa.Table.from_pandas(df, preserve_index=False), self.root, format='parquet',
+                         partitioning=PARTITION_COLUMNS, partitioning_flavor='hive',
+                         basename_template=f"part-{run_id}-{{i}}.parquet",
+                         existing_data_behavior='overwrite_or_ignore')
+
+        run = {'run_id': run_id, 'created_at': datetime.now().isoformat(timespec='seconds'), 'rows': len(df),
+               'drugs': sorted(df['Drug'].unique().tolist()), 'models': sorted(df['Model'].unique().tolist())}
+        run.update(metadata or {})
+        with open(os.path.join(self.root, RUNS_FILE), 'a') as f:
+            f.write(json.dumps(run) + "\n")
+        return len(df)
+
+    def query(self, drugs=None, models=None, sets=None, run_id=None, all_runs=False):
+        """
+        Read residuals, opening only the partitions of the requested drugs, models and sets.
+
+        Args:
+            drugs (list, optional): Drug codes. Defaults to all.
+            models (list, optional): Model names (e.g. 'RandomForest'). Defaults to all.
+            sets (list, optional): 'Train', 'Validation' and/or 'Test'. Defaults to all.
+            run_id (str, optional): Run to read. Defaults to the latest run.
+            all_runs (bool): Read every run instead of a single one
+
+        Returns:
+            DataFrame: Columns Date, Drug, Model, Set, Actual_Sales, Predicted_Sales, Residual, Run_ID
+        """
+        if not os.path.isdir(self.root):
+            return pd.DataFrame(columns=COLUMNS)
+        pa, ds = _pyarrow()
+
+        dataset = ds.dataset(self.root, format='parquet', partitioning='hive')
+        condition = None
+        for column, values in [('Drug', drugs), ('Model', models), ('Set', sets)]:
+            if values:
+                clause = ds.field(column).isin(list(values))
+                condition = clause if condition is None else condition & clause
+        if not all_runs:
+            run_id = run_id or self.latest_run()
+            if run_id is not None:
+                clause = ds.field('Run_ID') == run_id
+                condition = clause if condition is None else condition & clause
+
+        df = dataset.to_table(filter=condition).to_pandas()
+        for column in PARTITION_COLUMNS:
+            df[column] = df[column].astype(str)
+        return df[COLUMNS].sort_values(PARTITION_COLUMNS + ['Date'], ignore_index=True)
+
+
+def import_csv_directory(directory, store, run_id="legacy"):
+    """
+    Convert legacy residuals_{drug}_{model}_{set}.csv files into one dataset run.
+
+    Args:
+        directory (str): Directory holding the CSV files
+        store (ResidualStore): Destination dataset
+        run_id (str): Run identifier given to the imported rows
+
+    Returns:
+        int: Number of rows imported
+    """
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, "residuals_*.csv"))):
+        match = LEGACY_PATTERN.search(os.path.basename(path))
+        if not match:
+            continue
+        frame = pd.read_csv(path)
+        frame['Set'] = LEGACY_SETS[match.group('set')]
+        frames.append(frame)
+    return store.write_run(frames, run_id, {'source': directory})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Query the partitioned residual dataset')
+    parser.add_argument('--root', type=str, default="residuals/dataset", help='Dataset directory')
+    parser.add_argument('--drugs', type=str, help='Comma-separated drug codes')
+    parser.add_argument('--models', type=str, help='Comma-separated model names')
+    parser.add_argument('--sets', type=str, help='Comma-separated sets (Train, Validation, Test)')
+    parser.add_argument('--run-id', type=str, help='Run to read (default: latest)')
+    parser.add_argument('--import-csv', type=str, metavar='DIR',
+                        help='Import legacy residuals_{drug}_{model}_{set}.csv files from DIR')
+    args = parser.parse_args()
+
+    store = ResidualStore(args.root)
+    if args.import_csv:
+        print(f"✅ Imported {import_csv_directory(args.import_csv, store)} rows into {args.root}")
+    else:
+        split = lambda value: value.split(',') if value else None
+        df = store.query(split(args.drugs), split(args.models), split(args.sets), args.run_id)
+        summary = df.groupby(['Drug', 'Model', 'Set'])['Residual'].agg(['count', 'mean', 'std'])
+        print(summary.to_string() if not df.empty else "No residuals found.")
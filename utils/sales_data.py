@@ -0,0 +1,215 @@
+# utils/sales_data.py
+# Sales history loading and calendar features shared by the forecaster and
+# the training scripts.
+#
+# The memory-efficient mode keeps drug columns as float32 and calendar
+# features as small ints, and can read only the trailing window of history
+# that the recursive forecaster needs, in chunks, so that peak memory does not
+# grow with the full history length x drug count.
+#
+# Besides the wide layout (one 'datum' column plus one column per drug) a long
+# layout with one row per date and drug is accepted, e.g.
+#   date,drug,qty
+#   2019-01-02,SKU00001,3
+# It is pivoted to the wide layout on load; days without a row for a drug are
+# zero sales. The drug set is discovered from the file instead of configured,
+# so catalogs of thousands of SKUs need no code changes.
+
+import os
+
+import pandas as pd
+
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Dummy columns are produced in the order get_dummies used for plain strings
+WEEKDAY_CATEGORIES = sorted(WEEKDAY_NAMES)
+
+CALENDAR_DTYPES = {'Year': 'int16', 'Month': 'int8', 'DayOfWeek': 'int8'}
+
+# Days of history kept by the forecaster in memory-efficient mode: a year for
+# the seasonal baselines plus the lag window
+DEFAULT_HISTORY_WINDOW = 372
+
+READ_CHUNK_ROWS = 1024
+
+# Columns that are not drugs in a wide sales history
+CALENDAR_COLUMNS = ('datum', 'Year', 'Month', 'Hour', 'Weekday_Name')
+
+# Accepted column names of the long layout (matched case-insensitively)
+LONG_DATE_COLUMNS = ('date', 'datum')
+LONG_DRUG_COLUMNS = ('drug', 'sku', 'item')
+LONG_QUANTITY_COLUMNS = ('qty', 'quantity', 'sales')
+
+# Rows per chunk when reading a long history (one row per date and drug)
+LONG_CHUNK_ROWS = 500_000
+
+
+def memory_efficient_from_env():
+    """Memory-efficient mode switch for the module-level training scripts"""
+    return os.environ.get("FORECAST_MEMORY_EFFICIENT", "0").lower() in ("1", "true", "yes")
+
+
+def _clean_name(name):
+    return name.strip().replace(' ', '_')
+
+
+def _find_column(header, names):
+    for col in header:
+        if col.strip().lower() in names:
+            return col
+    return None
+
+
+def long_format_columns(path):
+    """
+    Date, drug and quantity columns of a long sales history.
+
+    Args:
+        path (str): Sales CSV
+
+    Returns:
+        tuple: (date, drug, quantity) raw column names, or None for a wide history
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    columns = (_find_column(header, LONG_DATE_COLUMNS), _find_column(header, LONG_DRUG_COLUMNS),
+               _find_column(header, LONG_QUANTITY_COLUMNS))
+    return columns if all(col is not None for col in columns) else None
+
+
+def sales_drug_columns(df):
+    """Drug columns of a wide sales history frame (every column except the calendar ones)"""
+    return [col for col in df.columns if col not in CALENDAR_COLUMNS and not col.startswith('Weekday_Name')]
+
+
+def discover_drugs(path):
+    """
+    Drug codes in a sales history, without loading the sales.
+
+    Wide histories list them in the header (in column order); long histories
+    are scanned in chunks over the drug column only (sorted).
+
+    Args:
+        path (str): Sales CSV
+
+    Returns:
+        list: Drug codes
+    """
+    columns = long_format_columns(path)
+    if columns is None:
+        header = [_clean_name(col) for col in pd.read_csv(path, nrows=0).columns]
+        return [col for col in header if col not in CALENDAR_COLUMNS]
+    drugs = set()
+    for chunk in pd.read_csv(path, usecols=[columns[1]], dtype=str, chunksize=LONG_CHUNK_ROWS):
+        drugs.update(chunk[columns[1]].dropna().unique())
+    return sorted(drugs)
+
+
+def _read_long_history(path, columns, drug_columns=None, memory_efficient=False, window_days=None):
+    raw_date, raw_drug, raw_qty = columns
+    cutoff = None
+    if window_days:
+        last_date = pd.to_datetime(pd.read_csv(path, usecols=[raw_date])[raw_date]).max()
+        cutoff = last_date - pd.Timedelta(days=window_days)
+
+    wanted = set(drug_columns) if drug_columns is not None else None
+    dtype = 'float32' if memory_efficient else 'float64'
+    # Each chunk is reduced to (date x drug) totals before the next one is read
+    parts = []
+    for chunk in pd.read_csv(path, usecols=[raw_date, raw_drug, raw_qty], dtype={raw_drug: str, raw_qty: dtype},
+                             chunksize=LONG_CHUNK_ROWS):
+        chunk[raw_date] = pd.to_datetime(chunk[raw_date])
+        if cutoff is not None:
+            chunk = chunk[chunk[raw_date] > cutoff]
+        if wanted is not None:
+            chunk = chunk[chunk[raw_drug].isin(wanted)]
+        parts.append(chunk.groupby([raw_date, raw_drug])[raw_qty].sum())
+
+    totals = pd.concat(parts).groupby(level=[0, 1]).sum()
+    wide = totals.unstack(raw_drug, fill_value=0).astype(dtype)
+    drugs = [drug for drug in drug_columns if drug in wide.columns] if drug_columns is not None \
+        else sorted(wide.columns)
+    # Every calendar day between the first and last date, missing rows are zero sales
+    dates = pd.date_range(wide.index.min(), wide.index.max(), freq='D', name='datum')
+    wide = wide.reindex(index=dates, columns=drugs, fill_value=0)
+    wide.columns.name = None
+    return wide.reset_index()
+
+
+def read_sales_history(path, drug_columns=None, memory_efficient=False, window_days=None):
+    """
+    Load a sales history, wide (one 'datum' column plus one column per drug) or
+    long (one date, drug, quantity row per sale day; pivoted to the wide layout).
+
+    Args:
+        path (str): Sales CSV
+        drug_columns (list, optional): Drug columns to keep in memory-efficient mode
+            (always for long histories). Defaults to every drug in the file.
+        memory_efficient (bool): Keep only datum and drug columns, as float32
+        window_days (int, optional): In memory-efficient mode, keep only this many
+            trailing days of history
+
+    Returns:
+        DataFrame: Sales history sorted by date, column names cleaned
+    """
+    long_columns = long_format_columns(path)
+    if long_columns is not None:
+        return _read_long_history(path, long_columns, drug_columns, memory_efficient,
+                                  window_days if memory_efficient else None)
+
+    if not memory_efficient:
+        df = pd.read_csv(path)
+        df['datum'] = pd.to_datetime(df['datum'])
+        df = df.sort_values('datum')
+        df.rename(columns=_clean_name, inplace=True)
+        return df
+
+    raw_header = pd.read_csv(path, nrows=0).columns
+    header = [_clean_name(col) for col in raw_header]
+    if drug_columns is None:
+        drug_columns = [col for col in header if col not in CALENDAR_COLUMNS]
+    keep = ['datum'] + [col for col in drug_columns if col in header]
+    raw_keep = [raw for raw, col in zip(raw_header, header) if col in keep]
+    raw_datum = raw_header[header.index('datum')]
+
+    cutoff = None
+    if window_days:
+        # A first pass over the date column only finds where the window starts
+        last_date = pd.to_datetime(pd.read_csv(path, usecols=[raw_datum])[raw_datum]).max()
+        cutoff = last_date - pd.Timedelta(days=window_days)
+
+    # Parsed straight into float32; only rows inside the window are retained
+    dtypes = {raw: 'float32' for raw in raw_keep if raw != raw_datum}
+    chunks = []
+    for chunk in pd.read_csv(path, usecols=raw_keep, dtype=dtypes, chunksize=READ_CHUNK_ROWS):
+        chunk[raw_datum] = pd.to_datetime(chunk[raw_datum])
+        if cutoff is not None:
+            chunk = chunk[chunk[raw_datum] > cutoff]
+        chunks.append(chunk)
+
+    df = pd.concat(chunks, ignore_index=True)
+    df.rename(columns=_clean_name, inplace=True)
+    df = df[keep]
+    return df.sort_values('datum', ignore_index=True)
+
+
+def add_calendar_features(df, memory_efficient=False):
+    """
+    Add Year, Month, DayOfWeek, Is_Weekend and Weekday_Name_* dummy columns.
+
+    Args:
+        df (DataFrame): Frame with a 'datum' column
+        memory_efficient (bool): Use small-int calendar columns
+
+    Returns:
+        DataFrame: Frame with calendar features
+    """
+    df['Year'] = df['datum'].dt.year
+    df['Month'] = df['datum'].dt.month
+    df['DayOfWeek'] = df['datum'].dt.dayofweek
+    df['Is_Weekend'] = df['DayOfWeek'] >= 5
+    df['Weekday_Name'] = pd.Categorical(df['datum'].dt.day_name(), categories=WEEKDAY_CATEGORIES) \
+        if memory_efficient else df['datum'].dt.day_name()
+    df = pd.get_dummies(df, columns=['Weekday_Name'])
+    if memory_efficient:
+        df = df.astype(CALENDAR_DTYPES)
+    return df
@@ -0,0 +1,354 @@
+# utils/tuning_history.py
+# Hyperparameter tuning history and warm-started Bayesian search
+# Every point evaluated by a search is stored with its CV score per
+# (drug, model_type). A later search for the same drug starts from those
+# observations instead of from random points, so it needs far fewer
+# iterations. Drugs without history of their own start by evaluating the best
+# points of the drugs with the most similar sales profile.
+#
+# Usage (from the project root):
+#   python -m utils.tuning_history --db tuning_history.db            # search time report
+#   python -m utils.tuning_history --db tuning_history.db --drug N02BE --model-type RandomForest
+
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from skopt import BayesSearchCV, Optimizer
+from skopt.space import Space
+from skopt.utils import dimensions_aslist
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS tuning_trials (
+        drug VARCHAR(32) NOT NULL,
+        model_type VARCHAR(32) NOT NULL,
+        run_id VARCHAR(64) NOT NULL,
+        params TEXT NOT NULL,
+        score REAL NOT NULL,
+        fit_time REAL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_tuning_trials_drug ON tuning_trials (drug, model_type)",
+    """CREATE TABLE IF NOT EXISTS tuning_searches (
+        drug VARCHAR(32) NOT NULL,
+        model_type VARCHAR(32) NOT NULL,
+        run_id VARCHAR(64) NOT NULL,
+        warm_start VARCHAR(16) NOT NULL,
+        n_iter INTEGER NOT NULL,
+        seconds REAL NOT NULL,
+        best_score REAL,
+        created_at TIMESTAMP NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS drug_profiles (
+        drug VARCHAR(32) PRIMARY KEY,
+        profile TEXT NOT NULL
+    )""",
+]
+
+# Warm start modes recorded with every search
+COLD, OWN, TRANSFER = 'cold', 'own', 'transfer'
+
+# Own observations needed before a search is warm-started from them
+MIN_PRIOR_OBSERVATIONS = 5
+
+# Best observations told to the optimizer (the surrogate model stays small)
+MAX_PRIOR_OBSERVATIONS = 100
+
+# Points transferred from similar drugs: best points of the nearest drugs
+TRANSFER_DRUGS = 2
+TRANSFER_POINTS = 4
+
+
+def _native(value):
+    return np.array(value).item()
+
+
+def _params_key(params):
+    return json.dumps({name: _native(value) for name, value in params.items()}, sort_keys=True)
+
+
+def sales_profile(y):
+    """
+    Summary of a sales series used to find drugs with similar demand.
+
+    Args:
+        y (array-like): Daily sales of one drug
+
+    Returns:
+        dict: log level, coefficient of variation, share of zero days and
+            lag-1 / lag-7 autocorrelation
+    """
+    y = np.asarray(y, dtype=float)
+    y = y[~np.isnan(y)]
+    mean = y.mean() if len(y) else 0.0
+    std = y.std() if len(y) else 0.0
+
+    def autocorr(lag):
+        if len(y) <= lag or std == 0:
+            return 0.0
+        return float(np.corrcoef(y[:-lag], y[lag:])[0, 1])
+
+    return {
+        'log_level': float(np.log1p(max(mean, 0.0))),
+        'cv': float(std / mean) if mean > 0 else 0.0,
+        'zero_share': float(np.mean(y == 0)) if len(y) else 1.0,
+        'autocorr_1': autocorr(1),
+        'autocorr_7': autocorr(7),
+    }
+
+
+class TuningHistory:
+    """
+    SQLite store of evaluated hyperparameter points, search runs and drug profiles.
+    """
+
+    def __init__(self, path="tuning_history.db"):
+        """
+        Args:
+            path (str): SQLite database file
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def set_profile(self, drug, profile):
+        """Store the sales profile of a drug (see sales_profile)"""
+        self.conn.execute("INSERT INTO drug_profiles (drug, profile) VALUES (?, ?) "
+                          "ON CONFLICT (drug) DO UPDATE SET profile = excluded.profile",
+                          (drug, json.dumps(profile, sort_keys=True)))
+        self.conn.commit()
+
+    def observations(self, drug, model_type, limit=MAX_PRIOR_OBSERVATIONS):
+        """
+        Evaluated points of earlier searches, best first. A point evaluated
+        more than once keeps its most recent score.
+
+        Args:
+            drug (str): Drug code
+            model_type (str): Model type (e.g. 'RandomForest')
+            limit (int, optional): Maximum number of points
+
+        Returns:
+            list: (params dict, score) tuples; higher scores are better
+        """
+        rows = self.conn.execute("SELECT params, score FROM tuning_trials WHERE drug = ? AND model_type = ? "
+                                 "ORDER BY rowid", (drug, model_type)).fetchall()
+        latest = {params: score for params, score in rows}
+        ranked = sorted(latest.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(json.loads(params), score) for params, score in ranked]
+
+    def similar_drugs(self, drug, model_type, k=TRANSFER_DRUGS):
+        """
+        Drugs with tuning history for a model type, nearest sales profile first.
+
+        Args:
+            drug (str): Drug to find neighbours for (must have a stored profile)
+            model_type (str): Model type the neighbours must have been tuned for
+            k (int): Number of drugs
+
+        Returns:
+            list: Drug codes
+        """
+        profiles = {name: json.loads(profile) for name, profile in
+                    self.conn.execute("SELECT drug, profile FROM drug_profiles")}
+        if drug not in profiles:
+            return []
+        tuned = {name for (name,) in self.conn.execute(
+            "SELECT DISTINCT drug FROM tuning_trials WHERE model_type = ? AND drug != ?", (model_type, drug))}
+        candidates = sorted(name for name in tuned if name in profiles)
+        if not candidates:
+            return []
+
+        keys = sorted(profiles[drug])
+        matrix = np.array([[profiles[name].get(key, 0.0) for key in keys] for name in candidates + [drug]])
+        # Standardize so that no single profile statistic dominates the distance
+        scale = matrix.std(axis=0)
+        scale[scale == 0] = 1.0
+        matrix = (matrix - matrix.mean(axis=0)) / scale
+        distances = np.linalg.norm(matrix[:-1] - matrix[-1], axis=1)
+        return [candidates[i] for i in np.argsort(distances, kind='stable')[:k]]
+
+    def transfer_points(self, drug, model_type, k=TRANSFER_DRUGS, n_points=TRANSFER_POINTS):
+        """Best points of the most similar drugs, to be evaluated first for a drug without history"""
+        points, seen = [], set()
+        for neighbour in self.similar_drugs(drug, model_type, k):
+            for params, _ in self.observations(neighbour, model_type, limit=n_points):
+                key = _params_key(params)
+                if key not in seen:
+                    seen.add(key)
+                    points.append(params)
+        return points
+
+    def record_search(self, drug, model_type, search, warm_start, seconds, run_id=None):
+        """
+        Store every point a fitted search evaluated, and the search itself.
+
+        Args:
+            drug (str): Drug code
+            model_type (str): Model type
+            search (BayesSearchCV): Fitted search
+            warm_start (str): 'cold', 'own' or 'transfer'
+            seconds (float): Wall time of the search
+            run_id (str, optional): Training run identifier. Defaults to a timestamp.
+        """
+        run_id = run_id or datetime.now().strftime("%Y%m%dT%H%M%S")
+        results = search.cv_results_
+        rows = [(drug, model_type, run_id, _params_key(params), float(score), float(fit_time))
+                for params, score, fit_time in zip(results['params'], results['mean_test_score'],
+                                                   results['mean_fit_time'])
+                if np.isfinite(score)]
+        self.conn.executemany("INSERT INTO tuning_trials (drug, model_type, run_id, params, score, fit_time) "
+                              "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.conn.execute("INSERT INTO tuning_searches (drug, model_type, run_id, warm_start, n_iter, seconds, "
+                          "best_score, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                          (drug, model_type, run_id, warm_start, len(results['params']), float(seconds),
+                           float(search.best_score_), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        self.conn.commit()
+
+    def search_report(self):
+        """
+        Search time and best CV score of warm-started searches compared with cold ones.
+
+        Returns:
+            DataFrame: One row per (model_type, warm_start) with the number of
+                searches, mean iterations, mean seconds, mean best score and the
+                search time reduction relative to cold searches of the same model type
+        """
+        searches = pd.read_sql_query("SELECT model_type, warm_start, n_iter, seconds, best_score "
+                                     "FROM tuning_searches", self.conn)
+        if searches.empty:
+            return searches
+        report = searches.groupby(['model_type', 'warm_start']).agg(
+            searches=('seconds', 'size'), mean_iterations=('n_iter', 'mean'),
+            mean_seconds=('seconds', 'mean'), mean_best_score=('best_score', 'mean')).reset_index()
+        cold = report[report['warm_start'] == COLD].set_index('model_type')['mean_seconds']
+        report['time_reduction_pct'] = (1 - report['mean_seconds'] / report['model_type'].map(cold)) * 100
+        return report
+
+
+class _QueuedOptimizer(Optimizer):
+    """Optimizer that proposes queued points before asking its surrogate model"""
+
+    def __init__(self, dimensions, queued_points=(), **kwargs):
+        super().__init__(dimensions, **kwargs)
+        self.queued_points = list(queued_points)
+
+    def ask(self, n_points=None, strategy="cl_min"):
+        if not self.queued_points:
+            return super().ask(n_points=n_points, strategy=strategy)
+        n = 1 if n_points is None else n_points
+        batch, self.queued_points = self.queued_points[:n], self.queued_points[n:]
+        if n_points is None:
+            return batch[0]
+        # BayesSearchCV counts n_points iterations per batch, so a batch the queue
+        # only partly fills is completed by the optimizer
+        if len(batch) < n:
+            batch += super().ask(n_points=n - len(batch), strategy=strategy)
+        return batch
+
+
+class WarmStartBayesSearchCV(BayesSearchCV):
+    """
+    BayesSearchCV whose optimizer starts from earlier observations.
+
+    prior_observations are (params, score) pairs told to the optimizer before
+    the first iteration; they are not re-evaluated. initial_points are params
+    evaluated first, before the optimizer proposes points itself.
+    """
+
+    def __init__(self, estimator, search_spaces, prior_observations=None, initial_points=None, **kwargs):
+        self.prior_observations = prior_observations
+        self.initial_points = initial_points
+        super().__init__(estimator, search_spaces, **kwargs)
+
+    def _make_optimizer(self, params_space):
+        names = sorted(params_space)
+        kwargs = self.optimizer_kwargs_.copy()
+        kwargs['dimensions'] = dimensions_aslist(params_space)
+
+        space = Space(kwargs['dimensions'])
+        queued = [point for point in ([params.get(name) for name in names]
+                                      for params in (self.initial_points or []))
+                  if point in space]
+        if queued:
+            # The surrogate model takes over as soon as the queued points are evaluated
+            kwargs['n_initial_points'] = len(queued)
+        optimizer = _QueuedOptimizer(queued_points=queued, **kwargs)
+        for dimension, name in zip(optimizer.space.dimensions, names):
+            if dimension.name is None:
+                dimension.name = name
+
+        points, values = [], []
+        for params, score in self.prior_observations or []:
+            point = [params.get(name) for name in names]
+            if point in optimizer.space:
+                points.append(point)
+                # The optimizer minimizes, search scores are maximized
+                values.append(-score)
+        if points:
+            optimizer.tell(points, values)
+        return optimizer
+
+
+def warm_started_search(history, drug, model_type, model, search_space, n_iter, warm_n_iter, **kwargs):
+    """
+    Build the search for a drug and model type, warm-started from its own
+    history if there is enough of it, else from similar drugs.
+
+    Args:
+        history (TuningHistory): Tuning history, or None for a cold search
+        drug (str): Drug code (its profile should already be stored)
+        model_type (str): Model type
+        model: Estimator to tune
+        search_space (dict): skopt search space
+        n_iter (int): Iterations of a cold search
+        warm_n_iter (int): Iterations of a warm-started search
+        **kwargs: Further BayesSearchCV arguments
+
+    Returns:
+        tuple: (WarmStartBayesSearchCV, warm start mode)
+    """
+    priors, initial, mode = None, None, COLD
+    if history is not None:
+        observations = history.observations(drug, model_type)
+        if len(observations) >= MIN_PRIOR_OBSERVATIONS:
+            # The previous best is re-evaluated first, since the data may have changed
+            priors, initial, mode = observations, [observations[0][0]], OWN
+        else:
+            initial = history.transfer_points(drug, model_type)
+            if initial:
+                mode = TRANSFER
+
+    search = WarmStartBayesSearchCV(model, search_spaces=search_space, prior_observations=priors,
+                                    initial_points=initial, n_iter=n_iter if mode == COLD else warm_n_iter,
+                                    **kwargs)
+    return search, mode
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inspect the hyperparameter tuning history')
+    parser.add_argument('--db', type=str, default="tuning_history.db", help='Tuning history database')
+    parser.add_argument('--drug', type=str, help='Show the best evaluated points of this drug')
+    parser.add_argument('--model-type', type=str, default='RandomForest', help='Model type (with --drug)')
+    parser.add_argument('--top', type=int, default=10, help='Number of points to show (with --drug)')
+    args = parser.parse_args()
+
+    history = TuningHistory(args.db)
+    if args.drug:
+        for params, score in history.observations(args.drug, args.model_type, limit=args.top):
+            print(f"{score:10.4f}  {params}")
+        print(f"Similar drugs: {', '.join(history.similar_drugs(args.drug, args.model_type)) or 'none'}")
+    else:
+        report = history.search_report()
+        print(report.to_string(index=False) if not report.empty else "No searches recorded yet.")
+    history.close()
@@ -3,13 +3,29 @@
 # Extract Perlis forecast
 # Save as CSV (optional: in data/weather/perlis_7day.csv)
 
-import requests
 import pandas as pd
 import json
 from datetime import datetime
 import time
 import os
 
+try:
+    from utils.weather_archive import WeatherArchive, DEFAULT_ARCHIVE_DIR
+except ImportError:  # running as python utils/weather.py
+    from weather_archive import WeatherArchive, DEFAULT_ARCHIVE_DIR
+
+# Override with a local stand-in server (utils/weather_stub_server.py) for offline runs
+WEATHER_API_URL = os.environ.get("WEATHER_API_URL", "https://api.data.gov.my/weather/forecast")
+
+DEFAULT_WEATHER_DIR = "dataset/weather"
+
+# Locations that predate the per-location naming keep their original file name
+LOCATION_FILES = {"St001": "perlis_7day.csv"}
+
+def weather_store_path(location_id, weather_dir=DEFAULT_WEATHER_DIR):
+    """Path of the weather CSV store for a location"""
+    return os.path.join(weather_dir, LOCATION_FILES.get(location_id, f"{location_id}.csv"))
+
 def classify_weather(summary):
     """Classify weather summary into simpler categories"""
     summary = summary.lower()
@@ -29,7 +45,86 @@ def classify_weather(summary):
     else:
         return 'no rain'  # Default category for unclassified conditions
 
-def fetch_and_save_weather(location_id="St001", save_path="dataset/weather/perlis_7day.csv", retries=3, delay=2):
+def parse_weather_records(weather_data, fetched_at=None):
+    """
+    Convert raw API forecast entries into weather records
+    
+    Args:
+        weather_data (list): JSON entries returned by the forecast API
+        fetched_at (str, optional): Fetch timestamp. Defaults to now.
+    
+    Returns:
+        list: List of weather record dictionaries
+    """
+    if fetched_at is None:
+        fetched_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    weather_records = []
+    for entry in weather_data:
+        try:
+            # Handle different possible data structures
+            if isinstance(entry, dict):
+                if 'date' in entry and 'min_temp' in entry and 'max_temp' in entry:
+                    weather_records.append({
+                        "date": entry.get("date", ""),
+                        "min_temp": entry.get("min_temp", ""),
+                        "max_temp": entry.get("max_temp", ""),
+                        "weather_type": classify_weather(entry.get("summary_forecast", "")),
+                        #"humidity": entry.get("humidity", ""),  #Add more fields if available
+                        "last_updated": fetched_at
+                    })
+        except Exception as e:
+            print(f"Error processing entry: {e}")
+            continue
+    return weather_records
+
+def merge_weather_records(save_path, weather_records):
+    """
+    Merge new weather records into the date-keyed CSV store. Dates present in
+    the new records replace the stored rows; all other dates are kept.
+    
+    Args:
+        save_path (str): Path of the weather CSV store
+        weather_records (list or DataFrame): New weather records
+    
+    Returns:
+        DataFrame: The merged weather data
+    """
+    new_df = pd.DataFrame(weather_records)
+    new_df["date"] = pd.to_datetime(new_df["date"])
+    
+    if os.path.exists(save_path):
+        try:
+            existing_df = pd.read_csv(save_path, parse_dates=["date"])
+            new_df = pd.concat([existing_df, new_df], ignore_index=True)
+        except Exception as e:
+            print(f"Warning: Could not read existing weather store {save_path}: {e}")
+    
+    df = new_df.drop_duplicates(subset="date", keep="last").sort_values(by="date")
+    
+    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+    df.to_csv(save_path, index=False, date_format="%Y-%m-%d")
+    return df.reset_index(drop=True)
+
+def _meta_path(save_path):
+    return f"{save_path}.meta.json"
+
+def load_fetch_meta(save_path):
+    """Load the fetch metadata (validators and fetch time) stored next to a weather CSV"""
+    try:
+        with open(_meta_path(save_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_fetch_meta(save_path, meta):
+    """Save the fetch metadata (validators and fetch time) next to a weather CSV"""
+    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+    with open(_meta_path(save_path), "w") as f:
+        json.dump(meta, f, indent=2)
+
+def fetch_and_save_weather(location_id="St001", save_path="dataset/weather/perlis_7day.csv", retries=3, delay=2,
+                           archive_dir=DEFAULT_ARCHIVE_DIR):
     """
     Fetch weather data with retry mechanism and proper error handling
     
@@ -38,28 +133,45 @@ def fetch_and_save_weather(location_id="St001", save_path="dataset/weather/perli
         save_path (str): Path to save the CSV file
         retries (int): Number of retry attempts
         delay (int): Delay between retries in seconds
+        archive_dir (str): Historical weather archive to append each fetch to (None to skip)
     
     Returns:
         DataFrame: Weather data or None if failed
     """
+    import requests
+    
     print(f"Fetching weather data for location {location_id}...")
     
     # Create directory if it doesn't exist
     os.makedirs(os.path.dirname(save_path), exist_ok=True)
     
     # Base URL for the API
-    url = f"https://api.data.gov.my/weather/forecast?contains={location_id}@location__location_id"
+    url = f"{WEATHER_API_URL}?contains={location_id}@location__location_id"
     
     # Add a user agent to avoid being blocked
     headers = {
         'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.111 Safari/537.36',
     }
     
+    # Revalidate against the stored copy instead of downloading it again
+    meta = load_fetch_meta(save_path) if os.path.exists(save_path) else {}
+    if meta.get("etag"):
+        headers['If-None-Match'] = meta["etag"]
+    if meta.get("last_modified"):
+        headers['If-Modified-Since'] = meta["last_modified"]
+    
     # Try with retries
     for attempt in range(retries):
         try:
             response = requests.get(url, headers=headers, timeout=10)
             
+            # Stored copy is still current; only the fetch time moves forward
+            if response.status_code == 304:
+                meta["fetched_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                save_fetch_meta(save_path, meta)
+                print(f"[INFO] Weather data for {location_id} not modified, keeping {save_path}")
+                return pd.read_csv(save_path, parse_dates=["date"])
+            
             # Check for successful response
             if response.status_code == 200:
                 weather_data = response.json()
@@ -77,23 +189,7 @@ def fetch_and_save_weather(location_id="St001", save_path="dataset/weather/perli
                         return None
                 
                 # Process the data
-                weather_records = []
-                for entry in weather_data:
-                    try:
-                        # Handle different possible data structures
-                        if isinstance(entry, dict):
-                            if 'date' in entry and 'min_temp' in entry and 'max_temp' in entry:
-                                weather_records.append({
-                                    "date": entry.get("date", ""),
-                                    "min_temp": entry.get("min_temp", ""),
-                                    "max_temp": entry.get("max_temp", ""),
-                                    "weather_type": classify_weather(entry.get("summary_forecast", "")),
-                                    #"humidity": entry.get("humidity", ""),  #Add more fields if available
-                                    "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                })
-                    except Exception as e:
-                        print(f"Error processing entry: {e}")
-                        continue
+                weather_records = parse_weather_records(weather_data)
                 
                 if not weather_records:
                     print("No valid weather records found in the response")
@@ -108,20 +204,16 @@ def fetch_and_save_weather(location_id="St001", save_path="dataset/weather/perli
                     else:
                         return None
                 
-                # Create DataFrame
-                df = pd.DataFrame(weather_records)
-                
-                # Convert date column to datetime
-                try:
-                    df["date"] = pd.to_datetime(df["date"])
-                except Exception as e:
-                    print(f"Warning: Could not convert dates: {e}")
-                
-                # Sort by date
-                df = df.sort_values(by="date")
-                
-                # Save to CSV
-                df.to_csv(save_path, index=False)
+                # Merge into the date-keyed store instead of overwriting history
+                df = merge_weather_records(save_path, weather_records)
+                if archive_dir:
+                    WeatherArchive(archive_dir).append(location_id, weather_records)
+                save_fetch_meta(save_path, {
+                    "location_id": location_id,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "fetched_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                })
                 print(f"[INFO] Weather data saved to {save_path}")
                 
                 return df
@@ -159,10 +251,14 @@ def is_data_fresh(file_path, max_age_hours=3):
         if not os.path.exists(file_path):
             return False
         
-        # Get file modification time
-        mtime = os.path.getmtime(file_path)
-        last_modified = datetime.fromtimestamp(mtime)
-        age = datetime.now() - last_modified
+        # Prefer the recorded fetch time; a 304 revalidation refreshes it
+        # without rewriting the file. Fall back to the file modification time.
+        fetched_at = load_fetch_meta(file_path).get("fetched_at")
+        if fetched_at:
+            last_checked = datetime.strptime(fetched_at, "%Y-%m-%d %H:%M:%S")
+        else:
+            last_checked = datetime.fromtimestamp(os.path.getmtime(file_path))
+        age = datetime.now() - last_checked
         
         # Check if data is older than max_age_hours
         return age.total_seconds() < max_age_hours * 3600
@@ -0,0 +1,268 @@
+# utils/weather_archive.py
+# Append-only historical weather archive
+# Every fetch is appended as a small segment keyed by (location, date, fetch time);
+# compaction folds segments into one columnar Parquet file per (location, year)
+# so that range queries only touch the partitions they need.
+#
+# Layout:
+#   dataset/weather/archive/incoming/{location_id}/{fetched_at}-{id}.parquet
+#   dataset/weather/archive/compacted/location_id={id}/year={yyyy}/data.parquet
+
+import argparse
+import glob
+import os
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+DEFAULT_ARCHIVE_DIR = "dataset/weather/archive"
+
+# Columns stored in the archive (location_id and year are partition keys)
+ARCHIVE_COLUMNS = ['date', 'min_temp', 'max_temp', 'weather_type', 'fetched_at']
+KEY_COLUMNS = ['date', 'fetched_at']
+
+
+def _arrow():
+    """Import pyarrow on first use so that CSV-only runs never load it"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    return pa, pq
+
+
+def archive_schema():
+    """Arrow schema of archive segments and partitions"""
+    pa, _ = _arrow()
+    return pa.schema([
+        ('date', pa.timestamp('ns')),
+        ('min_temp', pa.float64()),
+        ('max_temp', pa.float64()),
+        ('weather_type', pa.string()),
+        ('fetched_at', pa.timestamp('ns')),
+    ])
+
+
+def _normalize(records, fetched_at=None):
+    """Convert weather records (list of dicts or DataFrame) into archive rows"""
+    df = pd.DataFrame(records).copy()
+    if 'fetched_at' not in df.columns:
+        if fetched_at is None:
+            fetched_at = df['last_updated'] if 'last_updated' in df.columns else datetime.now()
+        df['fetched_at'] = fetched_at
+    df['date'] = pd.to_datetime(df['date']).dt.normalize().astype('datetime64[ns]')
+    df['fetched_at'] = pd.to_datetime(df['fetched_at']).astype('datetime64[ns]')
+    df['min_temp'] = pd.to_numeric(df['min_temp'], errors='coerce').astype('float64')
+    df['max_temp'] = pd.to_numeric(df['max_temp'], errors='coerce').astype('float64')
+    df['weather_type'] = df['weather_type'].astype(str)
+    return df[ARCHIVE_COLUMNS]
+
+
+def _dedupe(df, latest_only=False):
+    """Drop repeated (date, fetch time) rows; optionally keep only the newest fetch per date"""
+    df = df.sort_values(['date', 'fetched_at'], kind='mergesort')
+    df = df.drop_duplicates(subset=KEY_COLUMNS, keep='last')
+    if latest_only:
+        df = df.drop_duplicates(subset='date', keep='last')
+    return df.reset_index(drop=True)
+
+
+class WeatherArchive:
+    """
+    Append-only, deduplicated weather archive with Parquet compaction.
+    """
+
+    def __init__(self, root=DEFAULT_ARCHIVE_DIR):
+        """
+        Args:
+            root (str): Archive root directory
+        """
+        self.root = root
+        self.incoming_dir = os.path.join(root, "incoming")
+        self.compacted_dir = os.path.join(root, "compacted")
+
+    def _segments(self, location_id=None):
+        pattern = os.path.join(self.incoming_dir, location_id or "*", "*.parquet")
+        return sorted(glob.glob(pattern))
+
+    def _partition_path(self, location_id, year):
+        return os.path.join(self.compacted_dir, f"location_id={location_id}", f"year={year}", "data.parquet")
+
+    def has_data(self, location_id):
+        """Check whether anything has been archived for a location"""
+        return bool(self._segments(location_id)) or \
+            os.path.isdir(os.path.join(self.compacted_dir, f"location_id={location_id}"))
+
+    def append(self, location_id, records, fetched_at=None):
+        """
+        Append one fetch to the archive. Existing data is never rewritten here.
+
+        Args:
+            location_id (str): Location the records belong to
+            records (list or DataFrame): Weather records with date, min_temp, max_temp, weather_type
+            fetched_at (datetime or str, optional): Fetch time. Defaults to each record's
+                'last_updated' value, or now.
+
+        Returns:
+            str: Path of the written segment, or None if there was nothing to write
+        """
+        df = _normalize(records, fetched_at)
+        if df.empty:
+            return None
+        pa, pq = _arrow()
+
+        segment_dir = os.path.join(self.incoming_dir, location_id)
+        os.makedirs(segment_dir, exist_ok=True)
+        stamp = df['fetched_at'].max().strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(segment_dir, f"{stamp}-{uuid.uuid4().hex[:8]}.parquet")
+
+        tmp_path = path + ".tmp"
+        pq.write_table(pa.Table.from_pandas(df, schema=archive_schema(), preserve_index=False), tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def compact(self, location_id=None):
+        """
+        Fold incoming segments into the per-(location, year) Parquet partitions.
+
+        Args:
+            location_id (str, optional): Only compact this location
+
+        Returns:
+            int: Number of segments compacted
+        """
+        pa, pq = _arrow()
+        segments = self._segments(location_id)
+        by_location = {}
+        for path in segments:
+            by_location.setdefault(os.path.basename(os.path.dirname(path)), []).append(path)
+
+        for loc, paths in by_location.items():
+            new_rows = pd.concat([pq.read_table(p).to_pandas() for p in paths], ignore_index=True)
+            new_rows['year'] = new_rows['date'].dt.year
+
+            for year, year_rows in new_rows.groupby('year'):
+                partition = self._partition_path(loc, year)
+                parts = [year_rows[ARCHIVE_COLUMNS]]
+                if os.path.exists(partition):
+                    parts.insert(0, pq.read_table(partition).to_pandas()[ARCHIVE_COLUMNS])
+                merged = _dedupe(pd.concat(parts, ignore_index=True))
+
+                os.makedirs(os.path.dirname(partition), exist_ok=True)
+                tmp_path = partition + ".tmp"
+                pq.write_table(pa.Table.from_pandas(merged, schema=archive_schema(), preserve_index=False),
+                               tmp_path)
+                os.replace(tmp_path, partition)
+
+            # Segments are only removed once all their rows are safely compacted
+            for path in paths:
+                os.remove(path)
+
+        return len(segments)
+
+    def read_range(self, location_id, start=None, end=None, latest_only=True, as_of=None):
+        """
+        Read archived weather for a location and date range. Only the matching
+        year partitions and pending segments of that location are scanned.
+
+        Args:
+            location_id (str): Location to read
+            start (date-like, optional): First date (inclusive)
+            end (date-like, optional): Last date (inclusive)
+            latest_only (bool): Keep only the newest fetch for each date
+            as_of (datetime-like, optional): Ignore fetches made after this time
+
+        Returns:
+            DataFrame: Columns date, min_temp, max_temp, weather_type, fetched_at
+        """
+        pa, pq = _arrow()
+        import pyarrow.dataset as ds
+        start = pd.Timestamp(start).normalize() if start is not None else None
+        end = pd.Timestamp(end).normalize() if end is not None else None
+        frames = []
+
+        location_dir = os.path.join(self.compacted_dir, f"location_id={location_id}")
+        if os.path.isdir(location_dir):
+            dataset = ds.dataset(location_dir, format="parquet", partitioning=ds.partitioning(
+                pa.schema([('year', pa.int32())]), flavor="hive"))
+            filt = None
+            if start is not None:
+                filt = (ds.field('year') >= start.year) & (ds.field('date') >= pa.scalar(start.to_datetime64()))
+            if end is not None:
+                end_filt = (ds.field('year') <= end.year) & (ds.field('date') <= pa.scalar(end.to_datetime64()))
+                filt = end_filt if filt is None else filt & end_filt
+            frames.append(dataset.to_table(columns=ARCHIVE_COLUMNS, filter=filt).to_pandas())
+
+        for path in self._segments(location_id):
+            segment = pq.read_table(path).to_pandas()
+            if start is not None:
+                segment = segment[segment['date'] >= start]
+            if end is not None:
+                segment = segment[segment['date'] <= end]
+            frames.append(segment[ARCHIVE_COLUMNS])
+
+        if not frames:
+            return pd.DataFrame(columns=ARCHIVE_COLUMNS)
+
+        df = pd.concat(frames, ignore_index=True)
+        if as_of is not None:
+            df = df[df['fetched_at'] <= pd.Timestamp(as_of)]
+        return _dedupe(df, latest_only=latest_only)
+
+    def import_csv(self, csv_path, location_id):
+        """
+        Seed the archive from an existing weather CSV store (e.g. perlis_7day.csv).
+
+        Args:
+            csv_path (str): Path to the CSV store
+            location_id (str): Location the CSV belongs to
+
+        Returns:
+            str: Path of the written segment
+        """
+        return self.append(location_id, pd.read_csv(csv_path))
+
+
+def load_weather_frame(location_id="St001", start=None, end=None, archive_dir=DEFAULT_ARCHIVE_DIR,
+                       fallback_csv="dataset/weather/perlis_7day.csv"):
+    """
+    Load weather for a date range in the layout of the CSV weather store
+    (date, min_temp, max_temp, weather_type, last_updated). Reads from the
+    archive when it holds data for the location, otherwise from the CSV.
+
+    Args:
+        location_id (str): Location to read
+        start (date-like, optional): First date (inclusive)
+        end (date-like, optional): Last date (inclusive)
+        archive_dir (str): Archive root directory
+        fallback_csv (str): CSV store used when the archive is empty
+
+    Returns:
+        DataFrame: Weather data
+    """
+    archive = WeatherArchive(archive_dir) if archive_dir else None
+    if archive is not None and archive.has_data(location_id):
+        df = archive.read_range(location_id, start, end, latest_only=True)
+        return df.rename(columns={'fetched_at': 'last_updated'})
+    return pd.read_csv(fallback_csv)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Historical weather archive maintenance')
+    parser.add_argument('command', type=str, choices=['compact', 'import-csv', 'query'])
+    parser.add_argument('--archive', type=str, default=DEFAULT_ARCHIVE_DIR, help='Archive root directory')
+    parser.add_argument('--location', type=str, default="St001", help='Location ID')
+    parser.add_argument('--csv', type=str, default="dataset/weather/perlis_7day.csv",
+                        help='CSV store to import (import-csv)')
+    parser.add_argument('--start', type=str, help='First date (query)')
+    parser.add_argument('--end', type=str, help='Last date (query)')
+    parser.add_argument('--all-fetches', action='store_true',
+                        help='Return every fetch instead of the newest per date (query)')
+    args = parser.parse_args()
+
+    archive = WeatherArchive(args.archive)
+    if args.command == 'compact':
+        print(f"Compacted {archive.compact()} segment(s) into {archive.compacted_dir}")
+    elif args.command == 'import-csv':
+        print(f"Imported {args.csv} into {archive.import_csv(args.csv, args.location)}")
+    else:
+        print(archive.read_range(args.location, args.start, args.end, latest_only=not args.all_fetches))
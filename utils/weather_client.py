@@ -0,0 +1,201 @@
+# utils/weather_client.py
+# Async weather client for multi-district refreshes
+# Fetches many location IDs concurrently over a pooled connection,
+# revalidates with ETag / If-Modified-Since and merges the results
+# into the date-keyed weather store (see utils/weather.py)
+
+import argparse
+import asyncio
+import random
+from datetime import datetime
+
+import aiohttp
+
+from utils.weather import (WEATHER_API_URL, DEFAULT_WEATHER_DIR, parse_weather_records, merge_weather_records,
+                           load_fetch_meta, save_fetch_meta, weather_store_path)
+from utils.weather_archive import WeatherArchive, DEFAULT_ARCHIVE_DIR
+
+# Responses worth retrying; anything else is treated as a permanent failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.111 Safari/537.36'
+
+
+class AsyncWeatherClient:
+    """
+    Asyncio weather client that shares one connection pool across all locations.
+
+    Use as an async context manager:
+
+        async with AsyncWeatherClient() as client:
+            results = await client.refresh(["St001", "St002"])
+    """
+
+    def __init__(self, base_url=WEATHER_API_URL, weather_dir=DEFAULT_WEATHER_DIR, max_connections=100,
+                 timeout=10, retries=3, backoff=0.5, max_backoff=8.0, archive_dir=DEFAULT_ARCHIVE_DIR):
+        """
+        Args:
+            base_url (str): Forecast endpoint URL
+            weather_dir (str): Directory holding the per-location weather stores
+            max_connections (int): Size of the shared connection pool
+            timeout (float): Total timeout per request in seconds
+            retries (int): Number of attempts per location
+            backoff (float): Initial backoff delay in seconds, doubled on each retry
+            max_backoff (float): Upper bound for a single backoff delay
+            archive_dir (str): Historical weather archive to append each fetch to (None to skip)
+        """
+        self.base_url = base_url
+        self.weather_dir = weather_dir
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.archive = WeatherArchive(archive_dir) if archive_dir else None
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'User-Agent': USER_AGENT}
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.session = None
+
+    def _backoff_delay(self, attempt):
+        # Exponential backoff with jitter so that retries from many locations do not line up
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def fetch_location(self, location_id, validators=None):
+        """
+        Fetch the forecast for a single location.
+
+        Args:
+            location_id (str): The location ID for the weather forecast
+            validators (dict, optional): Stored 'etag' / 'last_modified' for revalidation
+
+        Returns:
+            dict: Result with 'status' ('updated', 'not_modified' or 'failed'),
+                  'records', 'etag' and 'last_modified'
+        """
+        url = f"{self.base_url}?contains={location_id}@location__location_id"
+        validators = validators or {}
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        result = {"location_id": location_id, "status": "failed", "records": [],
+                  "etag": None, "last_modified": None, "error": None}
+
+        for attempt in range(self.retries):
+            try:
+                async with self.session.get(url, headers=headers) as response:
+                    if response.status == 304:
+                        result["status"] = "not_modified"
+                        result["etag"] = validators.get("etag")
+                        result["last_modified"] = validators.get("last_modified")
+                        return result
+
+                    if response.status == 200:
+                        weather_data = await response.json(content_type=None)
+                        result["records"] = parse_weather_records(weather_data or [])
+                        result["etag"] = response.headers.get("ETag")
+                        result["last_modified"] = response.headers.get("Last-Modified")
+                        result["status"] = "updated" if result["records"] else "failed"
+                        if not result["records"]:
+                            result["error"] = "No valid weather records found in the response"
+                        return result
+
+                    result["error"] = f"API request failed with status code: {response.status}"
+                    if response.status not in RETRY_STATUSES:
+                        return result
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                result["error"] = f"Request error: {e!r}"
+
+            if attempt < self.retries - 1:
+                await asyncio.sleep(self._backoff_delay(attempt))
+
+        return result
+
+    async def refresh(self, location_ids, force=False):
+        """
+        Refresh the weather stores of many locations concurrently.
+
+        Args:
+            location_ids (list): Location IDs to refresh
+            force (bool): Skip conditional revalidation and always download
+
+        Returns:
+            dict: Result per location ID (see fetch_location)
+        """
+        location_ids = list(dict.fromkeys(location_ids))
+        paths = {loc: weather_store_path(loc, self.weather_dir) for loc in location_ids}
+        validators = {loc: ({} if force else load_fetch_meta(paths[loc])) for loc in location_ids}
+
+        results = await asyncio.gather(*(self.fetch_location(loc, validators[loc]) for loc in location_ids))
+
+        fetched_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for result in results:
+            loc = result["location_id"]
+            if result["status"] == "failed":
+                continue
+            if result["status"] == "updated":
+                merge_weather_records(paths[loc], result["records"])
+                if self.archive is not None:
+                    self.archive.append(loc, result["records"])
+            save_fetch_meta(paths[loc], {
+                "location_id": loc,
+                "etag": result["etag"],
+                "last_modified": result["last_modified"],
+                "fetched_at": fetched_at
+            })
+
+        return {result["location_id"]: result for result in results}
+
+
+def refresh_weather(location_ids, weather_dir=DEFAULT_WEATHER_DIR, force=False, **client_kwargs):
+    """
+    Synchronous entry point for a concurrent multi-location weather refresh.
+
+    Args:
+        location_ids (list): Location IDs to refresh
+        weather_dir (str): Directory holding the per-location weather stores
+        force (bool): Skip conditional revalidation and always download
+        **client_kwargs: Extra AsyncWeatherClient options (base_url, retries, ...)
+
+    Returns:
+        dict: Result per location ID
+    """
+    async def _run():
+        async with AsyncWeatherClient(weather_dir=weather_dir, **client_kwargs) as client:
+            return await client.refresh(location_ids, force=force)
+
+    return asyncio.run(_run())
+
+
+# Example usage
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Refresh weather stores for many locations concurrently')
+    parser.add_argument('locations', nargs='*', default=["St001"], help='Location IDs to refresh')
+    parser.add_argument('--weather-dir', type=str, default=DEFAULT_WEATHER_DIR,
+                        help='Directory holding the weather stores')
+    parser.add_argument('--base-url', type=str, default=WEATHER_API_URL,
+                        help='Forecast endpoint (e.g. a local weather_stub_server)')
+    parser.add_argument('--force', action='store_true', help='Skip conditional revalidation')
+    args = parser.parse_args()
+
+    start_time = datetime.now()
+    results = refresh_weather(args.locations, weather_dir=args.weather_dir, force=args.force,
+                              base_url=args.base_url)
+    for loc, result in results.items():
+        print(f"{loc}: {result['status']}" + (f" ({result['error']})" if result['error'] else ""))
+    print(f"Refreshed {len(results)} locations in {(datetime.now() - start_time).total_seconds():.2f} seconds")
@@ -0,0 +1,100 @@
+# utils/weather_features.py
+# Weather feature join shared by the training scripts and the forecaster.
+#
+# Every date gets the observed weather of that day if there is one, otherwise
+# the average for its calendar month, otherwise the overall averages. The
+# lookup is a single join on the normalized date plus a month-indexed lookup,
+# instead of filtering the weather frame once per date.
+
+import numpy as np
+import pandas as pd
+
+WEATHER_FEATURES = ['max_temp', 'min_temp', 'weather_code']
+
+# Used when no weather data could be loaded at all
+DEFAULT_WEATHER = {'max_temp': 30, 'min_temp': 24, 'weather_code': 0}
+
+
+def _mode(values):
+    """Most frequent value (smallest on ties), 0 if there is none"""
+    mode = values.mode()
+    return mode.iloc[0] if len(mode) > 0 else 0
+
+
+def monthly_weather_profile(weather_df):
+    """
+    Average weather per calendar month, used for dates without observations.
+
+    Args:
+        weather_df (DataFrame): Weather with date, max_temp, min_temp and weather_code columns
+
+    Returns:
+        DataFrame: max_temp and min_temp means and the weather_code mode, indexed by month (1-12)
+    """
+    months = weather_df['date'].dt.month.rename('month')
+    return weather_df.groupby(months).agg({
+        'max_temp': 'mean',
+        'min_temp': 'mean',
+        'weather_code': _mode
+    })
+
+
+def overall_weather(weather_df):
+    """
+    Weather averages over all observations, used when a month has no data.
+
+    Args:
+        weather_df (DataFrame): Weather with max_temp, min_temp and weather_code columns
+
+    Returns:
+        dict: Weather features
+    """
+    if weather_df is None or weather_df.empty:
+        return dict(DEFAULT_WEATHER)
+    return {
+        'max_temp': weather_df['max_temp'].mean(),
+        'min_temp': weather_df['min_temp'].mean(),
+        'weather_code': _mode(weather_df['weather_code'])
+    }
+
+
+def attach_weather(dates, weather_df, monthly_profile=None):
+    """
+    Weather features for a vector of dates.
+
+    Args:
+        dates (array-like): Dates to look up (duplicates and any order allowed)
+        weather_df (DataFrame): Weather with date, max_temp, min_temp and weather_code
+            columns, or None if no weather is available
+        monthly_profile (DataFrame, optional): Result of monthly_weather_profile.
+            Computed from weather_df if not given.
+
+    Returns:
+        DataFrame: max_temp, min_temp and weather_code (float), one row per date in input order
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates)).normalize()
+    if weather_df is None:
+        return pd.DataFrame({key: np.full(len(dates), DEFAULT_WEATHER[key], dtype=float)
+                             for key in WEATHER_FEATURES})
+    if monthly_profile is None:
+        monthly_profile = monthly_weather_profile(weather_df)
+
+    # Observed weather of the same day; the first row wins if a day is listed twice
+    observed = weather_df[['date'] + WEATHER_FEATURES].assign(date=weather_df['date'].dt.normalize())
+    observed = observed.drop_duplicates('date').set_index('date').astype(float)
+    values = observed.reindex(dates).to_numpy()
+    matched = dates.isin(observed.index)
+
+    # Observed values are kept as they are, even if some of them are missing
+    months = dates.month
+    use_month = ~matched & months.isin(monthly_profile.index)
+    if use_month.any():
+        profile = monthly_profile[WEATHER_FEATURES].astype(float)
+        values[use_month] = profile.reindex(months[use_month]).to_numpy()
+
+    use_overall = ~matched & ~use_month
+    if use_overall.any():
+        fallback = overall_weather(weather_df)
+        values[use_overall] = [fallback[key] for key in WEATHER_FEATURES]
+
+    return pd.DataFrame(values, columns=WEATHER_FEATURES)
@@ -0,0 +1,172 @@
+# utils/weather_stub_server.py
+# Local stand-in for the api.data.gov.my weather forecast endpoint
+# Serves deterministic 7-day forecasts for any location ID, with ETag /
+# Last-Modified validators, optional latency and injected failures, so the
+# weather clients can be exercised offline.
+#
+# Usage:
+#   python -m utils.weather_stub_server --port 8765
+#   WEATHER_API_URL=http://127.0.0.1:8765/weather/forecast python utils/weather.py
+
+import argparse
+import asyncio
+import hashlib
+import json
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from aiohttp import web
+
+FORECAST_PATH = "/weather/forecast"
+
+SUMMARIES = [
+    "Ribut petir di beberapa tempat",
+    "Hujan di beberapa tempat",
+    "Hujan lebat",
+    "Berawan",
+    "Cerah",
+]
+
+
+def make_forecast(location_id, start_date, days=7, version=0):
+    """
+    Build a deterministic forecast payload shaped like the real API response.
+
+    Args:
+        location_id (str): Location ID
+        start_date (date): First forecast date
+        days (int): Number of days to return
+        version (int): Data version; bumping it changes the payload
+
+    Returns:
+        list: Forecast entries
+    """
+    seed = int(hashlib.sha1(f"{location_id}:{version}".encode()).hexdigest(), 16)
+    entries = []
+    for i in range(days):
+        day = start_date + timedelta(days=i)
+        n = (seed >> (i * 4)) & 0xFF
+        entries.append({
+            "location": {"location_id": location_id, "location_name": f"Stub {location_id}"},
+            "date": day.isoformat(),
+            "morning_forecast": "Tiada hujan",
+            "afternoon_forecast": SUMMARIES[n % len(SUMMARIES)],
+            "night_forecast": "Tiada hujan",
+            "summary_forecast": SUMMARIES[n % len(SUMMARIES)],
+            "summary_when": "Petang",
+            "min_temp": 22 + n % 4,
+            "max_temp": 31 + n % 5,
+        })
+    return entries
+
+
+class WeatherStubServer:
+    """
+    In-process stand-in weather server.
+
+        server = WeatherStubServer(latency=0.2)
+        base_url = await server.start()
+        ...
+        await server.stop()
+    """
+
+    def __init__(self, days=7, latency=0.0, fail_first=0, start_date=None):
+        """
+        Args:
+            days (int): Forecast days returned per location
+            latency (float): Artificial delay per request in seconds
+            fail_first (int): Number of initial requests per location answered with 503
+            start_date (date, optional): First forecast date. Defaults to today.
+        """
+        self.days = days
+        self.latency = latency
+        self.fail_first = fail_first
+        self.start_date = start_date or date.today()
+        self.version = 0
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.request_counts = {}
+        self.status_counts = {}
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_get(FORECAST_PATH, self.handle_forecast)
+
+    def bump(self):
+        """Publish a new data version so that cached validators no longer match"""
+        self.version += 1
+        self.last_modified = max(self.last_modified + timedelta(seconds=1),
+                                 datetime.now(timezone.utc).replace(microsecond=0))
+
+    def _count(self, status):
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    async def handle_forecast(self, request):
+        location_id = request.query.get("contains", "").split("@")[0]
+        if not location_id:
+            self._count(400)
+            return web.json_response({"error": "missing location"}, status=400)
+
+        count = self.request_counts.get(location_id, 0) + 1
+        self.request_counts[location_id] = count
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if count <= self.fail_first:
+            self._count(503)
+            return web.json_response({"error": "service unavailable"}, status=503)
+
+        body = json.dumps(make_forecast(location_id, self.start_date, self.days, self.version))
+        etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+        headers = {"ETag": etag, "Last-Modified": format_datetime(self.last_modified, usegmt=True)}
+
+        if_none_match = request.headers.get("If-None-Match")
+        if_modified_since = request.headers.get("If-Modified-Since")
+        not_modified = False
+        if if_none_match is not None:
+            not_modified = if_none_match == etag
+        elif if_modified_since is not None:
+            try:
+                not_modified = parsedate_to_datetime(if_modified_since) >= self.last_modified
+            except (TypeError, ValueError):
+                not_modified = False
+
+        if not_modified:
+            self._count(304)
+            return web.Response(status=304, headers=headers)
+
+        self._count(200)
+        return web.Response(text=body, content_type="application/json", headers=headers)
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        Start serving in the running event loop.
+
+        Returns:
+            str: Base URL of the forecast endpoint
+        """
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = self._runner.addresses[0][1]
+        return f"http://{host}:{bound_port}{FORECAST_PATH}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local stand-in for the weather forecast API')
+    parser.add_argument('--host', type=str, default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Artificial delay per request in seconds')
+    parser.add_argument('--fail-first', type=int, default=0,
+                        help='Answer the first N requests per location with 503')
+    args = parser.parse_args()
+
+    server = WeatherStubServer(latency=args.latency, fail_first=args.fail_first)
+    print(f"Serving stub weather API at http://{args.host}:{args.port}{FORECAST_PATH}")
+    web.run_app(server.app, host=args.host, port=args.port, print=None)
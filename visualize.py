@@ -1,31 +1,48 @@
-import pandas as pd
+import argparse
+
 import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
 import seaborn as sns
 
-# Load forecasted sales
-forecast_df = pd.read_csv('C:/Users/user/Desktop/Unimap/fyp2/drug_forecasts.csv')
-forecast_df['Date'] = pd.to_datetime(forecast_df['Date']).dt.date
-
-# Load actual sales data
-actual_df = pd.read_csv('C:/Users/user/Desktop/Unimap/fyp2/dataset/salesdaily.csv')
-
-# Fix date format from DD/MM/YYYY to date object
-actual_df['Date'] = pd.to_datetime(actual_df['datum'], dayfirst=True, format='mixed').dt.date
-
-# Define drug columns
-drug_columns = ['M01AB', 'M01AE', 'N02BA', 'N02BE', 'N05B', 'N05C', 'R03', 'R06']
-
-# Reshape actual data into long format
-actual_long = actual_df.melt(id_vars=['Date'], value_vars=drug_columns,
-                             var_name='Drug', value_name='Actual_Sales')
-
-# Merge forecast and actuals on Date and Drug
-combined = pd.merge(forecast_df, actual_long, on=['Date', 'Drug'])
+from utils.forecast_monitor import ForecastMonitor
+from utils.sales_data import discover_drugs, read_sales_history
+
+parser = argparse.ArgumentParser(description='Plot forecasts against actual sales')
+parser.add_argument('--db', type=str, default="forecasts/monitoring.db", help='Forecast monitoring database')
+parser.add_argument('--data', type=str, default="dataset/salesdaily.csv", help='Sales history CSV')
+parser.add_argument('--forecasts', type=str, default="forecasts", help='Forecast output directory')
+parser.add_argument('--model-type', type=str, default='rf', help='Model type to plot')
+parser.add_argument('--drugs', type=str, help='Comma-separated drug codes (default: all)')
+parser.add_argument('--start', type=str, help='First date (YYYY-MM-DD)')
+parser.add_argument('--end', type=str, help='Last date (YYYY-MM-DD)')
+args = parser.parse_args()
+
+# Drug columns are discovered from the sales history; --drugs narrows the actuals loaded and plotted
+drug_columns = discover_drugs(args.data)
+drugs = [drug.strip() for drug in args.drugs.split(',') if drug.strip()] if args.drugs else None
+if drugs:
+    unknown = [drug for drug in drugs if drug not in drug_columns]
+    if unknown:
+        parser.error(f"--drugs not found in {args.data}: {', '.join(unknown)}")
+    drug_columns = drugs
+
+# Bring the forecast/actual join up to date; only new forecasts and actuals are processed
+monitor = ForecastMonitor(args.db)
+monitor.register_forecast_directory(args.forecasts)
+monitor.update_actuals(read_sales_history(args.data, drug_columns), drug_columns)
+
+combined = monitor.scored(args.model_type, drugs, args.start, args.end)
+combined = combined.rename(columns={'drug': 'Drug', 'date': 'Date', 'predicted_sales': 'Predicted_Sales',
+                                    'actual_sales': 'Actual_Sales'})
+combined['Date'] = pd.to_datetime(combined['Date'])
 
 # Check merged data
 print("Combined Preview:")
 print(combined.head())
 print(f"Total rows: {len(combined)}")
+if combined.empty:
+    raise SystemExit("No forecasts with actuals to plot.")
 
 # Plotting
 plt.figure(figsize=(12, 6))
@@ -33,24 +50,25 @@ sns.set(style="whitegrid")
 
 for drug in combined['Drug'].unique():
     drug_data = combined[combined['Drug'] == drug]
-    plt.plot(drug_data['Date'], drug_data['Actual_Sales'], marker='o', label=f'{drug} Actual')
+    actual = drug_data.drop_duplicates('Date')
+    plt.plot(actual['Date'], actual['Actual_Sales'], marker='o', label=f'{drug} Actual')
     plt.plot(drug_data['Date'], drug_data['Predicted_Sales'], marker='x', linestyle='--', label=f'{drug} Predicted')
-    
-
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-import numpy as np
 
-mae = mean_absolute_error(combined['Actual_Sales'], combined['Predicted_Sales'])
-rmse = np.sqrt(mean_squared_error(combined['Actual_Sales'], combined['Predicted_Sales']))
+error = combined['Actual_Sales'] - combined['Predicted_Sales']
+mae = error.abs().mean()
+rmse = np.sqrt((error ** 2).mean())
 print(f"MAE: {mae:.2f}")
 print(f"RMSE: {rmse:.2f}")
 
-
 # Avoid divide-by-zero in MAPE
 non_zero_actuals = combined[combined['Actual_Sales'] != 0]
 mape = np.mean(np.abs((non_zero_actuals['Actual_Sales'] - non_zero_actuals['Predicted_Sales']) / non_zero_actuals['Actual_Sales'])) * 100
 print(f"MAPE: {mape:.2f}%")
 
+# Running metrics per drug, pooled over horizons
+metrics = monitor.metrics(by_horizon=False)
+print(metrics[(metrics['model_type'] == args.model_type) & metrics['drug'].isin(drug_columns)].to_string(index=False))
+monitor.close()
 
 plt.title("Actual vs Predicted Drug Sales")
 plt.xlabel("Date")
@@ -59,6 +77,3 @@ plt.xticks(rotation=45)
 plt.legend()
 plt.tight_layout()
 plt.show()
-
-
-